@@ -0,0 +1,126 @@
+# coding=utf-8
+"""
+Packet latency of the Twisted & asyncio network backends under a synthetic client load: client processes log
+players in, then every player sends keep alive packets carrying their send time, which the network process echoes
+back as soon as it dispatched them. Reports the median & p99 round trip of each backend.
+Run with: python -m benchmarks.bench_backends [players] [seconds]
+"""
+import logging
+import multiprocessing
+import socket
+import struct
+import sys
+import time
+
+from quarry.types.buffer import Buffer1_14, BufferUnderrun
+
+from classes.network.AsyncioNetwork import BACKENDS, uvloop
+
+PROTOCOL = 578
+CLIENTS = 4  # Client processes
+KEEP_ALIVE_OUT = 0x0F
+KEEP_ALIVE_IN = 0x21
+_TIME = struct.Struct('>Q')
+
+
+def _packet(ident: int, payload: bytes) -> bytes:
+    data = Buffer1_14.pack_varint(ident) + payload
+    return Buffer1_14.pack_varint(len(data)) + data
+
+
+def _free_port() -> int:
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def _echo(self, buff):
+    self.send_packet('keep_alive', buff.read(8))
+
+
+def serve(backend: str, port: int):
+    """ A network process of the given backend whose players echo keep alive packets """
+    factory = BACKENDS[backend]('127.0.0.1', port, compression_threshold=-1, compression_workers=0, online_mode=False)
+    factory.protocol = type('EchoPlayer', (factory.protocol,), {'packet_keep_alive': _echo})
+    factory.max_players = 1 << 16
+    factory.log_level = logging.WARNING
+    factory.pre_start_server()
+    factory.start_server()
+
+
+def client(port: int, players: int, name: str, seconds: float, results):
+    """ Logs players in, then each of them sends a keep alive & waits for its echo until seconds have passed """
+    host = Buffer1_14.pack_string('127.0.0.1')
+    socks = []
+    for i in range(players):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(_packet(0, Buffer1_14.pack_varint(PROTOCOL) + host + struct.pack('>H', port) +
+                             Buffer1_14.pack_varint(2)) +
+                     _packet(0, Buffer1_14.pack_string('%s%d' % (name, i))))
+        socks.append((sock, Buffer1_14()))
+    for sock, buff in socks:
+        _read(sock, buff)  # Login success
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for sock, _ in socks:
+            sock.sendall(_packet(KEEP_ALIVE_OUT, _TIME.pack(time.perf_counter_ns())))
+        for sock, buff in socks:
+            while True:
+                ident, payload = _read(sock, buff)
+                # Skip the keep alive packets of the server
+                if ident == KEEP_ALIVE_IN and payload != bytes(8):
+                    latencies.append((time.perf_counter_ns() - _TIME.unpack(payload)[0]) / 1000)
+                    break
+    for sock, _ in socks:
+        sock.close()
+    results.put(latencies)
+
+
+def _read(sock: socket.socket, buff: Buffer1_14) -> (int, bytes):
+    while True:
+        buff.save()
+        try:
+            body = buff.unpack_packet(Buffer1_14)
+            return body.unpack_varint(), body.read()
+        except BufferUnderrun:
+            buff.restore()
+        buff.add(sock.recv(65536))
+
+
+def run(backend: str, players: int, seconds: float) -> (float, float, int):
+    """ Returns the median & p99 latency in microseconds & the number of echoed packets """
+    port = _free_port()
+    server = multiprocessing.Process(target=serve, args=(backend, port))
+    server.start()
+    time.sleep(1)
+    results = multiprocessing.Queue()
+    clients = [multiprocessing.Process(target=client, args=(port, players // CLIENTS, 'bench%d_' % i, seconds,
+                                                            results))
+               for i in range(CLIENTS)]
+    for process in clients:
+        process.start()
+    latencies = []
+    for _ in clients:
+        latencies += results.get()
+    for process in clients:
+        process.join()
+    server.terminate()
+    server.join()
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], len(latencies)
+
+
+def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    print('%d players, %d client processes, uvloop %s' % (players, CLIENTS, 'installed' if uvloop else 'not installed'))
+    for backend in BACKENDS:
+        median, p99, count = run(backend, players, seconds)
+        print('%-8s %8d packets   latency median %8.1f us   p99 %8.1f us' % (backend, count, median, p99))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# coding=utf-8
+"""
+Broadcasts TIME_UPDATE to simulated players, encoding it for every player like ServerFactory used to and encoding it
+once for all of them. Player outbound buffers aren't flushed while timing, so only the encoding & framing work is measured.
+Run with: python -m benchmarks.bench_broadcast [broadcasts]
+"""
+import sys
+import time
+
+from twisted.internet.address import IPv4Address
+
+from classes.network.Connection import NetworkController, PlayerNetwork, ServerFactory
+from classes.network.Outbound import OutboundBuffer
+from classes.network.PacketType import PacketType
+
+PROTOCOL = 578
+
+
+def connect(factory: ServerFactory, count: int):
+    factory._players.clear()
+    for entity_id in range(count):
+        player = PlayerNetwork(factory, IPv4Address('TCP', '127.0.0.1', 1024 + entity_id))
+        player.protocol_mode = 'play'
+        player.protocol_version = PROTOCOL
+        player.buff_type = factory.get_buff_type(PROTOCOL)
+        player._update_dispatch()
+        player.entity_id = entity_id
+        player.outbound = OutboundBuffer()
+        factory._players[str(entity_id)] = player
+
+
+def per_player(factory: ServerFactory, data: dict):
+    """ Every player encodes & frames the packet, what make_packet_and_send did """
+    for player in factory._players.values():
+        body = b''.join(player.make_packet(PacketType.TIME_UPDATE, data))
+        player.add_frame(player.prepare_packet(PacketType.TIME_UPDATE, body))
+
+
+def encode_once(factory: ServerFactory, data: dict):
+    """ NetworkController encodes once per protocol version & ServerFactory frames once per compression threshold """
+    for protocol, body in NetworkController._encode(PacketType.TIME_UPDATE, data):
+        factory.send_packet(protocol, PacketType.TIME_UPDATE, body)
+
+
+def main():
+    broadcasts = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    factory = ServerFactory()
+    for players in (1, 10, 50, 200):
+        connect(factory, players)
+        line = '%4d players' % players
+        for name, broadcast in (('per player', per_player), ('encode once', encode_once)):
+            start = time.perf_counter()
+            for tick in range(broadcasts):
+                broadcast(factory, {'game_time': tick, 'day_time': tick})
+            elapsed = time.perf_counter() - start
+            for player in factory._players.values():
+                player.outbound.flush(len)
+            line += '   %s %7.1f us/broadcast (%5.2f us/player)' % (
+                name, elapsed / broadcasts * 1e6, elapsed / broadcasts / players * 1e6)
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# coding=utf-8
+"""
+Encodes generated chunks into 1.15.2 chunk data packets, with empty section caches, with one block changed per chunk
+between packets and with every section cached.
+Run with: python -m benchmarks.bench_chunk_encode [rounds]
+"""
+import sys
+import time
+
+from quarry.types.buffer import Buffer1_14
+
+from classes.BasicClasses import Chunk
+from classes.WorldGenerator import generate_chunk_column
+from classes.blocks.Materials import Material
+from classes.network.versions.v578 import v1_15_2
+
+SEED = 1234
+CHUNKS = 16
+
+
+def encode(chunks: [Chunk]):
+    for chunk in chunks:
+        b''.join(v1_15_2.chunk_data(Buffer1_14, chunk))
+
+
+def cold(chunks: [Chunk]):
+    for chunk in chunks:
+        for section in chunk.sections:
+            section.changed()
+    encode(chunks)
+
+
+def one_change(chunks: [Chunk]):
+    for chunk in chunks:
+        material = Material.STONE if chunk.get_material(8, 40, 8) is Material.DIRT else Material.DIRT
+        chunk.set_block(8, 40, 8, material)
+    encode(chunks)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    chunks = [Chunk.from_bytes(generate_chunk_column(x, 0, SEED)[0]) for x in range(CHUNKS)]
+    size = len(b''.join(v1_15_2.chunk_data(Buffer1_14, chunks[0])))
+    print('%d chunks, %d rounds, %.1f KiB per packet' % (CHUNKS, rounds, size / 1024))
+    for name, run in (('cold', cold), ('one change', one_change), ('cached', encode)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            run(chunks)
+        elapsed = time.perf_counter() - start
+        print('%-12s %9.1f chunks/s' % (name, rounds * CHUNKS / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# coding=utf-8
+"""
+Generates a 25x25 spawn area on the MultiProcessing workers and reports chunks per second for each worker count.
+Run with: python -m benchmarks.bench_chunk_generation [max workers]
+"""
+import sys
+import time
+from concurrent.futures import wait
+
+from classes.WorldGenerator import ChunkGenerationService
+from classes.WorldIO import PendingEditStore
+from classes.mcPy.McPy import get_available_core
+from classes.mcPy.MultiProcessing import MultiProcessing
+
+RADIUS = 12  # 25x25 chunks
+SEED = 1234
+
+
+def run(worker_number):
+    multi_processing = MultiProcessing(None, worker_number)
+    multi_processing.start()
+    try:
+        service = ChunkGenerationService(multi_processing, SEED, pending_edits=PendingEditStore())
+        # Warm up every worker so the first generator setup isn't measured
+        wait(service.generate_area(1000, 1000, 1))
+        start = time.perf_counter()
+        futures = service.generate_area(0, 0, RADIUS)
+        wait(futures)
+        elapsed = time.perf_counter() - start
+        for future in futures:
+            future.result()
+        return len(futures) / elapsed
+    finally:
+        multi_processing.stop()
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(1, get_available_core())
+    baseline = None
+    print('%d chunks per run' % ((2 * RADIUS + 1) ** 2,))
+    for worker_number in range(1, max_workers + 1):
+        rate = run(worker_number)
+        baseline = baseline or rate
+        print('%2d workers: %8.1f chunks/s (x%.2f)' % (worker_number, rate, rate / baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# coding=utf-8
+"""
+Compares the memory used by a fully populated chunk with the old dict of Blocks layout and with the palette layout.
+Run with: python -m benchmarks.bench_chunk_memory
+"""
+import gc
+import time
+import tracemalloc
+
+from classes.BasicClasses import Block, Chunk
+from classes.blocks.Materials import Material
+
+SIZE = 16
+HEIGHT = 256
+MATERIALS = [m for m in Material if not m.is_air()]
+
+
+def _material_at(x, y, z) -> Material:
+    return MATERIALS[(x + y + z) % len(MATERIALS)]
+
+
+def legacy_layout():
+    """The layout Chunk used to have: one Block per cell, keyed by a formatted string"""
+    blocks = {}
+    for x in range(SIZE):
+        for y in range(HEIGHT):
+            for z in range(SIZE):
+                blocks["{},{},{}".format(x, y, z)] = Block(x, y, z, _material_at(x, y, z), {})
+    return blocks
+
+
+def palette_layout():
+    chunk = Chunk(0, 0, 0, [], None, SIZE, HEIGHT)
+    for x in range(SIZE):
+        for y in range(HEIGHT):
+            for z in range(SIZE):
+                chunk.set_block(x, y, z, _material_at(x, y, z))
+    return chunk
+
+
+def measure(layout):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = layout()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    return size, elapsed
+
+
+def main():
+    print('Fully populated %dx%dx%d chunk' % (SIZE, HEIGHT, SIZE))
+    for name, layout in (('dict of Blocks', legacy_layout), ('palette', palette_layout)):
+        size, elapsed = measure(layout)
+        print('%-16s %10.1f KiB %8.1f ms' % (name, size / 1024, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
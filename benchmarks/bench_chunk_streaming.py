@@ -0,0 +1,90 @@
+# coding=utf-8
+"""
+Streams chunks to a player flying in a straight line at 64 blocks/s through a new world, ticking every 50 ms.
+Chunks are generated on a MultiProcessing worker by the ChunkLoader, then for comparison in the tick itself.
+Reports the time spent in ChunkStreamer.tick, the time to the first chunk & the queue depth.
+Run with: python -m benchmarks.bench_chunk_streaming [ticks]
+"""
+import sys
+import tempfile
+import time
+from concurrent.futures import Future
+
+from classes import WorldIO
+from classes.BasicClasses import Chunk
+from classes.ChunkStreamer import ChunkLoader, ChunkStreamer
+from classes.WorldGenerator import ChunkGenerationService, generate_chunk_column
+from classes.mcPy.MultiProcessing import MultiProcessing
+from classes.utils.Vector import Vector3D
+
+SEED = 1234
+VIEW_DISTANCE = 4
+BLOCKS_PER_TICK = 3.2
+
+
+class _Player:
+    entity_id = 1
+    display_name = 'bench'
+
+    def __init__(self):
+        self.entity_location = Vector3D(0, 100, 0)
+        self.view_distance = VIEW_DISTANCE
+
+
+class BlockingLoader:
+    """ Generates chunks in the tick, as loading them synchronously would """
+
+    def load(self, chunk_x: int, chunk_z: int) -> Future:
+        future = Future()
+        future.set_result(Chunk.from_bytes(generate_chunk_column(chunk_x, chunk_z, SEED)[0]))
+        return future
+
+
+def run(loader, ticks: int) -> dict:
+    player = _Player()
+    streamer = ChunkStreamer(player, loader)
+    durations = []
+    depths = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        streamer.tick()
+        duration = time.perf_counter() - start
+        durations.append(duration)
+        depths.append(streamer.queue_depth)
+        player.entity_location = player.entity_location + Vector3D(BLOCKS_PER_TICK, 0, 0)
+        time.sleep(max(0.0, 0.05 - duration))
+    durations.sort()
+    return {
+        'p50': durations[len(durations) // 2] * 1000,
+        'p99': durations[int(len(durations) * 0.99)] * 1000,
+        'max': durations[-1] * 1000,
+        'first': (streamer.time_to_first_chunk or float('nan')) * 1000,
+        'sent': streamer.chunks_sent,
+        'depth': sum(depths) / len(depths),
+    }
+
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    multi_processing = MultiProcessing(None, 1)
+    multi_processing.start()
+    try:
+        print('%-10s %9s %9s %9s %12s %6s %11s' % ('', 'p50 ms', 'p99 ms', 'max ms', 'first chunk', 'sent',
+                                                   'mean queue'))
+        for name, make_loader in (
+                ('async', lambda: ChunkLoader(ChunkGenerationService(multi_processing, SEED))),
+                ('blocking', BlockingLoader)):
+            with tempfile.TemporaryDirectory() as world:
+                WorldIO.open_world(world)
+                try:
+                    stats = run(make_loader(), ticks)
+                finally:
+                    WorldIO.close_world()
+            print('%-10s %9.2f %9.2f %9.2f %9.0f ms %6d %11.1f' % (
+                name, stats['p50'], stats['p99'], stats['max'], stats['first'], stats['sent'], stats['depth']))
+    finally:
+        multi_processing.stop()
+
+
+if __name__ == '__main__':
+    main()
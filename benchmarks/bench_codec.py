@@ -0,0 +1,103 @@
+# coding=utf-8
+"""
+Encodes packets with the hand written encoders of v1_15_2 (a chain of buff_type.pack calls joined afterwards)
+and with the encoders compiled from its field schemas (precompiled structs written into one bytearray),
+then decodes client settings both ways.
+Run with: python -m benchmarks.bench_codec [packets]
+"""
+import sys
+import time
+
+from quarry.types.buffer import Buffer1_14
+
+from classes.network.versions.v578 import v1_15_2, v1_15_2_Input
+
+
+class HandWritten:
+    """ The encoders & decoder of v1_15_2 before they were compiled """
+
+    @staticmethod
+    def join_game(buff_type, entity_id=0, gamemode=0, dimension=0, hashed_seed=0, max_player=1, level_type='flat',
+                  view_distance=8, reduced_debug_info=True, show_respawn_screen=True):
+        return [
+            buff_type.pack("iBiqB", entity_id, gamemode, dimension, hashed_seed, max_player),
+            buff_type.pack_string(level_type),
+            buff_type.pack_varint(view_distance),
+            buff_type.pack('??', reduced_debug_info, show_respawn_screen)
+        ]
+
+    @staticmethod
+    def player_position_and_look(buff_type, x=0, y=0, z=0, yaw=0.0, pitch=0.0, flags=0, entity_id=0):
+        return [
+            buff_type.pack('dddff?', x, y, z, yaw, pitch, flags),
+            buff_type.pack_varint(entity_id)
+        ]
+
+    @staticmethod
+    def time_update(buff_type, game_time=0, day_time=0):
+        return [
+            buff_type.pack('QQ', game_time, day_time)
+        ]
+
+    @staticmethod
+    def chat_message(buff_type, message=None):
+        return [
+            buff_type.pack_chat(message) + buff_type.pack('B', 0)
+        ]
+
+    @staticmethod
+    def client_settings(buff_type):
+        locale = buff_type.unpack_string()
+        view_distance = buff_type.unpack('b')
+        chat_mode = buff_type.unpack_varint()
+        chat_color = buff_type.unpack('?')
+        skin_parts = buff_type.unpack('B')
+        main_hand = buff_type.unpack_varint()
+        return {
+            'locale': locale,
+            'view_distance': view_distance,
+            'chat_mode': chat_mode,
+            'chat_color': chat_color,
+            'skin_parts': skin_parts,
+            'main_hand': main_hand,
+        }
+
+
+PACKETS = [
+    ('join_game', {'entity_id': 42, 'gamemode': 1, 'dimension': 0, 'hashed_seed': 123456789, 'max_player': 20,
+                   'level_type': 'default', 'view_distance': 10}),
+    ('player_position_and_look', {'x': 12.5, 'y': 72.0, 'z': -300.25, 'yaw': 90.0, 'pitch': 0.0, 'entity_id': 1234}),
+    ('time_update', {'game_time': 123456, 'day_time': 6000}),
+    ('chat_message', {'message': u'<Player> Hello'}),
+]
+
+
+def _per_packet(function, count: int) -> float:
+    """ Nanoseconds per call of function(), best of 5 """
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            function()
+        best = min(best, (time.perf_counter_ns() - start) / count)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print('%-26s %12s %12s' % ('', 'hand written', 'compiled'))
+    for packet, data in PACKETS:
+        old, new = getattr(HandWritten, packet), getattr(v1_15_2, packet)
+        assert b''.join(old(Buffer1_14, **data)) == b''.join(new(Buffer1_14, **data))
+        before = _per_packet(lambda: b''.join(old(Buffer1_14, **data)), count)
+        after = _per_packet(lambda: b''.join(new(Buffer1_14, **data)), count)
+        print('%-26s %9.0f ns %9.0f ns   x%.1f' % (packet, before, after, before / after))
+    settings = Buffer1_14.pack_string('en_US') + Buffer1_14.pack('b', 8) + Buffer1_14.pack_varint(0) + \
+        Buffer1_14.pack('?B', True, 0x7f) + Buffer1_14.pack_varint(1)
+    before = _per_packet(lambda: HandWritten.client_settings(Buffer1_14(settings)), count)
+    after = _per_packet(lambda: v1_15_2_Input.client_settings(Buffer1_14(settings)), count)
+    print('%-26s %9.0f ns %9.0f ns   x%.1f' % ('client_settings (decode)', before, after, before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# coding=utf-8
+"""
+Frames the chunk data packets of generated chunks for many viewers: compressed for every viewer like quarry's
+send_packet does, through the Compressor cache on the network thread & through the Compressor thread pool.
+Network thread time is the CPU time of the thread framing packets, the one running the reactor.
+Run with: python -m benchmarks.bench_compression [viewers]
+"""
+import sys
+import time
+
+from quarry.types.buffer import Buffer1_14
+
+from classes.BasicClasses import Chunk
+from classes.WorldGenerator import generate_chunk_column
+from classes.network.Compression import Compressor
+from classes.network.versions.v578 import v1_15_2
+
+SEED = 1234
+CHUNKS = 16
+THRESHOLD = 256
+CHUNK_DATA = 0x22
+
+
+def per_viewer(packets: [bytes], viewers: int):
+    for data in packets:
+        for _ in range(viewers):
+            Buffer1_14.pack_packet(data, THRESHOLD)
+
+
+def with_compressor(workers: int):
+    def frame(packets: [bytes], viewers: int):
+        compressor = Compressor(workers)
+        frames = [compressor.frame(Buffer1_14, data, THRESHOLD) for data in packets for _ in range(viewers)]
+        for frame in frames:
+            if not isinstance(frame, bytes):
+                frame.result()
+        compressor.shutdown()
+        return compressor.stats.take()
+    return frame
+
+
+def main():
+    viewers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    chunks = [Chunk.from_bytes(generate_chunk_column(x, 0, SEED)[0]) for x in range(CHUNKS)]
+    packets = [Buffer1_14.pack_varint(CHUNK_DATA) + b''.join(v1_15_2.chunk_data(Buffer1_14, chunk))
+               for chunk in chunks]
+    print('%d chunk packets of %.1f KiB, %d viewers each' % (CHUNKS, len(packets[0]) / 1024, viewers))
+    for name, run in (('per viewer', per_viewer), ('cached', with_compressor(0)), ('pool', with_compressor(2))):
+        start = time.perf_counter()
+        thread_start = time.thread_time()
+        stats = run(packets, viewers)
+        thread_time = time.thread_time() - thread_start
+        elapsed = time.perf_counter() - start
+        line = '%-11s %8.1f ms total   %8.1f ms network thread' % (name, elapsed * 1000, thread_time * 1000)
+        if stats:
+            line += '   ratio %.2f, %d compressed, %d cache hits' % (stats['ratio'], stats['compressed'],
+                                                                     stats['cache_hits'])
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
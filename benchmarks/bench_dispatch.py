@@ -0,0 +1,136 @@
+# coding=utf-8
+"""
+Dispatch overhead per packet, with quarry's tuple keyed dicts & getattr lookups PlayerNetwork used before and with
+the integer indexed DispatchTable: receiving keep alive packets, encoding & framing a packet & running a server action.
+Run with: python -m benchmarks.bench_dispatch [packets]
+"""
+import sys
+import time
+
+from quarry.data import packets
+from quarry.net.protocol import Protocol, ProtocolError
+from quarry.types.buffer import Buffer1_14
+from twisted.internet.address import IPv4Address
+
+from classes.network.Connection import PlayerNetwork, ServerFactory, get_dispatch_table
+from classes.network.IncomingPacketAction import ServerAction, ServerActionType
+from classes.network.PacketType import PacketType
+from classes.network.versions.v578 import v1_15_2
+
+PROTOCOL = 578
+
+
+class _Transport:
+    def write(self, data):
+        pass
+
+    def loseConnection(self):
+        pass
+
+
+class NewPlayer(PlayerNetwork):
+    def packet_keep_alive(self, buff):
+        buff.discard()
+
+
+class OldPlayer(NewPlayer):
+    """ quarry's data_received & the lookups of PlayerNetwork before dispatch tables """
+    data_received = Protocol.data_received
+
+    def get_packet_name(self, ident):
+        key = (self.protocol_version, self.protocol_mode, self.recv_direction, ident)
+        try:
+            return packets.packet_names[key]
+        except KeyError:
+            raise ProtocolError("No name known for packet: %s" % (key,))
+
+    def get_packet_ident(self, name):
+        key = (self.protocol_version, self.protocol_mode, self.send_direction, name)
+        try:
+            return packets.packet_idents[key]
+        except KeyError:
+            raise ProtocolError("No ID known for packet: %s" % (key,))
+
+    def make_packet(self, packet_type: PacketType, data):
+        packet_class = getattr(v1_15_2, packet_type.id, None)
+        if packet_class:
+            return packet_class(self.buff_type, **data)
+        return None
+
+    def prepare_packet(self, packet_type: PacketType, body: bytes):
+        data = self.buff_type.pack_varint(self.get_packet_ident(packet_type.id)) + body
+        return self.buff_type.pack_packet(data)
+
+
+class NewFraming(NewPlayer):
+    def prepare_packet(self, packet_type: PacketType, body: bytes):
+        data = self.buff_type.pack_varint(self._dispatch.packet_idents[packet_type.index]) + body
+        return self.buff_type.pack_packet(data)
+
+
+class _Actions(ServerAction):
+    def client_settings(self, **data):
+        pass
+
+
+def _player(cls) -> PlayerNetwork:
+    player = cls(ServerFactory(), IPv4Address('TCP', '127.0.0.1', 25565))
+    player.transport = _Transport()
+    player.protocol_version = PROTOCOL
+    player.buff_type = Buffer1_14
+    player.protocol_mode = 'play'
+    player._update_dispatch()
+    return player
+
+
+def _per_packet(function, count: int) -> float:
+    """ Nanoseconds per call of function(), best of 5 """
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            function()
+        best = min(best, (time.perf_counter_ns() - start) / count)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    keep_alive = Buffer1_14.pack_packet(Buffer1_14.pack_varint(15) + bytes(8))
+    batch = keep_alive * 100
+    old, new, framing = _player(OldPlayer), _player(NewPlayer), _player(NewFraming)
+    data = {'game_time': 1, 'day_time': 2}
+    actions = _Actions(None)
+    handlers = [getattr(actions, action.id, None) for action in ServerActionType]
+    action = ServerActionType.CLIENT_SETTINGS
+    table = get_dispatch_table(PROTOCOL)
+
+    rows = [
+        ('receive (per packet)',
+         _per_packet(lambda: old.data_received(batch), count // 100) / 100,
+         _per_packet(lambda: new.data_received(batch), count // 100) / 100),
+        ('packet id -> handler',
+         _per_packet(lambda: getattr(old, 'packet_' + old.get_packet_name(15)), count),
+         _per_packet(lambda: new._handlers[15], count)),
+        ('packet type -> encoder & id',
+         _per_packet(lambda: (getattr(v1_15_2, PacketType.TIME_UPDATE.id),
+                              old.get_packet_ident(PacketType.TIME_UPDATE.id)), count),
+         _per_packet(lambda: (table.encoders[PacketType.TIME_UPDATE.index],
+                              table.packet_idents[PacketType.TIME_UPDATE.index]), count)),
+        ('encode & frame',
+         _per_packet(lambda: old.prepare_packet(PacketType.TIME_UPDATE,
+                                                b''.join(old.make_packet(PacketType.TIME_UPDATE, data))), count),
+         _per_packet(lambda: framing.prepare_packet(PacketType.TIME_UPDATE,
+                                                    b''.join(framing.make_packet(PacketType.TIME_UPDATE, data))),
+                     count)),
+        ('action -> handler',
+         _per_packet(lambda: getattr(actions, action.id, None), count),
+         _per_packet(lambda: handlers[action.index], count)),
+    ]
+    print('%-28s %12s %12s' % ('', 'lookups', 'tables'))
+    for name, before, after in rows:
+        print('%-28s %9.0f ns %9.0f ns   x%.1f' % (name, before, after, before / after))
+
+
+if __name__ == '__main__':
+    main()
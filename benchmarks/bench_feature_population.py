@@ -0,0 +1,121 @@
+# coding=utf-8
+"""
+Populates chunks with trees and ore veins using the old block by block feature code and the template based one.
+Run with: python -m benchmarks.bench_feature_population [chunks]
+"""
+import random
+import sys
+import time
+from random import choice, randint
+
+from classes.BasicClasses import SECTION_HEIGHT, Chunk
+from classes.TerrainFeatures import AbstractTreeGenerator, MatchstickTreeGenerator, OreFeature, _generate_block, \
+    _is_air
+from classes.WorldIO import PendingEditStore
+from classes.blocks.Materials import Material
+
+SURFACE = 64
+TREES = 8  # Attempts per chunk
+VEINS = 24
+
+
+class LegacyOreFeature(OreFeature):
+    """ Ore veins as they were generated before templates """
+
+    def generation_attempt(self, pending_edits, random, chunk, chunk_x, chunk_y, chunk_z, is_top_layer):
+        if not is_top_layer and random < self.chance and self.max_y > chunk_y > self.min_y:
+            blobsize = randint(self.batch_min, self.batch_max)
+            for x in range(blobsize):
+                delta_x = round(x/3 + 0.66)
+                delta_y = round(x/3 + 0.33)
+                delta_z = round(x/3)
+                _generate_block(pending_edits, chunk, [chunk_x + delta_x, chunk_y + delta_y, chunk_z + delta_z],
+                                self._ore)
+
+
+class LegacyTreeGenerator(AbstractTreeGenerator):
+    """ Trees as they were generated before templates, with the air checks fixed so both do the same work """
+
+    def _legacy_leaves(self):
+        plot = [[0, 0, 0]]
+        for y in (0, -1):
+            plot.extend(([-1, y, 0], [0, y, -1], [0, y, 1], [1, y, 0]))
+        for obj in ([-1, -1, -1], [-1, -1, 1], [1, -1, -1], [1, -1, 1]):
+            if choice((True, False)):
+                plot.append(obj)
+        for y in (-2, -3):
+            for x in range(-2, 2):
+                for z in range(-2, 2):
+                    if (x == 0 and z == 0) or (abs(x) == 2 and abs(z) == 2):
+                        continue
+                    plot.append([x, y, z])
+        for y in (-2, -3):
+            for obj in ([-2, y, -2], [-2, y, 2], [2, y, -2], [2, y, 2]):
+                if choice((True, False)):
+                    plot.append(obj)
+        return plot
+
+    def generation_attempt(self, pending_edits, random, chunk, chunk_x, chunk_y, chunk_z, is_top_layer):
+        if is_top_layer and random < self.chance:
+            height = randint(self.min_y, self.max_y)
+            for delta_y in range(height):
+                if not _is_air(chunk, chunk_x, chunk_y + delta_y, chunk_z):
+                    return
+            for delta_y in range(height):
+                _generate_block(pending_edits, chunk, [chunk_x, chunk_y + delta_y, chunk_z], self._trunk)
+            for b in self._legacy_leaves():
+                pos = [chunk_x + b[0], chunk_y + b[1] + height, chunk_z + b[2]]
+                if not _is_air(chunk, pos[0], pos[1], pos[2]):
+                    continue
+                _generate_block(pending_edits, chunk, pos, self._leaves_mat)
+
+
+def features(legacy):
+    ore, tree = (LegacyOreFeature, LegacyTreeGenerator) if legacy else (OreFeature, AbstractTreeGenerator)
+    return ([ore(Material.COAL_ORE, 100, 0, 128, 5, 16), ore(Material.IRON_ORE, 100, 0, 64, 6, 8)],
+            [tree(Material.OAK_LOG, Material.OAK_LEAVES, 100, 4, 8),
+             tree(Material.BIRCH_LOG, Material.BIRCH_LEAVES, 100, 5, 8)])
+
+
+def terrain(chunk_x, chunk_z):
+    chunk = Chunk(chunk_x, 0, chunk_z, [], None, 16, 256)
+    layer = 16 * 16
+    for section_y in range(SURFACE // SECTION_HEIGHT + 1):
+        indices = bytearray(layer * SECTION_HEIGHT)
+        for y in range(SECTION_HEIGHT):
+            world_y = section_y * SECTION_HEIGHT + y
+            value = 1 if world_y < SURFACE else 2 if world_y == SURFACE else 0
+            indices[y * layer:(y + 1) * layer] = bytes((value,)) * layer
+        chunk.sections[section_y].load((Material.AIR, Material.STONE, Material.GRASS_BLOCK), indices)
+    return chunk
+
+
+def run(chunk_count, legacy):
+    random.seed(1234)
+    ores, trees = features(legacy)
+    chunks = [terrain(i, 0) for i in range(chunk_count)]
+    pending = PendingEditStore()
+    start = time.perf_counter()
+    for chunk in chunks:
+        for _ in range(VEINS):
+            ores[randint(0, 1)].generation_attempt(pending, 0, chunk, randint(0, 15), randint(1, 60), randint(0, 15),
+                                                   False)
+        for _ in range(TREES):
+            trees[randint(0, 1)].generation_attempt(pending, 0, chunk, randint(0, 15), SURFACE + 1, randint(0, 15),
+                                                    True)
+        pending.apply(chunk)
+    return time.perf_counter() - start, sum(section.non_air for chunk in chunks for section in chunk.sections)
+
+
+def main():
+    chunk_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print('%d chunks, %d vein & %d tree attempts each' % (chunk_count, VEINS, TREES))
+    baseline = None
+    for name, legacy in (('block by block', True), ('templates', False)):
+        elapsed, blocks = run(chunk_count, legacy)
+        baseline = baseline or elapsed
+        print('%-16s %8.1f ms  (x%.2f, %d non-air blocks)' % (name, elapsed * 1000, baseline / elapsed, blocks))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# coding=utf-8
+"""
+Sends TIME_UPDATE packets from this process to a network process, through the old pickled dicts on a
+multiprocessing.Queue and through encoded frames on the shared memory RingBuffer, then through the per player queue.
+game_time carries the send time, so the receiving side measures the latency of each hop.
+Run with: python -m benchmarks.bench_ipc [packets]
+"""
+import multiprocessing
+import struct
+import sys
+import time
+from queue import Empty
+
+from classes.network.Connection import get_buff_type
+from classes.network.IPC import Opcode, RingBuffer, pack_frame, unpack_frame
+from classes.network.PacketType import PacketType
+from classes.network.versions.v578 import v1_15_2
+
+PROTOCOL = 578
+PACED = 500  # Packets sent one at a time to measure latency without queueing
+
+
+def _dict_message(game_time: int) -> dict:
+    """ What NetworkController.send_packet used to put on its queue """
+    return {
+        'action': 'call_method',
+        'option': {
+            'name': 'send_packet',
+            'args': {
+                'packet_type': PacketType.TIME_UPDATE,
+                'data': {'game_time': game_time, 'day_time': 0},
+            },
+        },
+    }
+
+
+def _frame(game_time: int) -> [bytes]:
+    body = b''.join(v1_15_2.time_update(get_buff_type(PROTOCOL), game_time=game_time, day_time=0))
+    return pack_frame(Opcode.BROADCAST, PacketType.TIME_UPDATE, PROTOCOL, (), body)
+
+
+def _queue_receiver(queue: multiprocessing.Queue, results: multiprocessing.Queue, count: int):
+    latencies = []
+    for _ in range(count):
+        item = queue.get()
+        # The old dispatch: getattr on the factory, then one dict per player
+        data = item['option']['args']['data']
+        latencies.append(time.perf_counter_ns() - data['game_time'])
+    results.put((time.perf_counter_ns(), latencies))
+
+
+def _ring_receiver(ring: RingBuffer, results: multiprocessing.Queue, count: int):
+    latencies = []
+    while len(latencies) < count:
+        for frame in ring.read():
+            body = unpack_frame(frame)[4]
+            latencies.append(time.perf_counter_ns() - struct.unpack_from('>Q', body)[0])
+        if len(latencies) < count:
+            ring.wait(0.05)
+    results.put((time.perf_counter_ns(), latencies))
+
+
+def hop_process(name: str, count: int, paced: bool):
+    results = multiprocessing.Queue()
+    if name == 'queue':
+        channel = multiprocessing.Queue(100000)
+        target = _queue_receiver
+        send = lambda: channel.put(_dict_message(time.perf_counter_ns()))
+    else:
+        channel = RingBuffer(1 << 22)
+        target = _ring_receiver
+        send = lambda: channel.write(_frame(time.perf_counter_ns()))
+    process = multiprocessing.Process(target=target, args=(channel, results, count))
+    process.start()
+    time.sleep(0.2)
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        send()
+        if paced:
+            time.sleep(0.0005)
+    end, latencies = results.get()
+    process.join()
+    if name == 'ring':
+        channel.close()
+    latencies.sort()
+    return count / ((end - start) / 1e9), latencies[len(latencies) // 2] / 1000, latencies[-len(latencies) // 100] / 1000
+
+
+def hop_player(count: int):
+    """ The per player queue, in the network process: dicts to encode before, encoded packets now """
+    results = {}
+    for name, item in (('dict', {'packet_type': PacketType.TIME_UPDATE, 'data': {'game_time': 0, 'day_time': 0}}),
+                       ('encoded', (PacketType.TIME_UPDATE, bytes(17)))):
+        queue = multiprocessing.Queue(100000)
+        latencies = []
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            sent = time.perf_counter_ns()
+            queue.put_nowait(item)
+            while True:
+                try:
+                    queue.get_nowait()
+                    break
+                except Empty:
+                    pass
+            latencies.append(time.perf_counter_ns() - sent)
+        elapsed = time.perf_counter_ns() - start
+        latencies.sort()
+        results[name] = (count / (elapsed / 1e9), latencies[len(latencies) // 2] / 1000)
+    return results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print('%d packets' % count)
+    for name in ('queue', 'ring'):
+        throughput, _, _ = hop_process(name, count, False)
+        _, median, p99 = hop_process(name, PACED, True)
+        print('tick -> network  %-8s %9.0f packets/s   latency median %7.1f us   p99 %7.1f us' % (
+            name, throughput, median, p99))
+    for name, (throughput, median) in hop_player(min(count, 5000)).items():
+        print('network -> player %-8s %9.0f packets/s   latency median %7.1f us' % (name, throughput, median))
+
+
+if __name__ == '__main__':
+    main()
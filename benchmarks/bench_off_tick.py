@@ -0,0 +1,58 @@
+# coding=utf-8
+"""
+Ticks of a server saving a region file every 5 ticks, simulated with a 20 ms blocking write, run in the tick then
+with SchedulerManager.run_off_tick. Reports the tick durations & the queue wait of the off tick writes.
+Run with: python -m benchmarks.bench_off_tick [ticks]
+"""
+import sys
+import time
+
+from classes.utils.Profiler import percentile
+from classes.utils.Scheduler import SchedulerManager
+
+WRITE_SECONDS = 0.02
+SAVE_INTERVAL = 5
+
+
+class _Server:
+    pass
+
+
+def _write(region: int) -> int:
+    time.sleep(WRITE_SECONDS)
+    return region
+
+
+def run(ticks: int, off_tick: bool) -> (dict, SchedulerManager):
+    manager = SchedulerManager(_Server())
+    durations = []
+    for tick in range(1, ticks + 1):
+        start = time.perf_counter()
+        manager.tick(tick)
+        if tick % SAVE_INTERVAL == 0:
+            if off_tick:
+                manager.run_off_tick(_write, (tick,), timeout=100)
+            else:
+                _write(tick)
+        duration = time.perf_counter() - start
+        durations.append(duration)
+        time.sleep(max(0.0, 0.05 - duration))
+    manager.stop()
+    return {'p50': percentile(durations, 0.5) * 1000, 'p99': percentile(durations, 0.99) * 1000,
+            'max': max(durations) * 1000}, manager
+
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print('%-10s %9s %9s %9s' % ('', 'p50 ms', 'p99 ms', 'max ms'))
+    for name, off_tick in (('in tick', False), ('off tick', True)):
+        stats, manager = run(ticks, off_tick)
+        print('%-10s %9.2f %9.2f %9.2f' % (name, stats['p50'], stats['p99'], stats['max']))
+    stats = manager.async_stats()
+    print('Off tick: %d writes, queue wait %.3f ms (p99 %.3f), run %.2f ms, delivered %.2f ms after' % (
+        stats['completed'], stats['queue_wait_ms'], stats['queue_wait_p99_ms'], stats['run_ms'],
+        stats['delivery_wait_ms']))
+
+
+if __name__ == '__main__':
+    main()
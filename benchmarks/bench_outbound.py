@@ -0,0 +1,84 @@
+# coding=utf-8
+"""
+Compares the per player multiprocessing.Queue the network process used with OutboundBuffer:
+the cost of a player joining, then ticks queueing frames that are written to a socket, one send per frame before
+and one send per flush now.
+Run with: python -m benchmarks.bench_outbound [ticks]
+"""
+import multiprocessing
+import socket
+import sys
+import time
+from queue import Empty
+
+from classes.network.Connection import QUEUE_SIZE
+from classes.network.Outbound import OutboundBuffer
+
+JOINS = 100
+FRAMES = 40  # Frames per tick
+FRAME = bytes(60)
+
+
+def join_queue():
+    queue = multiprocessing.Queue(QUEUE_SIZE)
+    # The feeder thread starts with the first frame
+    queue.put_nowait(FRAME)
+    queue.get()
+    return queue
+
+
+def join_buffer():
+    buffer = OutboundBuffer()
+    buffer.append(FRAME)
+    buffer.flush(len)
+    return buffer
+
+
+def tick_queue(queue, sock: socket.socket) -> int:
+    for _ in range(FRAMES):
+        queue.put_nowait(FRAME)
+    sends = 0
+    received = 0
+    while received < FRAMES:
+        try:
+            frame = queue.get_nowait()
+        except Empty:
+            continue
+        sock.send(frame)
+        sends += 1
+        received += 1
+    return sends
+
+
+def tick_buffer(buffer: OutboundBuffer, sock: socket.socket) -> int:
+    for _ in range(FRAMES):
+        buffer.append(FRAME)
+    writes = buffer.writes
+    buffer.flush(sock.send)
+    return buffer.writes - writes
+
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    for name, join, tick in (('queue', join_queue, tick_queue), ('buffer', join_buffer, tick_buffer)):
+        start = time.perf_counter()
+        outbounds = [join() for _ in range(JOINS)]
+        join_time = (time.perf_counter() - start) / JOINS
+        writer, reader = socket.socketpair()
+        sends = 0
+        start = time.perf_counter()
+        for _ in range(ticks):
+            sends += tick(outbounds[0], writer)
+            reader.recv(1 << 20)
+        tick_time = (time.perf_counter() - start) / ticks
+        writer.close()
+        reader.close()
+        for outbound in outbounds:
+            if hasattr(outbound, 'close'):
+                outbound.close()
+        print('%-7s join %8.1f us   tick of %d frames %7.1f us   %5.1f sends/tick' % (
+            name, join_time * 1e6, FRAMES, tick_time * 1e6, sends / ticks))
+
+
+if __name__ == '__main__':
+    main()
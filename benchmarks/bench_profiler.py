@@ -0,0 +1,61 @@
+# coding=utf-8
+"""
+Cost of the TickProfiler: a tick with the 6 phases of Server.tick, profiled or not, then the slowdown of a 10 ms
+tick of Python work when the stacks of the tick thread are sampled.
+Run with: python -m benchmarks.bench_profiler [ticks]
+"""
+import sys
+import time
+
+from classes.utils.Profiler import TickProfiler
+
+PHASES = ('scheduler', 'entities', 'chunk_pins', 'network', 'players', 'time_update')
+
+
+def _work(iterations: int) -> int:
+    total = 0
+    for i in range(iterations):
+        total += i * i
+    return total
+
+
+def _per_tick(profiler: [TickProfiler, None], ticks: int, iterations: int) -> float:
+    """ Microseconds per tick """
+    start = time.perf_counter()
+    for _ in range(ticks):
+        if profiler is None:
+            for _ in PHASES:
+                _work(iterations)
+        else:
+            profiler.begin_tick()
+            for phase in PHASES:
+                _work(iterations)
+                profiler.mark(phase)
+            profiler.end_tick()
+    return (time.perf_counter() - start) * 1e6 / ticks
+
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    bare = min(_per_tick(None, ticks, 0) for _ in range(3))
+    profiled = min(_per_tick(TickProfiler(slow_tick=1), ticks, 0) for _ in range(3))
+    print('Empty tick: %.2f us, profiled: %.2f us (%.2f us per tick)' % (bare, profiled, profiled - bare))
+    # Calibrate _work so a tick takes about 10 ms
+    iterations = 1000
+    while _per_tick(None, 1, iterations) < 10000:
+        iterations *= 2
+    work_ticks = 200
+    bare = _per_tick(None, work_ticks, iterations)
+    profiled = _per_tick(TickProfiler(slow_tick=1), work_ticks, iterations)
+    sampled_profiler = TickProfiler(slow_tick=1, sampling=True)
+    sampled_profiler.start()
+    try:
+        sampled = _per_tick(sampled_profiler, work_ticks, iterations)
+    finally:
+        sampled_profiler.stop()
+    print('%.1f ms tick: profiled %+.2f%%, sampled %+.2f%%' % (bare / 1000, (profiled / bare - 1) * 100,
+                                                              (sampled / bare - 1) * 100))
+
+
+if __name__ == '__main__':
+    main()
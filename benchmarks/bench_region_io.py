@@ -0,0 +1,49 @@
+# coding=utf-8
+"""
+Saves and loads generated chunk columns through WorldIO and compares the throughput with generating them again.
+Run with: python -m benchmarks.bench_region_io [chunks per side]
+"""
+import sys
+import tempfile
+import time
+
+from classes import WorldIO
+from classes.BasicClasses import Chunk
+from classes.WorldGenerator import generate_chunk_column
+
+SEED = 1234
+
+
+def main():
+    side = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    positions = [(x, z) for x in range(side) for z in range(side)]
+    generate_chunk_column(-100, -100, SEED)  # Warm up the generator
+
+    start = time.perf_counter()
+    chunks = [Chunk.from_bytes(generate_chunk_column(x, z, SEED)[0]) for x, z in positions]
+    generation = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as world:
+        WorldIO.open_world(world)
+        try:
+            start = time.perf_counter()
+            for chunk in chunks:
+                WorldIO.saveChunk(chunk)
+            WorldIO.get_chunk_cache().flush()  # Saved chunks are only written back later
+            save = time.perf_counter() - start
+            # Reopen the world so no file is already opened
+            WorldIO.open_world(world)
+            start = time.perf_counter()
+            for x, z in positions:
+                WorldIO.getChunk(x, 0, z)
+            load = time.perf_counter() - start
+        finally:
+            WorldIO.close_world()
+
+    print('%d chunk columns' % (len(positions),))
+    for name, elapsed in (('generate', generation), ('save', save), ('load', load)):
+        print('%-10s %8.1f chunks/s' % (name, len(positions) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# coding=utf-8
+"""
+Reads every chunk of a full region file through the memory map of RegionFile and through buffered seek & read calls.
+Payloads are also fetched without decompressing them, since zlib takes most of the time of a full read.
+Run with: python -m benchmarks.bench_region_mmap [rounds]
+"""
+import mmap
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+from classes.RegionFile import REGION_SIZE, SECTOR_SIZE, RegionFile
+from classes.WorldGenerator import generate_chunk_column
+
+SEED = 1234
+SAMPLES = 4  # Generated chunks, copied over the whole region
+
+
+def read_mmap(region: RegionFile):
+    for z in range(REGION_SIZE):
+        for x in range(REGION_SIZE):
+            region.read_chunk(x, z)
+
+
+def read_buffered(region: RegionFile):
+    with open(region.path, 'rb') as f:
+        for location in region.locations:
+            f.seek((location >> 8) * SECTOR_SIZE)
+            data = f.read((location & 0xFF) * SECTOR_SIZE)
+            length = int.from_bytes(data[:4], 'big')
+            zlib.decompress(data[5:length + 4])
+
+
+def fetch_mmap(region: RegionFile):
+    with open(region.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped) as view:
+            for location in region.locations:
+                start = (location >> 8) * SECTOR_SIZE
+                length = int.from_bytes(view[start:start + 4], 'big')
+                view[start + 5:start + length + 4].release()
+
+
+def fetch_buffered(region: RegionFile):
+    with open(region.path, 'rb') as f:
+        for location in region.locations:
+            f.seek((location >> 8) * SECTOR_SIZE)
+            data = f.read((location & 0xFF) * SECTOR_SIZE)
+            length = int.from_bytes(data[:4], 'big')
+            data[5:length + 4]
+
+
+def measure(read, region: RegionFile, rounds: int):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        read(region)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    samples = [generate_chunk_column(x, 0, SEED)[0] for x in range(SAMPLES)]
+    with tempfile.TemporaryDirectory() as folder:
+        region = RegionFile(os.path.join(folder, 'r.0.0.mca'))
+        for z in range(REGION_SIZE):
+            for x in range(REGION_SIZE):
+                region.write_chunk(x, z, samples[(x + z) % SAMPLES])
+        print('Region of %d chunks, %.1f MiB, %d rounds' % (REGION_SIZE * REGION_SIZE,
+                                                          os.path.getsize(region.path) / 1048576, rounds))
+        for name, read in (('fetch buffered', fetch_buffered), ('fetch mmap', fetch_mmap),
+                           ('read buffered', read_buffered), ('read mmap', read_mmap)):
+            elapsed, peak = measure(read, region, rounds)
+            print('%-16s %9.1f chunks/s   peak %8.1f KiB' % (
+                name, rounds * REGION_SIZE * REGION_SIZE / elapsed, peak / 1024))
+        region.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# coding=utf-8
+"""
+Schedules 100k tasks due within 5 minutes of ticks, cancels half of them & runs every tick until all are done,
+with the SchedulerManager timer wheel & with the locked PriorityQueue it replaced (cancelled tasks flagged & skipped).
+Run with: python -m benchmarks.bench_scheduler [tasks]
+"""
+import random
+import sys
+import threading
+import time
+from queue import PriorityQueue
+
+from classes.utils.Scheduler import SchedulerManager
+
+TICKS = 6000
+
+
+class HeapTask:
+    def __init__(self, id, tick, func, **args):
+        self.id = id
+        self.tick = tick
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.tick, self.id) < (other.tick, other.id)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class HeapScheduler:
+    """ SchedulerManager before the timer wheel, with its call to add_pending fixed """
+
+    def __init__(self, server, current_tick=0):
+        self.server = server
+        self.current_tick = current_tick
+        self.next_id = 0
+        self.pending = PriorityQueue()
+        self._lock = threading.Lock()
+
+    def tick(self, current_tick):
+        self.current_tick = current_tick
+        while not self.pending.empty():
+            task = self.pending.get(False)
+            if task.tick <= current_tick:
+                if not task.cancelled:
+                    task.func(self.server, **task.args)
+            else:
+                self._add_pending(task)
+                break
+
+    def _add_pending(self, task):
+        with self._lock:
+            self.pending.put_nowait(task)
+
+    def schedule_after(self, after, func, **args):
+        self.next_id += 1
+        task = HeapTask(self.next_id, self.current_tick + max(after, 1), func, **args)
+        self._add_pending(task)
+        return task
+
+
+def _task(server, index):
+    server.runs += 1
+
+
+class _Server:
+    runs = 0
+
+
+def run(manager_type, delays: [int]) -> (float, float, float, int):
+    server = _Server()
+    manager = manager_type(server)
+    start = time.perf_counter()
+    tasks = [manager.schedule_after(delay, _task, index=index) for index, delay in enumerate(delays)]
+    scheduled = time.perf_counter()
+    for task in tasks[::2]:
+        task.cancel()
+    cancelled = time.perf_counter()
+    for tick in range(1, TICKS + 1):
+        manager.tick(tick)
+    ran = time.perf_counter()
+    return scheduled - start, cancelled - scheduled, ran - cancelled, server.runs
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(0)
+    delays = [rng.randrange(1, TICKS) for _ in range(count)]
+    print('%d tasks over %d ticks' % (count, TICKS))
+    print('%-14s %12s %12s %12s %12s' % ('', 'schedule', 'cancel half', 'run ticks', 'per tick'))
+    for name, manager_type in (('PriorityQueue', HeapScheduler), ('timer wheel', SchedulerManager)):
+        schedule, cancel, ticks, runs = run(manager_type, delays)
+        assert runs == count // 2
+        print('%-14s %9.1f ms %9.1f ms %9.1f ms %9.1f us' % (name, schedule * 1000, cancel * 1000, ticks * 1000,
+                                                             ticks * 1e6 / TICKS))
+
+
+if __name__ == '__main__':
+    main()
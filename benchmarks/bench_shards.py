@@ -0,0 +1,144 @@
+# coding=utf-8
+"""
+Load test of the sharded network processes: starts 1, 2 & 4 network processes sharing a port with SO_REUSEPORT
+(offline mode, no compression), then client processes log players in & make them send keep alive packets.
+Joins are counted as they reach the tick process through IN_QUEUE, keep alives as the network processes handle them.
+Throughput only scales with the shard count when there are as many free cores, the core count is printed.
+Run with: python -m benchmarks.bench_shards [players] [seconds]
+"""
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import time
+from queue import Empty
+
+from quarry.types.buffer import Buffer1_14
+
+from classes.network.Connection import NetworkController, PlayerNetwork, ServerFactory
+
+PROTOCOL = 578
+CLIENTS = 4  # Client processes
+KEEP_ALIVE_BATCH = 64  # Keep alive packets per send
+
+
+def _packet(ident: int, payload: bytes) -> bytes:
+    data = Buffer1_14.pack_varint(ident) + payload
+    return Buffer1_14.pack_varint(len(data)) + data
+
+
+def _free_port() -> int:
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def shard(index: int, shards: int, port: int, joins, keep_alives):
+    """ A network process counting the keep alive packets of its players in its slot of keep_alives """
+    class CountingPlayer(PlayerNetwork):
+        def packet_keep_alive(self, buff):
+            buff.discard()
+            keep_alives[index] += 1
+
+    NetworkController.IN_QUEUE = joins
+    factory = ServerFactory('127.0.0.1', port, compression_threshold=0, compression_workers=0, shard=index,
+                            reuse_port=shards > 1, online_mode=False)
+    factory.protocol = CountingPlayer
+    factory.max_players = 1 << 16
+    factory.pre_start_server()
+    factory.start_server()
+
+
+def client(port: int, players: int, name: str, deadline, ready, done):
+    """ Logs players in, waits for every login success, then sends keep alive packets until deadline.
+    Connections are closed once done is set, after the network processes stopped """
+    host = Buffer1_14.pack_string('127.0.0.1')
+    socks = []
+    for i in range(players):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(_packet(0, Buffer1_14.pack_varint(PROTOCOL) + host + struct.pack('>H', port) +
+                             Buffer1_14.pack_varint(2)) +
+                     _packet(0, Buffer1_14.pack_string('%s%d' % (name, i))))
+        socks.append(sock)
+    for sock in socks:
+        sock.recv(4096)  # Login success
+        sock.setblocking(False)
+    ready.wait()
+    deadline = deadline.value
+    batch = _packet(0x0F, struct.pack('>q', 0)) * KEEP_ALIVE_BATCH
+    while time.perf_counter() < deadline:
+        for sock in socks:
+            try:
+                sock.send(batch)
+                # Keep alive packets of the server
+                sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                pass
+    done.wait()
+    for sock in socks:
+        sock.close()
+
+
+def run(shards: int, players: int, seconds: float) -> (float, float):
+    """ Returns the joins per second & keep alive packets per second of the given number of network processes """
+    port = _free_port()
+    joins = multiprocessing.Queue()
+    keep_alives = multiprocessing.Array('q', shards, lock=False)
+    processes = [multiprocessing.Process(target=shard, args=(i, shards, port, joins, keep_alives))
+                 for i in range(shards)]
+    for process in processes:
+        process.start()
+    time.sleep(0.5 + 0.2 * shards)  # Let every shard listen
+
+    ready = multiprocessing.Event()
+    done = multiprocessing.Event()
+    deadline = multiprocessing.Value('d', 0.0)
+    start = time.perf_counter()
+    clients = []
+    for i in range(CLIENTS):
+        clients.append(multiprocessing.Process(target=client, args=(
+            port, players // CLIENTS, 'bench%d_' % i, deadline, ready, done)))
+        clients[-1].start()
+    joined = 0
+    per_shard = [0] * shards
+    while joined < players // CLIENTS * CLIENTS:
+        try:
+            item = joins.get(timeout=10)
+        except Empty:
+            break
+        joined += 1
+        per_shard[item['data']['shard']] += 1
+    join_rate = joined / (time.perf_counter() - start)
+
+    first = sum(keep_alives)
+    begin = time.perf_counter()
+    deadline.value = begin + seconds
+    ready.set()
+    time.sleep(seconds)
+    keep_alive_rate = (sum(keep_alives) - first) / (time.perf_counter() - begin)
+
+    for process in processes:
+        process.terminate()
+        process.join()
+    done.set()
+    for process in clients:
+        process.join(5)
+    print('%d shard(s)  %5d joins/s  %9.0f keep alives/s   players per shard %s' % (
+        shards, join_rate, keep_alive_rate, per_shard))
+    return join_rate, keep_alive_rate
+
+
+def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    print('%d players, %d client processes, %d cores' % (players, CLIENTS, os.cpu_count()))
+    for shards in (1, 2, 4):
+        run(shards, players, seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# coding=utf-8
+"""
+Runs ticks of 30 ms of work, 1 in 10 taking 120 ms, with the loop Server.start_internal_tick had (deadline = this
+tick's start + 50 ms, time.time & a plain sleep) & with a TickClock for each catch up policy.
+Reports the rate ticks ran at & how far tick starts were from their fixed schedule.
+Run with: python -m benchmarks.bench_tick_clock [seconds per run]
+"""
+import random
+import sys
+import time
+
+from classes.utils.TickClock import CatchUp, TickClock
+
+PERIOD = 0.05
+
+
+def _work(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def _durations(count: int) -> [float]:
+    rng = random.Random(0)
+    return [0.12 if rng.random() < 0.1 else 0.03 for _ in range(count)]
+
+
+def run_old(durations: [float]) -> [float]:
+    starts = []
+    for duration in durations:
+        start_tick_at = time.time()
+        starts.append(time.perf_counter())
+        _work(duration)
+        need_to_finish_in = start_tick_at + PERIOD - time.time()
+        if need_to_finish_in > 0:
+            time.sleep(need_to_finish_in)
+    return starts
+
+
+def run_clock(durations: [float], catch_up: CatchUp) -> [float]:
+    tick_clock = TickClock(catch_up=catch_up)
+    starts = []
+    for duration in durations:
+        tick_clock.wait()
+        starts.append(time.perf_counter())
+        _work(duration)
+    return starts
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    durations = _durations(int(seconds / PERIOD))
+    print('%-8s %8s %17s' % ('', 'TPS', 'schedule error'))
+    for name, run in (('old', run_old), ('burst', lambda d: run_clock(d, CatchUp.BURST)),
+                      ('skip', lambda d: run_clock(d, CatchUp.SKIP)),
+                      ('dilate', lambda d: run_clock(d, CatchUp.DILATE))):
+        starts = run(durations)
+        elapsed = starts[-1] - starts[0]
+        # Where the last tick started compared to where a 20 TPS schedule puts it
+        drift = elapsed - (len(starts) - 1) * PERIOD
+        print('%-8s %8.2f %+14.0f ms' % (name, (len(starts) - 1) / elapsed, drift * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# coding=utf-8
+"""
+Encodes & decodes varints with quarry's Buffer & with classes.network.VarInt: single values (packet ids, lengths),
+then batches the size of a section palette & of an entity id list.
+Run with: python -m benchmarks.bench_varint [repeats]
+"""
+import random
+import sys
+import time
+
+from quarry.types.buffer import Buffer1_14
+
+from classes.network.VarInt import pack_varint, pack_varints, read_varint, unpack_varints
+
+
+def _per_call(function, count: int) -> float:
+    """ Nanoseconds per call of function(), best of 5 """
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            function()
+        best = min(best, (time.perf_counter_ns() - start) / count)
+    return best
+
+
+def _row(name: str, before: float, after: float):
+    print('%-34s %11.0f ns %11.0f ns   x%.1f' % (name, before, after, before / after))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = random.Random(0)
+    print('%-34s %14s %14s' % ('', 'quarry', 'VarInt'))
+    for name, value in (('encode packet id', 33), ('encode length', 9000), ('encode large', 1 << 30),
+                        ('encode negative', -1)):
+        assert Buffer1_14.pack_varint(value) == pack_varint(value)
+        _row(name, _per_call(lambda: Buffer1_14.pack_varint(value), count),
+             _per_call(lambda: pack_varint(value), count))
+    for name, value in (('decode packet id', 33), ('decode length', 9000)):
+        data = Buffer1_14.pack_varint(value) + bytes(8)
+        _row(name, _per_call(lambda: Buffer1_14(data).unpack_varint(), count),
+             _per_call(lambda: read_varint(Buffer1_14(data)), count))
+    for name, size, limit in (('encode palette (16)', 16, 9131), ('encode palette (256)', 256, 9131),
+                              ('encode entity ids (4096)', 4096, 1 << 31)):
+        values = [rng.randrange(limit) for _ in range(size)]
+        data = b''.join(Buffer1_14.pack_varint(value) for value in values)
+        assert pack_varints(values) == data
+        repeats = max(1, count * 16 // size)
+        _row(name, _per_call(lambda: b''.join(Buffer1_14.pack_varint(value) for value in values), repeats),
+             _per_call(lambda: pack_varints(values), repeats))
+
+        def decode_all():
+            buff = Buffer1_14(data)
+            return [buff.unpack_varint() for _ in range(size)]
+        assert unpack_varints(data, size)[0].tolist() == decode_all()
+        _row(name.replace('encode', 'decode'), _per_call(decode_all, repeats),
+             _per_call(lambda: unpack_varints(data, size), repeats))
+
+
+if __name__ == '__main__':
+    main()
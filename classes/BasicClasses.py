@@ -1,10 +1,44 @@
 """Basic utility classes for mcpy, contains thinks like blocks, chunks and regions"""
 # coding=utf-8
-import asyncio
+import json
+import struct
+import sys
+from array import array
+from enum import Enum, auto
 
-from .Exceptions import OutOfBoundsError
+from .Exceptions import ChunkError, OutOfBoundsError
 from .blocks.Materials import Material
 
+# Height of a ChunkSection, a Chunk is made of as many sections as needed to reach its height
+SECTION_HEIGHT = 16
+
+# Serialized chunks, see Chunk.to_bytes: header, material names, sections, block data then heightmaps
+_CHUNK_HEADER = struct.Struct('<BiiiHHH')
+_CHUNK_FORMAT_VERSION = 2  # Version 1 had no heightmaps
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+
+
+class Heightmap(Enum):
+    """ Heightmaps kept by every Chunk: for each column, one more than the y of its highest block
+    matching the heightmap, or 0 if none does """
+    MOTION_BLOCKING = auto()  # Blocks entities collide with & fluids
+    WORLD_SURFACE = auto()  # Any block but air
+    OCEAN_FLOOR = auto()  # Blocks entities collide with
+
+    def matches(self, material: Material) -> bool:
+        if self is Heightmap.WORLD_SURFACE:
+            return not material.is_air()
+        if self is Heightmap.MOTION_BLOCKING:
+            return material.blocks_motion() or material.is_fluid()
+        return material.blocks_motion()
+
+
+# For each Material, whether it matches each Heightmap, in Heightmap order
+HEIGHTMAP_MATCHES: {Material: (bool, bool, bool)} = {material: tuple(heightmap.matches(material)
+                                                                     for heightmap in Heightmap)
+                                                     for material in Material}
+
 
 class Block:
     def __init__(self, x: int, y: int, z: int, _material: Material, data: [dict, None]):
@@ -13,7 +47,7 @@ class Block:
         self.zPos = z
         self.id = _material
         self.blockData = data
-        
+
     def get_material(self) -> Material:
         """Returns a block's material enum"""
         return self.id
@@ -34,9 +68,128 @@ class Region:
         return self.subChunkList["{0},{1}".format(x, y)].getChunk()
 
 
+class ChunkSection:
+    """
+    A size * SECTION_HEIGHT * size slice of a Chunk.
+    Blocks are stored as a palette of Materials plus one palette index per cell, in YZX order.
+    Indices are kept in a bytearray while the palette fits in a byte, and in an array('H') once it doesn't.
+    """
+
+    def __init__(self, size=16, fill: Material = Material.AIR):
+        self.size = size
+        self.palette: [Material] = [fill]
+        self._palette_lookup: {Material: int} = {fill: 0}
+        self.indices = bytearray(size * SECTION_HEIGHT * size)
+        self.non_air = 0 if fill.is_air() else len(self.indices)
+        # Serialized forms of the section (such as network packets) keyed by their encoder, dropped on every change
+        self.encoded: {object: bytes} = {}
+
+    def changed(self):
+        """Drops the serialized forms of the section, must be called after writing to the indices directly"""
+        self.encoded.clear()
+
+    def index(self, x: int, y: int, z: int) -> int:
+        """Returns the cell index of a position relative to the section"""
+        return (y * self.size + z) * self.size + x
+
+    def get_material(self, index: int) -> Material:
+        return self.palette[self.indices[index]]
+
+    def set_material(self, index: int, material: Material) -> Material:
+        """Sets the Material of a cell and returns the one it replaced"""
+        old = self.palette[self.indices[index]]
+        if old is material:
+            return old
+        self.indices[index] = self.palette_index(material)
+        self.encoded.clear()
+        if old.is_air() != material.is_air():
+            self.non_air += -1 if material.is_air() else 1
+        return old
+
+    def find_material(self, material: Material) -> [int, None]:
+        """Returns the palette index of a Material, or None if the section has none of it"""
+        return self._palette_lookup.get(material)
+
+    def palette_index(self, material: Material) -> int:
+        """Returns the palette index of a Material, adding it to the palette if needed.
+        Adding it may widen the indices, so the indices must be read after calling this"""
+        palette_index = self._palette_lookup.get(material)
+        if palette_index is None:
+            palette_index = self._add_to_palette(material)
+        return palette_index
+
+    def _add_to_palette(self, material: Material) -> int:
+        palette_index = len(self.palette)
+        if palette_index == 256 and isinstance(self.indices, bytearray):
+            # The palette doesn't fit in a byte anymore, widen every index (array() would reinterpret the buffer)
+            self.indices = array('H', iter(self.indices))
+        self.palette.append(material)
+        self._palette_lookup[material] = palette_index
+        return palette_index
+
+    def set_materials(self, changes: {int: Material}):
+        """Sets the Material of many cells at once, given as {cell index: Material}.
+        The palette is rewritten once for the whole batch: new Materials are added, unused ones are dropped"""
+        lookup = self._palette_lookup
+        for material in dict.fromkeys(changes.values()):
+            if material not in lookup:
+                self._add_to_palette(material)
+        indices = self.indices
+        for index, material in changes.items():
+            indices[index] = lookup[material]
+        self.encoded.clear()
+        counts = [indices.count(palette_index) for palette_index in range(len(self.palette))]
+        self.non_air = sum(count for count, material in zip(counts, self.palette) if not material.is_air())
+        if 0 in counts:
+            self._compact_palette(counts)
+
+    def _compact_palette(self, counts: [int]):
+        used = [palette_index for palette_index, count in enumerate(counts) if count]
+        remap = {old: new for new, old in enumerate(used)}
+        palette = [self.palette[palette_index] for palette_index in used]
+        if isinstance(self.indices, bytearray):
+            table = bytearray(256)
+            for old, new in remap.items():
+                table[old] = new
+            indices = self.indices.translate(table)
+        else:
+            indices = [remap[palette_index] for palette_index in self.indices]
+        self.load(palette, indices)
+
+    def layer_flags(self, y: int, flags: [bool]) -> bytes:
+        """Maps each cell of a horizontal layer to the flag of its palette entry, as one byte per cell in ZX order"""
+        layer = self.size * self.size
+        indices = self.indices[y * layer:(y + 1) * layer]
+        if isinstance(indices, bytearray):
+            return indices.translate(bytes(flags) + bytes(256 - len(flags)))
+        return bytes(flags[palette_index] for palette_index in indices)
+
+    def fill_layer(self, y: int, material: Material):
+        """Sets every cell of a horizontal layer of the section to the given Material"""
+        layer = self.size * self.size
+        for index in range(y * layer, (y + 1) * layer):
+            self.set_material(index, material)
+
+    def load(self, palette: [Material], indices):
+        """Replaces the whole section with a palette and one palette index per cell, in YZX order.
+        Indices are read as bytes while the palette fits in a byte, as ints otherwise"""
+        if len(indices) != len(self.indices):
+            raise OutOfBoundsError("Expected {0} block indices for a section, got {1}".format(len(self.indices),
+                                                                                             len(indices)))
+        self.palette = list(palette)
+        self._palette_lookup = {material: palette_index for palette_index, material in enumerate(self.palette)}
+        self.indices = bytearray(indices) if len(self.palette) <= 256 else array('H', iter(indices))
+        self.encoded.clear()
+        self.non_air = sum(self.indices.count(palette_index)
+                           for palette_index, material in enumerate(self.palette) if not material.is_air())
+
+    def is_empty(self) -> bool:
+        return self.non_air == 0
+
+
 class Chunk:
     def __getitem__(self, item):
-        return self.blocks[item]
+        return self.get_block(*item)
 
     def __init__(self, x: int, y: int, z: int, blockList: [[Block], None], subRegion: Region, size=16, height=16):
         self.xPos = x
@@ -44,28 +197,229 @@ class Chunk:
         self.zPos = z
         self.size = size
         self.height = height
-        self.blocks = blockList
-        if self.blocks is None:
-            self.blocks = {}
-            for a in range(self.size):
-                for b in range(self.height):
-                    for c in range(self.size):
-                        if b == 0:
-                            asyncio.get_event_loop().run_until_complete(self.addNewBlock(a, b, c, Block(a, b, c, Material.BEDROCK, {})))  # Flat bedrock at y=0
-                        else:
-                            asyncio.get_event_loop().run_until_complete(self.addNewBlock(a, b, c, Block(a, b, c, Material.AIR, {})))
+        self.sections: [ChunkSection] = [ChunkSection(size) for _ in range(-(-height // SECTION_HEIGHT))]
+        # Only cells carrying blockData or a BlockEntity keep their Block object, keyed by cell index
+        self.blocks: {int: Block} = {}
+        # One height per column, indexed by z * size + x
+        self.heightmaps: {Heightmap: array} = {heightmap: array('H', [0]) * (size * size) for heightmap in Heightmap}
+        if blockList is None:
+            self.sections[0].fill_layer(0, Material.BEDROCK)  # Flat bedrock at y=0
+            self.update_heightmaps()
+        else:
+            for block in blockList:
+                self.set_block(block.xPos, block.yPos, block.zPos, block)
 
-    async def addNewBlock(self, x: int, y: int, z: int, block: Block) -> None:
-        if x - 1 > self.size or z - 1 > self.size:
+    def _check_bounds(self, x: int, y: int, z: int):
+        if not (0 <= x < self.size and 0 <= z < self.size):
             raise OutOfBoundsError(
                 "New block location is out of the chunk at {0}, {1}: trying to place a block at {2},"
                 "{3} in a {4} block wide chunk!".format(self.xPos, self.zPos, x, z, self.size))
-        elif y - 1 > self.height:
+        elif not 0 <= y < self.height:
             raise OutOfBoundsError("New block location is out of the chunk at {0}, {1}: trying to place a "
                                    "block at y={2} in a {3} block tall chunk!".format(self.xPos,
                                                                                       self.zPos, y,
                                                                                       self.height))
-        self.blocks["{},{},{}".format(x, y, z)] = block
+
+    def get_material(self, x: int, y: int, z: int) -> Material:
+        """Returns the Material at a position relative to the chunk, without building a Block"""
+        self._check_bounds(x, y, z)
+        section_y, y = divmod(y, SECTION_HEIGHT)
+        return self.sections[section_y].get_material((y * self.size + z) * self.size + x)
+
+    def get_block(self, x: int, y: int, z: int) -> Block:
+        """Returns the Block at a position relative to the chunk.
+        Cells without blockData are returned as a new Block built from the palette"""
+        self._check_bounds(x, y, z)
+        block = self.blocks.get((y * self.size + z) * self.size + x)
+        if block is not None:
+            return block
+        section_y, section_layer = divmod(y, SECTION_HEIGHT)
+        return Block(x, y, z, self.sections[section_y].get_material((section_layer * self.size + z) * self.size + x),
+                     None)
+
+    def get_height(self, heightmap: Heightmap, x: int, z: int) -> int:
+        """Returns one more than the y of the highest block of a column matching the heightmap, 0 if none does"""
+        return self.heightmaps[heightmap][z * self.size + x]
+
+    def update_heightmaps(self):
+        """Recomputes every heightmap, needed after sections were changed without going through the Chunk"""
+        size = self.size
+        layer = size * size
+        all_columns = int.from_bytes(b'\x01' * layer, 'little')
+        for heightmap, heights in self.heightmaps.items():
+            heights[:] = array('H', [0]) * layer
+            # Columns are bytes of these ints, set to 1 for the columns whose height isn't known yet
+            remaining = all_columns
+            for section_y in range(len(self.sections) - 1, -1, -1):
+                section = self.sections[section_y]
+                if section.is_empty():
+                    continue
+                matching = [heightmap.matches(material) for material in section.palette]
+                for y in range(SECTION_HEIGHT - 1, -1, -1):
+                    found = int.from_bytes(section.layer_flags(y, matching), 'little') & remaining
+                    remaining ^= found
+                    while found:
+                        bit = found & -found
+                        heights[(bit.bit_length() - 1) >> 3] = section_y * SECTION_HEIGHT + y + 1
+                        found ^= bit
+                    if not remaining:
+                        break
+                if not remaining:
+                    break
+
+    def update_column_height(self, heightmap: Heightmap, x: int, z: int, below: [int, None] = None):
+        """Recomputes the height of a column in a heightmap, only looking at blocks under below if given"""
+        y = self.height if below is None else below
+        while y > 0:
+            y -= 1
+            section = self.sections[y // SECTION_HEIGHT]
+            if section.is_empty():
+                y -= y % SECTION_HEIGHT
+                continue
+            if heightmap.matches(section.get_material(((y % SECTION_HEIGHT) * self.size + z) * self.size + x)):
+                self.heightmaps[heightmap][z * self.size + x] = y + 1
+                return
+        self.heightmaps[heightmap][z * self.size + x] = 0
+
+    def _update_heights(self, x: int, y: int, z: int, material: Material):
+        column = z * self.size + x
+        for heightmap, matches in zip(self.heightmaps, HEIGHTMAP_MATCHES[material]):
+            heights = self.heightmaps[heightmap]
+            if matches:
+                if y >= heights[column]:
+                    heights[column] = y + 1
+            elif y + 1 == heights[column]:
+                self.update_column_height(heightmap, x, z, y)
+
+    def _store_block(self, key: int, block: [Block, Material]) -> Material:
+        """Keeps the Block object of a cell if it carries data & returns its Material"""
+        if isinstance(block, Block):
+            if block.blockData or isinstance(block, BlockEntity):
+                self.blocks[key] = block
+            else:
+                self.blocks.pop(key, None)
+            return block.id
+        self.blocks.pop(key, None)
+        return block
+
+    def set_block(self, x: int, y: int, z: int, block: [Block, Material]) -> None:
+        """Sets the Block (or just the Material) at a position relative to the chunk"""
+        self._check_bounds(x, y, z)
+        material = self._store_block((y * self.size + z) * self.size + x, block)
+        section_y, section_layer = divmod(y, SECTION_HEIGHT)
+        if self.sections[section_y].set_material((section_layer * self.size + z) * self.size + x, material) \
+                is not material:
+            self._update_heights(x, y, z, material)
+
+    def set_blocks(self, edits: {(int, int, int): [Block, Material]}):
+        """Sets many Blocks (or just Materials) at once, keyed by position relative to the chunk.
+        Each section touched by the edits gets a single palette rewrite, see ChunkSection.set_materials"""
+        changes: {int: {int: Material}} = {}
+        materials: [(int, int, int, Material)] = []
+        for (x, y, z), block in edits.items():
+            self._check_bounds(x, y, z)
+            material = self._store_block((y * self.size + z) * self.size + x, block)
+            materials.append((x, y, z, material))
+            section_y, section_layer = divmod(y, SECTION_HEIGHT)
+            changes.setdefault(section_y, {})[(section_layer * self.size + z) * self.size + x] = material
+        for section_y, section_changes in changes.items():
+            self.sections[section_y].set_materials(section_changes)
+        # Once every block is set, so columns are scanned in their final state
+        for x, y, z, material in materials:
+            self._update_heights(x, y, z, material)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the chunk into a compact byte string, read back by Chunk.from_bytes.
+        Materials are written by name so saved chunks survive changes to the Material enum,
+        and sections holding only air take two bytes.
+        """
+        names: {Material: int} = {}
+        sections = []
+        for section in self.sections:
+            if section.palette == [Material.AIR]:
+                sections.append(_U16.pack(0))
+                continue
+            palette = [names.setdefault(material, len(names)) for material in section.palette]
+            indices = section.indices
+            if not isinstance(indices, bytearray) and sys.byteorder != 'little':
+                indices = array('H', indices)
+                indices.byteswap()
+            sections.append(struct.pack('<%dH' % (len(palette) + 1), len(palette), *palette))
+            sections.append(indices)
+        header = _CHUNK_HEADER.pack(_CHUNK_FORMAT_VERSION, self.xPos, self.yPos, self.zPos, self.size, self.height,
+                                    len(names))
+        material_names = [_U16.pack(len(material.name)) + material.name.encode('ascii') for material in names]
+        block_data = b''
+        if self.blocks:
+            block_data = json.dumps([[key, block.id.name, block.blockData, getattr(block, 'blockEntityData', None),
+                                      isinstance(block, BlockEntity)]
+                                     for key, block in self.blocks.items()]).encode('utf-8')
+        heightmaps = []
+        for heights in self.heightmaps.values():
+            if sys.byteorder != 'little':
+                heights = array('H', heights)
+                heights.byteswap()
+            heightmaps.append(heights)
+        return b''.join([header] + material_names + sections + [_U32.pack(len(block_data)), block_data] + heightmaps)
+
+    @staticmethod
+    def from_bytes(data, subRegion: Region = None) -> 'Chunk':
+        """Rebuilds a chunk serialized by Chunk.to_bytes. data may be any bytes-like object"""
+        data = memoryview(data)
+        version, x, y, z, size, height, name_count = _CHUNK_HEADER.unpack_from(data)
+        if version not in (1, _CHUNK_FORMAT_VERSION):
+            raise ChunkError("Unknown chunk format version {0}".format(version))
+        offset = _CHUNK_HEADER.size
+        materials = []
+        for _ in range(name_count):
+            (length,) = _U16.unpack_from(data, offset)
+            materials.append(Material[bytes(data[offset + 2:offset + 2 + length]).decode('ascii')])
+            offset += 2 + length
+        chunk = Chunk(x, y, z, [], subRegion, size, height)
+        for section in chunk.sections:
+            (palette_length,) = _U16.unpack_from(data, offset)
+            offset += 2
+            if not palette_length:
+                continue
+            palette = [materials[i] for i in struct.unpack_from('<%dH' % palette_length, data, offset)]
+            offset += 2 * palette_length
+            cells = len(section.indices)
+            if palette_length <= 256:
+                indices = data[offset:offset + cells]
+            else:
+                indices = array('H')
+                indices.frombytes(data[offset:offset + 2 * cells])
+                if sys.byteorder != 'little':
+                    indices.byteswap()
+                cells *= 2
+            section.load(palette, indices)
+            offset += cells
+        (block_data_length,) = _U32.unpack_from(data, offset)
+        offset += _U32.size
+        if block_data_length:
+            entries = json.loads(bytes(data[offset:offset + block_data_length]))
+            for key, name, blockData, blockEntityData, is_entity in entries:
+                y, index = divmod(key, size * size)
+                z, x = divmod(index, size)
+                if is_entity:
+                    block = BlockEntity(x, y, z, Material[name], blockData, blockEntityData)
+                else:
+                    block = Block(x, y, z, Material[name], blockData)
+                chunk.blocks[key] = block
+        offset += block_data_length
+        if version == 1:
+            chunk.update_heightmaps()
+            return chunk
+        for heights in chunk.heightmaps.values():
+            heights[:] = array('H', bytes(data[offset:offset + 2 * len(heights)]))
+            if sys.byteorder != 'little':
+                heights.byteswap()
+            offset += 2 * len(heights)
+        return chunk
+
+    async def addNewBlock(self, x: int, y: int, z: int, block: Block) -> None:
+        self.set_block(x, y, z, block)
 
     def getChunk(self):
         return self
@@ -0,0 +1,317 @@
+# coding=utf-8
+""" In memory cache of the chunk columns of a world, in front of the region files """
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .BasicClasses import Chunk
+from .Exceptions import ChunkNotFound
+from .RegionFile import RegionStorage
+
+# zlib level of the chunks written back, as RegionFile.write_chunk
+COMPRESSION_LEVEL = 6
+
+
+def chunk_memory_size(chunk: Chunk) -> int:
+    """ Rough number of bytes used by the blocks of a chunk """
+    return sum(memoryview(section.indices).nbytes + 8 * len(section.palette) for section in chunk.sections)
+
+
+class ChunkCache:
+    """
+    Keeps the most recently used chunk columns in memory, up to max_chunks chunks and max_bytes bytes of blocks
+    (None for no limit). The least recently used chunks are evicted first, except chunks pinned by players.\n
+    Changed chunks are marked dirty and written back in batches by a background thread, or when evicted.\n
+    If pending_edits (a WorldIO.PendingEditStore) is given, its changes are applied to chunks as they enter the cache.\n
+    The cache lock is only held to look chunks up & to snapshot the bytes of the chunks to save: reads, decoding,
+    compression & writes run outside of it, the storage having its own lock. Cached chunks must be changed inside
+    editing so they are never saved half changed
+    """
+
+    def __init__(self, storage: RegionStorage, max_chunks: int = 1024, max_bytes: [int, None] = None,
+                 flush_interval: float = 5.0, batch_size: int = 64, pending_edits=None):
+        self.storage = storage
+        self.pending_edits = pending_edits
+        self.max_chunks = max_chunks
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._chunks: OrderedDict = OrderedDict()  # (x, z) -> Chunk, least recently used first
+        self._sizes: {(int, int): int} = {}
+        self.memory_size = 0
+        self.dirty: {(int, int)} = set()
+        self.pinned: {(int, int)} = set()
+        # Snapshots (bytes, version) of the evicted dirty chunks not written yet, loads read them instead of the storage
+        self._evicted: {(int, int): (bytes, int)} = {}
+        # Snapshots being written by flush, they become evicted snapshots if their chunk is evicted meanwhile
+        self._writing: {(int, int): (bytes, int)} = {}
+        self._version = 0
+        # Guards the cache, held briefly: never while reading, decoding, compressing or writing
+        self._lock = threading.RLock()
+        # Guards the storage, which isn't thread safe, & _saved: the version of the last snapshot written of each chunk
+        self._storage_lock = threading.Lock()
+        self._saved: {(int, int): int} = {}
+        self._stop_event = threading.Event()
+        # Wakes the writer before flush_interval
+        self._wake = threading.Event()
+        self._writer = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+
+    def start(self):
+        self._stop_event.clear()
+        self._writer = threading.Thread(target=self._write_back, name='CHUNK_WRITER', daemon=True)
+        self._writer.start()
+
+    def stop(self):
+        """ Stops the background writer & writes every dirty chunk """
+        self._stop_event.set()
+        self._wake.set()
+        if self._writer:
+            self._writer.join()
+            self._writer = None
+        self.flush()
+
+    def get_chunk(self, chunk_x: int, chunk_z: int) -> Chunk:
+        """ Returns the chunk column at the given chunk position, loading it from the storage if it isn't cached.
+        Raises ChunkNotFound if it was never saved """
+        key = (chunk_x, chunk_z)
+        with self._lock:
+            chunk = self._chunks.get(key)
+            if chunk is not None:
+                self.hits += 1
+                self._chunks.move_to_end(key)
+                return chunk
+            self.misses += 1
+        while True:
+            with self._lock:
+                evicted = self._evicted.get(key)
+            if evicted is not None:
+                data, version = evicted[0], None
+            else:
+                with self._storage_lock:
+                    compressed = self.storage.load_compressed(chunk_x, chunk_z)
+                    version = self._saved.get(key)
+                if compressed is None:
+                    raise ChunkNotFound("Chunk {0}, {1} does not exist".format(chunk_x, chunk_z))
+                data = zlib.decompress(compressed)
+            chunk = Chunk.from_bytes(data)
+            with self._lock:
+                cached = self._chunks.get(key)
+                if cached is not None:
+                    # Loaded by another thread meanwhile
+                    self._chunks.move_to_end(key)
+                    return cached
+                if self._evicted.get(key) is not evicted or (evicted is None and self._saved.get(key) != version):
+                    # Saved again while it was read: read the newer version
+                    continue
+                if self.pending_edits is not None and self.pending_edits.apply(chunk):
+                    self.dirty.add(key)
+                to_write = self._insert(key, chunk)
+            self._write_evicted(to_write)
+            return chunk
+
+    def get_cached(self, chunk_x: int, chunk_z: int) -> [Chunk, None]:
+        """ Returns the chunk column at the given chunk position if it is in memory, without touching the storage """
+        key = (chunk_x, chunk_z)
+        with self._lock:
+            chunk = self._chunks.get(key)
+            if chunk is not None:
+                self.hits += 1
+                self._chunks.move_to_end(key)
+            return chunk
+
+    def has_chunk(self, chunk_x: int, chunk_z: int) -> bool:
+        with self._lock:
+            if (chunk_x, chunk_z) in self._chunks or (chunk_x, chunk_z) in self._evicted:
+                return True
+        with self._storage_lock:
+            region = self.storage.get_region(chunk_x >> 5, chunk_z >> 5, create=False)
+            return region is not None and region.has_chunk(chunk_x, chunk_z)
+
+    def put_chunk(self, chunk: Chunk):
+        """ Adds or replaces a chunk column, it will be written back later """
+        key = (chunk.xPos, chunk.zPos)
+        with self._lock:
+            if key in self._chunks:
+                self._remove(key)
+            if self.pending_edits is not None:
+                self.pending_edits.apply(chunk)
+            self.dirty.add(key)
+            to_write = self._insert(key, chunk)
+        self._write_evicted(to_write)
+
+    def apply_pending_edits(self, chunk_x: int, chunk_z: int):
+        """ Applies the pending edits of a chunk if it is in memory, they are applied when it is loaded otherwise """
+        with self._lock:
+            chunk = self._chunks.get((chunk_x, chunk_z))
+            if chunk is not None and self.pending_edits is not None and self.pending_edits.apply(chunk):
+                self.mark_dirty(chunk_x, chunk_z)
+
+    @contextmanager
+    def editing(self, chunk: Chunk):
+        """ Holds the cache lock while a cached chunk is changed, so it isn't saved half changed, then marks it dirty """
+        with self._lock:
+            yield chunk
+            self.mark_dirty(chunk.xPos, chunk.zPos)
+
+    def mark_dirty(self, chunk_x: int, chunk_z: int):
+        """ Marks a cached chunk as changed, it will be written back later """
+        key = (chunk_x, chunk_z)
+        with self._lock:
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                return
+            self.dirty.add(key)
+            # Palettes may have grown
+            size = chunk_memory_size(chunk)
+            self.memory_size += size - self._sizes[key]
+            self._sizes[key] = size
+
+    def update_pins(self, players):
+        """ Pins the chunks inside the view distance of the given players, they are never evicted """
+        pinned = set()
+        for player in players:
+            center_x = int(player.entity_location.x) >> 4
+            center_z = int(player.entity_location.z) >> 4
+            distance = player.view_distance
+            for x in range(center_x - distance, center_x + distance + 1):
+                for z in range(center_z - distance, center_z + distance + 1):
+                    pinned.add((x, z))
+        with self._lock:
+            self.pinned = pinned
+            to_write = self._evict()
+        if to_write:
+            # Called by the tick thread: the writer writes them, loads read the snapshots meanwhile
+            self._wake.set()
+
+    def flush(self, limit: [int, None] = None) -> int:
+        """ Writes up to limit dirty chunks (all of them if None) & returns how many were written """
+        with self._lock:
+            batch = [(key, snapshot) for key, snapshot in self._evicted.items()][:limit]
+        while limit is None or len(batch) < limit:
+            # One chunk at a time, so the tick thread never waits for more than one snapshot
+            with self._lock:
+                if not self.dirty:
+                    break
+                key = self.dirty.pop()
+                chunk = self._chunks.get(key)
+                if chunk is None:
+                    continue
+                snapshot = self._writing[key] = self._snapshot(chunk)
+            batch.append((key, snapshot))
+        written = 0
+        for index, (key, snapshot) in enumerate(batch):
+            saved = self._save(key, snapshot)
+            with self._lock:
+                if saved:
+                    self._forget_writing(key, snapshot)
+                else:
+                    # Chunks still cached are written again later, evicted ones stay in _evicted
+                    for key, snapshot in batch[index:]:
+                        self._forget_writing(key, snapshot)
+                        if key in self._chunks:
+                            self.dirty.add(key)
+                    break
+                if self._evicted.get(key) is snapshot:
+                    del self._evicted[key]
+            written += 1
+        return written
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'chunks': len(self._chunks),
+                'memory_size': self.memory_size,
+                'dirty': len(self.dirty) + len(self._evicted),
+                'pinned': len(self.pinned),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'writes': self.writes,
+            }
+
+    def _insert(self, key, chunk: Chunk) -> [((int, int), (bytes, int))]:
+        size = chunk_memory_size(chunk)
+        self._chunks[key] = chunk
+        self._sizes[key] = size
+        self.memory_size += size
+        return self._evict()
+
+    def _remove(self, key) -> Chunk:
+        self.memory_size -= self._sizes.pop(key)
+        return self._chunks.pop(key)
+
+    def _over_limit(self) -> bool:
+        return len(self._chunks) > self.max_chunks or (self.max_bytes is not None
+                                                       and self.memory_size > self.max_bytes)
+
+    def _evict(self) -> [((int, int), (bytes, int))]:
+        """ Evicts chunks until the cache is under its limits, returns the snapshots of the dirty ones to write
+        once the lock is released (see _write_evicted) """
+        evicted = []
+        if not self._over_limit():
+            return evicted
+        for key in list(self._chunks):
+            if key in self.pinned:
+                continue
+            if key in self.dirty:
+                self.dirty.discard(key)
+                snapshot = self._evicted[key] = self._snapshot(self._chunks[key])
+                evicted.append((key, snapshot))
+            elif key in self._writing:
+                self._evicted[key] = self._writing[key]
+            self._remove(key)
+            self.evictions += 1
+            if not self._over_limit():
+                return evicted
+        logging.debug('Chunk cache is full of pinned chunks (%d chunks, %d bytes)',
+                      len(self._chunks), self.memory_size)
+        return evicted
+
+    def _write_evicted(self, evicted: [((int, int), (bytes, int))]):
+        """ Writes the snapshots of evicted chunks, those which can't be written stay in memory & are retried by flush """
+        for key, snapshot in evicted:
+            if self._save(key, snapshot):
+                with self._lock:
+                    if self._evicted.get(key) is snapshot:
+                        del self._evicted[key]
+
+    def _forget_writing(self, key, snapshot: (bytes, int)):
+        if self._writing.get(key) is snapshot:
+            del self._writing[key]
+
+    def _snapshot(self, chunk: Chunk) -> (bytes, int):
+        """ The bytes of a chunk & the version telling snapshots of it apart, with the lock held """
+        self._version += 1
+        return chunk.to_bytes(), self._version
+
+    def _save(self, key, snapshot: (bytes, int)) -> bool:
+        data, version = snapshot
+        try:
+            compressed = zlib.compress(data, COMPRESSION_LEVEL)
+            with self._storage_lock:
+                # Snapshots may be written by several threads: never overwrite a newer one
+                if self._saved.get(key, 0) > version:
+                    return True
+                self.storage.save_compressed(key[0], key[1], compressed)
+                self._saved[key] = version
+                self.writes += 1
+        except Exception:
+            logging.exception('Cannot save chunk %d, %d', key[0], key[1])
+            return False
+        return True
+
+    def _write_back(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stop_event.is_set():
+                return
+            # Flush in batches so shutting down doesn't wait for a whole flush
+            while self.flush(self.batch_size) and not self._stop_event.is_set():
+                pass
@@ -0,0 +1,194 @@
+# coding=utf-8
+""" Streams the chunks around each player as they move.
+
+Chunks entering the view distance of a player are loaded in the background (from the ChunkCache, the region files or
+the world generator) & sent nearest first, up to a budget of chunks per player per tick. Chunks leaving it are
+unloaded by the client. Nothing here waits for a chunk, so a player flying fast never stalls the tick """
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Future
+from functools import partial
+
+from . import WorldIO
+from .Exceptions import ChunkNotFound
+from .network.Connection import NetworkController
+from .network.PacketType import PacketType
+from .utils.Thread import CancellableExecutor
+
+# Chunks sent to a player per tick
+DEFAULT_CHUNKS_PER_TICK = 4
+# Chunks loaded at the same time for a player
+DEFAULT_MAX_PENDING = 16
+# View distance of the server, players asking for more get this one (as told by the join game packet)
+DEFAULT_MAX_VIEW_DISTANCE = 8
+
+
+def chunks_in_view(center_x: int, center_z: int, distance: int) -> {(int, int)}:
+    """ The square of chunks a player at the given chunk position sees, like ChunkCache.update_pins """
+    return {(x, z) for x in range(center_x - distance, center_x + distance + 1)
+            for z in range(center_z - distance, center_z + distance + 1)}
+
+
+class ChunkLoader:
+    """
+    Loads chunk columns for the ChunkStreamers without blocking the tick: cached chunks are returned at once,
+    the others are read from the region files on a thread, or generated by generator (a ChunkGenerationService)
+    if they were never saved, & then added to the cache.\n
+    Loads of the same chunk share one Future
+    """
+
+    def __init__(self, generator=None, threads: int = 1):
+        self.generator = generator
+        self._executor = CancellableExecutor(threads, thread_name_prefix='CHUNK_LOADER')
+        self._loading: {(int, int): Future} = {}
+        self._lock = threading.Lock()
+        self.generated = 0
+
+    def load(self, chunk_x: int, chunk_z: int) -> Future:
+        """ Returns a Future of the chunk column at the given chunk position """
+        # Only takes the cache lock for a lookup: region reads & writes never run under it
+        chunk = WorldIO.get_chunk_cache().get_cached(chunk_x, chunk_z)
+        if chunk is not None:
+            future = Future()
+            future.set_result(chunk)
+            return future
+        key = (chunk_x, chunk_z)
+        with self._lock:
+            future = self._loading.get(key)
+            if future is None:
+                future = self._loading[key] = Future()
+                self._executor.submit(self._load, key, future)
+        return future
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _load(self, key, future: Future):
+        try:
+            chunk = WorldIO.get_chunk_cache().get_chunk(*key)
+        except ChunkNotFound as e:
+            if self.generator is None:
+                self._done(key, future, exception=e)
+            else:
+                try:
+                    self.generator.generate(*key, callback=partial(self._generated, key, future))
+                except Exception as e:
+                    # The generation was never queued, callers would wait forever
+                    self._done(key, future, exception=e)
+            return
+        except Exception as e:
+            self._done(key, future, exception=e)
+            return
+        self._done(key, future, chunk)
+
+    def _generated(self, key, future: Future, task: Future):
+        try:
+            chunk = task.result()
+            WorldIO.get_chunk_cache().put_chunk(chunk)
+        except Exception as e:
+            self._done(key, future, exception=e)
+            return
+        self.generated += 1
+        self._done(key, future, chunk)
+
+    def _done(self, key, future: Future, chunk=None, exception: Exception = None):
+        with self._lock:
+            self._loading.pop(key, None)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(chunk)
+
+
+class ChunkStreamer:
+    """
+    The chunks of one player. When the player crosses a chunk border or changes its view distance, the chunks of the
+    new view are queued nearest first & the ones out of it are unloaded. Every tick, up to max_pending chunks are
+    loaded with the ChunkLoader & up to chunks_per_tick loaded chunks are sent
+    """
+
+    def __init__(self, player, loader: ChunkLoader, chunks_per_tick: int = DEFAULT_CHUNKS_PER_TICK,
+                 max_pending: int = DEFAULT_MAX_PENDING, max_view_distance: int = DEFAULT_MAX_VIEW_DISTANCE):
+        self.player = player
+        self.loader = loader
+        self.chunks_per_tick = chunks_per_tick
+        self.max_pending = max_pending
+        self.max_view_distance = max_view_distance
+        self.center: [(int, int), None] = None
+        self.view_distance = None
+        self.sent: {(int, int)} = set()
+        # Chunks to load, the nearest one last
+        self._queue: [(int, int)] = []
+        # Chunks being loaded, nearest first
+        self._pending: {(int, int): Future} = {}
+        # False while the connection of the player is over its high watermark: chunks are loaded but not sent
+        self.writable = True
+        self.created_at = time.perf_counter()
+        # Seconds between the creation of the streamer & the first chunk sent
+        self.time_to_first_chunk: [float, None] = None
+        self.chunks_sent = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """ Chunks of the view not sent yet """
+        return len(self._queue) + len(self._pending)
+
+    def tick(self):
+        self.update()
+        self._load_queued()
+        budget = self.chunks_per_tick
+        for key, future in list(self._pending.items()):
+            if budget <= 0 or not self.writable:
+                break
+            if not future.done():
+                continue
+            try:
+                chunk = future.result()
+            except Exception as e:
+                # Queued again when the player crosses a chunk border
+                del self._pending[key]
+                logging.warning('Cannot load chunk %d, %d for %s: %r', key[0], key[1], self.player.display_name, e)
+                continue
+            if not self.send(PacketType.CHUNK_DATA, {'chunk': chunk}):
+                # The network process is behind: the chunk stays pending & is sent again next tick
+                break
+            del self._pending[key]
+            self.sent.add(key)
+            self.chunks_sent += 1
+            budget -= 1
+            if self.time_to_first_chunk is None:
+                self.time_to_first_chunk = time.perf_counter() - self.created_at
+        # Use the slots freed by the chunks sent
+        self._load_queued()
+
+    def update(self):
+        """ Queues & unloads chunks if the player crossed a chunk border or changed its view distance """
+        location = self.player.entity_location
+        center = (math.floor(location.x) >> 4, math.floor(location.z) >> 4)
+        distance = min(self.player.view_distance, self.max_view_distance)
+        if center == self.center and distance == self.view_distance:
+            return
+        moved = center != self.center
+        self.center, self.view_distance = center, distance
+        view = chunks_in_view(center[0], center[1], distance)
+        for chunk_x, chunk_z in self.sent - view:
+            self.send(PacketType.UNLOAD_CHUNK, {'chunk_x': chunk_x, 'chunk_z': chunk_z})
+        self.sent &= view
+        for key in [key for key in self._pending if key not in view]:
+            del self._pending[key]
+        self._queue = sorted(view.difference(self.sent, self._pending),
+                             key=lambda key: (key[0] - center[0]) ** 2 + (key[1] - center[1]) ** 2, reverse=True)
+        if moved:
+            # The client only renders the chunks around this position
+            self.send(PacketType.UPDATE_VIEW_POSITION, {'chunk_x': center[0], 'chunk_z': center[1]})
+
+    def _load_queued(self):
+        while self._queue and len(self._pending) < self.max_pending:
+            key = self._queue.pop()
+            self._pending[key] = self.loader.load(*key)
+
+    def send(self, packet_type: PacketType, data: dict) -> bool:
+        """ Returns False if the packet couldn't be handed to the network process """
+        return NetworkController.send_packet_player(self.player.entity_id, packet_type, data)
@@ -0,0 +1,197 @@
+# coding=utf-8
+""" Region files hold 32x32 chunk columns each, laid out like Anvil (.mca) files:
+a table of 1024 chunk locations, a table of 1024 timestamps, then zlib compressed chunks stored in 4KiB sectors """
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from .Exceptions import SaveError, WorldError
+
+SECTOR_SIZE = 4096
+REGION_SIZE = 32  # Chunks per side of a region
+HEADER_SECTORS = 2  # Location table & timestamp table
+COMPRESSION_ZLIB = 2
+MAX_CHUNK_SECTORS = 255  # Sector counts are stored in a single byte
+
+_LOCATIONS = struct.Struct('>1024I')
+_LOCATION = struct.Struct('>I')
+_CHUNK_HEADER = struct.Struct('>IB')
+
+
+class RegionFile:
+    """ A single region file. Chunks are written one at a time by seeking to their sectors, the file is never
+    rewritten as a whole. Reads go through a read-only memory map of the file, sliced without copies """
+
+    def __init__(self, path: str):
+        self.path = path
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(bytes(HEADER_SECTORS * SECTOR_SIZE))
+        # Unbuffered so writes are visible through the memory map right away
+        self.file = open(path, 'r+b', buffering=0)
+        self._map: [mmap.mmap, None] = None
+        file_size = os.path.getsize(path)
+        if file_size < HEADER_SECTORS * SECTOR_SIZE:
+            self.file.close()
+            raise WorldError("Region file {0} is truncated".format(path))
+        header = self._mapped(file_size)
+        self.locations = list(_LOCATIONS.unpack_from(header, 0))
+        self.timestamps = list(_LOCATIONS.unpack_from(header, SECTOR_SIZE))
+        # One byte per sector of the file: 1 if it is used, 0 if it can be allocated
+        sector_count = -(-file_size // SECTOR_SIZE)
+        self.used_sectors = bytearray(sector_count)
+        self.used_sectors[:HEADER_SECTORS] = b'\x01' * HEADER_SECTORS
+        for location in self.locations:
+            offset, count = location >> 8, location & 0xFF
+            if location and offset + count <= sector_count:
+                self.used_sectors[offset:offset + count] = b'\x01' * count
+
+    def _mapped(self, size: int) -> mmap.mmap:
+        """ Returns the file mapped in memory, remapped if it has grown past size since it was mapped """
+        if self._map is None or len(self._map) < size:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    @staticmethod
+    def _slot(local_x: int, local_z: int) -> int:
+        return (local_x & (REGION_SIZE - 1)) + (local_z & (REGION_SIZE - 1)) * REGION_SIZE
+
+    def has_chunk(self, local_x: int, local_z: int) -> bool:
+        return self.locations[self._slot(local_x, local_z)] != 0
+
+    def read_chunk(self, local_x: int, local_z: int) -> [bytes, None]:
+        """ Returns the decompressed data of a chunk, or None if the chunk was never written """
+        return self._read(local_x, local_z, zlib.decompress)
+
+    def read_compressed(self, local_x: int, local_z: int) -> [bytes, None]:
+        """ Returns the zlib compressed data of a chunk, or None if the chunk was never written """
+        return self._read(local_x, local_z, bytes)
+
+    def _read(self, local_x: int, local_z: int, decode) -> [bytes, None]:
+        """ Returns decode(view of the compressed data of a chunk), or None if the chunk was never written """
+        location = self.locations[self._slot(local_x, local_z)]
+        if not location:
+            return None
+        start = (location >> 8) * SECTOR_SIZE
+        end = start + (location & 0xFF) * SECTOR_SIZE
+        mapped = self._mapped(end)
+        length, compression = _CHUNK_HEADER.unpack_from(mapped, start)
+        if compression != COMPRESSION_ZLIB:
+            raise WorldError("Unsupported compression {0} in region file {1}".format(compression, self.path))
+        if start + length + 4 > min(end, len(mapped)):
+            raise WorldError("Chunk {0}, {1} of region file {2} is truncated".format(local_x, local_z, self.path))
+        # The view must be released before the map can be closed or remapped
+        with memoryview(mapped) as view:
+            return decode(view[start + _CHUNK_HEADER.size:start + length + 4])
+
+    def write_chunk(self, local_x: int, local_z: int, data: bytes, compression_level: int = 6):
+        """ Compresses and writes the data of a chunk """
+        self.write_compressed(local_x, local_z, zlib.compress(data, compression_level))
+
+    def write_compressed(self, local_x: int, local_z: int, compressed: bytes):
+        """ Writes the zlib compressed data of a chunk. The chunk is rewritten in place when it still fits in its
+        sectors, otherwise it is moved to the first free run of sectors large enough (or to the end of the file) """
+        payload = _CHUNK_HEADER.pack(len(compressed) + 1, COMPRESSION_ZLIB) + compressed
+        needed = -(-len(payload) // SECTOR_SIZE)
+        if needed > MAX_CHUNK_SECTORS:
+            raise SaveError("Chunk {0}, {1} is too large to be saved in {2}".format(local_x, local_z, self.path))
+
+        slot = self._slot(local_x, local_z)
+        location = self.locations[slot]
+        offset, count = location >> 8, location & 0xFF
+        if location and needed <= count:
+            # Rewrite in place & give back the sectors we don't need anymore
+            self.used_sectors[offset + needed:offset + count] = bytes(count - needed)
+        else:
+            if location:
+                self.used_sectors[offset:offset + count] = bytes(count)
+            offset = self.used_sectors.find(bytes(needed), HEADER_SECTORS)
+            if offset == -1:
+                offset = len(self.used_sectors)
+            end = offset + needed
+            if end > len(self.used_sectors):
+                self.used_sectors.extend(bytes(end - len(self.used_sectors)))
+            self.used_sectors[offset:end] = b'\x01' * needed
+
+        self.file.seek(offset * SECTOR_SIZE)
+        self.file.write(payload + bytes(needed * SECTOR_SIZE - len(payload)))
+        self._write_header(slot, (offset << 8) | needed, int(time.time()))
+
+    def delete_chunk(self, local_x: int, local_z: int):
+        slot = self._slot(local_x, local_z)
+        location = self.locations[slot]
+        if location:
+            offset, count = location >> 8, location & 0xFF
+            self.used_sectors[offset:offset + count] = bytes(count)
+            self._write_header(slot, 0, 0)
+
+    def _write_header(self, slot: int, location: int, timestamp: int):
+        self.locations[slot] = location
+        self.timestamps[slot] = timestamp
+        self.file.seek(slot * 4)
+        self.file.write(_LOCATION.pack(location))
+        self.file.seek(SECTOR_SIZE + slot * 4)
+        self.file.write(_LOCATION.pack(timestamp))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if not self.file.closed:
+            self.file.close()
+
+
+class RegionStorage:
+    """ The region files of a world, stored as region/r.<x>.<z>.mca in the world folder.
+    Region files are opened on first use and kept open """
+
+    def __init__(self, world_path: str):
+        self.world_path = world_path
+        self.region_path = os.path.join(world_path, 'region')
+        os.makedirs(self.region_path, exist_ok=True)
+        self.regions: {(int, int): RegionFile} = {}
+
+    def get_region(self, region_x: int, region_z: int, create: bool = True) -> [RegionFile, None]:
+        region = self.regions.get((region_x, region_z))
+        if region is None:
+            path = os.path.join(self.region_path, 'r.{0}.{1}.mca'.format(region_x, region_z))
+            if not create and not os.path.exists(path):
+                return None
+            region = self.regions[(region_x, region_z)] = RegionFile(path)
+        return region
+
+    def load_chunk(self, chunk_x: int, chunk_z: int) -> [bytes, None]:
+        """ Returns the data of a chunk column, or None if it was never saved """
+        region = self.get_region(chunk_x >> 5, chunk_z >> 5, create=False)
+        if region is None:
+            return None
+        return region.read_chunk(chunk_x, chunk_z)
+
+    def load_compressed(self, chunk_x: int, chunk_z: int) -> [bytes, None]:
+        """ Returns the zlib compressed data of a chunk column, or None if it was never saved """
+        region = self.get_region(chunk_x >> 5, chunk_z >> 5, create=False)
+        if region is None:
+            return None
+        return region.read_compressed(chunk_x, chunk_z)
+
+    def save_chunk(self, chunk_x: int, chunk_z: int, data: bytes):
+        self.get_region(chunk_x >> 5, chunk_z >> 5).write_chunk(chunk_x, chunk_z, data)
+
+    def save_compressed(self, chunk_x: int, chunk_z: int, compressed: bytes):
+        self.get_region(chunk_x >> 5, chunk_z >> 5).write_compressed(chunk_x, chunk_z, compressed)
+
+    def flush(self):
+        for region in self.regions.values():
+            region.flush()
+
+    def close(self):
+        for region in self.regions.values():
+            region.close()
+        self.regions.clear()
@@ -2,13 +2,21 @@ import logging
 import time
 from twisted.internet import reactor
 
+from . import WorldIO
+
 from .mcPy.MultiProcessing import MultiProcessing
 from .mcPy.Parser import Parser
 from .entity.Entity import EntityManager
+from .network.AsyncioNetwork import BACKENDS
 from .network.Connection import NetworkController
 from .network.PacketType import PacketType
 from .player.Player import PlayerManager
+from .utils.Profiler import TickProfiler
 from .utils.Scheduler import SchedulerManager
+from .utils.TickClock import CatchUp, TickClock
+
+# Ticks between two logs of the tick statistics
+PROFILER_REPORT_INTERVAL = 1200
 
 
 class Server:
@@ -30,15 +38,25 @@ class Server:
         self.multi_processing = MultiProcessing(self, avail_cores - 1)
         self.scheduler_manager = SchedulerManager(self)
         self.player_manager = PlayerManager(self)
+        self.profiler = TickProfiler(slow_tick=parser.slow_tick / 1000, sampling=parser.profile_sampling)
+        self.clock = TickClock(catch_up=CatchUp(parser.catch_up))
 
     def start(self):
         if self.started:
             return
         logging.info('Launching server ...')
         self.started = True
+        logging.info('Opening world %s ...', self.parser.world)
+        WorldIO.open_world(self.parser.world, self.parser.chunk_cache)
         logging.info('Launching processes ...')
         self.multi_processing.start()
-        NetworkController.start_process(self, 'localhost', 25565)
+        NetworkController.start_process(self, 'localhost', 25565,
+                                        shards=self.parser.network_shards,
+                                        factory_type=BACKENDS[self.parser.network_backend],
+                                        high_watermark=self.parser.outbound_high_watermark,
+                                        low_watermark=self.parser.outbound_low_watermark,
+                                        compression_threshold=self.parser.compression_threshold,
+                                        compression_workers=self.parser.compression_workers)
 
         # TODO Move next lines in another place
         self.total_time = 0
@@ -48,24 +66,26 @@ class Server:
 
     def start_internal_tick(self):
         logging.info('Starting ticks')
+        self.profiler.start()
         while self.started:
-            start_tick_at = time.time()
-            finish_tick_at = start_tick_at + 0.05  # Add 50ms or one tick
+            # Wait until the next tick is due, ticks are due every 50 ms whatever the previous ones took
+            try:
+                self.clock.wait()
+            except KeyboardInterrupt:
+                logging.info('Tick: Got KeyboardInterrupt, interrupting loop')
+                break
             # Tick
+            self.profiler.begin_tick()
             try:
                 self.tick()
             except KeyboardInterrupt:
                 logging.info('Tick: Got KeyboardInterrupt, interrupting loop')
                 break
-            # Check if we need to wait until next tick
-            need_to_finish_in = finish_tick_at - time.time()
-            if need_to_finish_in > 0:
-                # Wait until next tick
-                try:
-                    time.sleep(need_to_finish_in)
-                except KeyboardInterrupt:
-                    logging.info('Tick: Got KeyboardInterrupt, interrupting loop')
-                    break
+            self.profiler.end_tick(self._tick)
+            if self._tick % PROFILER_REPORT_INTERVAL == 0:
+                self.profiler.log_report()
+                logging.info('Tick clock: %.2f TPS since start, %.0f ticks lost (catch up: %s)',
+                             self.clock.real_tps(), self.clock.lost_ticks, self.clock.catch_up.value)
 
     def tick(self):
         """
@@ -77,15 +97,26 @@ class Server:
         # Tick common classes
         # Execute SchedulerManager before other classes
         self.scheduler_manager.tick(current_tick)
+        self.profiler.mark('scheduler')
         self.entity_manager.tick(current_tick)
+        self.profiler.mark('entities')
+        if current_tick % 20 == 0:
+            # Keep the chunks players can see in memory
+            WorldIO.get_chunk_cache().update_pins(self.player_manager.players.values())
+            self.profiler.mark('chunk_pins')
         # Handle incoming packets
         NetworkController.tick(current_tick)
+        self.profiler.mark('network')
+        # Stream chunks to players, after their moves were handled
+        self.player_manager.tick(current_tick)
+        self.profiler.mark('players')
         # TODO Move next lines in another place
         self.total_time += 1
         self.day_time += 1
         self.day_time %= 24000
         # Update time
         NetworkController.send_packet(packet_type=PacketType.TIME_UPDATE, game_time=self.total_time, day_time=self.day_time)
+        self.profiler.mark('time_update')
 
     def run_test(self):
         import pytest
@@ -95,9 +126,12 @@ class Server:
         logging.info("Stopping server ...")
         self.started = False
         NetworkController.stop_process()
+        self.player_manager.stop()
+        self.scheduler_manager.stop()
         # Stop multi_processing after 5 seconds
         self.multi_processing.stop(5000)
         self.stop_internal_tick()
+        WorldIO.close_world()
 
         if reactor.running:
             reactor.stop()
@@ -108,3 +142,4 @@ class Server:
 
     def stop_internal_tick(self):
         logging.info('Stopping ticks')
+        self.profiler.stop()
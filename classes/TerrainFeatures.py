@@ -1,44 +1,171 @@
 """ The module describes Terrain features, which are generators used to generate small structures """
 
-from .BasicClasses import Block, Chunk, Region
+from .BasicClasses import HEIGHTMAP_MATCHES, SECTION_HEIGHT, Chunk, ChunkSection, Heightmap
+from .Exceptions import OutOfBoundsError
 from .blocks.Materials import Material
-from random import randint, choice
+from random import randint
 
+import numpy as np
 
-def _generate_block_unsafely(chunk: Chunk, chunkpos: [int, int, int], pos: [int, int, int], material: Material) -> bool:
-    """ Generates a block in a given chunk unsafely -> ignores any errors """
+
+def _generate_block_unsafely(chunk: Chunk, chunkpos: [int, int, int], material: Material) -> bool:
+    """ Generates a block in a given chunk unsafely -> ignores blocks out of the chunk """
     try:
-        chunk.addNewBlock(chunkpos[0], chunkpos[1], chunkpos[2], Block(pos[0], pos[1], pos[2], material, None))
+        chunk.set_block(chunkpos[0], chunkpos[1], chunkpos[2], material)
         return True
-    except:
+    except OutOfBoundsError:
         return False
 
 
-def _generate_block(region: Region, chunk: Chunk, chunkpos: [int, int, int], material: Material):
-    """Generates a block safely (Errors may however still occour) by going to a nearby chunk
-     If the chunkpos are out of bounds. However, this function uses up more resources"""
-    if (chunkpos[0] < 0 or chunkpos[0] > 15 or
-       chunkpos[1] < 0 or chunkpos[1] > 15 or
-       chunkpos[2] < 0 or chunkpos[2] > 15):
-        pass
-        # FIXME region.getChunk() is borked
-        # walk to the correct chunk
-        # c = [chunk.xPos + chunkpos[0]/16, chunk.yPos + chunkpos[1]/16, chunk.zPos + chunkpos[2]/16]
-        # this is where we should load the correct chunk
-        # however right now that is Not Possible
-    _generate_block_unsafely(chunk, chunkpos, [chunk.xPos * 16 + chunkpos[0], chunk.yPos * 16 + chunkpos[1], chunk.zPos * 16 + chunkpos[2]], material)
+def _generate_block(pending_edits, chunk: Chunk, chunkpos: [int, int, int], material: Material,
+                    only_air: bool = False):
+    """Generates a block, chunkpos is relative to the given chunk but may be out of its 0-15 range.
+    Blocks falling in a neighbouring chunk are added to pending_edits (a WorldIO.PendingEditStore, if any),
+    which applies them when that chunk is generated or loaded. Blocks above or below the world are dropped.
+    With only_air, only an air block is replaced, in this chunk or in the neighbouring one"""
+    x, y, z = chunkpos
+    if 0 <= x < chunk.size and 0 <= z < chunk.size:
+        if not only_air or _is_air(chunk, x, y, z):
+            _generate_block_unsafely(chunk, chunkpos, material)
+    elif pending_edits is not None and 0 <= y < chunk.height:
+        offset_x, x = divmod(x, chunk.size)
+        offset_z, z = divmod(z, chunk.size)
+        pending_edits.addBlock(chunk.xPos + offset_x, chunk.zPos + offset_z, x, y, z, material, only_air=only_air)
 
 
 def _is_air(chunk: Chunk, x: int, y: int, z: int):
     """ Checks If a Block at a given position relative to the given chunk is air """
     try:
-        return chunk.blocks["{},{},{}".format(x, y, z)].get_material().is_air()
-    except:
+        return chunk.get_material(x, y, z).is_air()
+    except OutOfBoundsError:
         return True
 
 
+class FeatureTemplate:
+    """ The shape of a terrain feature as an array of (x, y, z) offsets, computed once and stamped many times.
+    A template may also have optional offsets: a variant of the shape is picked with a bitmask of the optional
+    offsets to include, the boolean masks of every bitmask are precomputed """
+
+    def __init__(self, offsets: [[int, int, int]], optional: [[int, int, int]] = ()):
+        self.offsets = np.unique(np.array(offsets, dtype=np.int32).reshape(-1, 3), axis=0)
+        self.optional = np.array(optional, dtype=np.int32).reshape(-1, 3)
+        bits = np.arange(1 << len(self.optional))
+        self._masks = ((bits[:, np.newaxis] >> np.arange(len(self.optional))) & 1).astype(bool)
+        # Bounding box of every variant
+        everything = np.concatenate((self.offsets, self.optional))
+        self.low = everything.min(axis=0).tolist()
+        self.high = everything.max(axis=0).tolist()
+        # Offsets as cell index offsets (see Chunk), per chunk size
+        self._cells: {int: (np.ndarray, np.ndarray)} = {}
+
+    @property
+    def variant_count(self) -> int:
+        return len(self._masks)
+
+    def variant(self, bitmask: int = 0) -> np.ndarray:
+        """ Returns the offsets of the shape including the optional offsets selected by bitmask """
+        if not len(self.optional):
+            return self.offsets
+        return np.concatenate((self.offsets, self.optional[self._masks[bitmask]]))
+
+    def cells(self, size: int, bitmask: int = 0) -> np.ndarray:
+        """ Returns the offsets of a variant as offsets of cell indices in a size wide chunk """
+        cells = self._cells.get(size)
+        if cells is None:
+            cells = self._cells[size] = tuple((offsets[:, 1] * size + offsets[:, 2]) * size + offsets[:, 0]
+                                              for offsets in (self.offsets, self.optional))
+        if not len(self.optional):
+            return cells[0]
+        return np.concatenate((cells[0], cells[1][self._masks[bitmask]]))
+
+
+_AIR_MATERIALS = [material for material in Material if material.is_air()]
+
+
+def _stamp_section(section: ChunkSection, cells: np.ndarray, material: Material, only_air: bool) -> np.ndarray:
+    """ Writes material in the given cells of a section & returns the cells which were written """
+    palette_index = section.palette_index(material)
+    indices = np.frombuffer(section.indices, dtype=np.uint8 if isinstance(section.indices, bytearray) else np.uint16)
+    air = np.zeros(len(section.palette), dtype=bool)
+    for material_air in _AIR_MATERIALS:
+        air_index = section.find_material(material_air)
+        if air_index is not None:
+            air[air_index] = True
+    old_air = air[indices[cells]]
+    if only_air:
+        cells = cells[old_air]
+        air_replaced = len(cells)
+    else:
+        air_replaced = int(np.count_nonzero(old_air))
+    indices[cells] = palette_index
+    section.changed()
+    if material.is_air():
+        section.non_air -= len(cells) - air_replaced
+    else:
+        section.non_air += air_replaced
+    return cells
+
+
+def _update_heights(chunk: Chunk, cells: np.ndarray, material: Material):
+    """ Updates the heightmaps of a chunk after material was written in the given cells """
+    layer = chunk.size * chunk.size
+    ys, columns = np.divmod(cells, layer)
+    for (heightmap, heights), matches in zip(chunk.heightmaps.items(), HEIGHTMAP_MATCHES[material]):
+        heights = np.frombuffer(heights, dtype=np.uint16)
+        if matches:
+            np.maximum.at(heights, columns, (ys + 1).astype(np.uint16))
+        else:
+            # The highest matching block of these columns was replaced
+            for column in np.unique(columns[heights[columns] == ys + 1]).tolist():
+                chunk.update_column_height(heightmap, column % chunk.size, column // chunk.size)
+
+
+def stamp(pending_edits, chunk: Chunk, template: FeatureTemplate, x: int, y: int, z: int, material: Material,
+          only_air: bool = False, bitmask: int = 0):
+    """ Sets the Material of every block of a template variant placed at x, y, z (relative to the chunk), with one
+    vectorized write per section. Blocks falling in neighbouring chunks are handled like _generate_block does.
+    When only_air is set, only air blocks are replaced, in the chunk & in its neighbours """
+    size = chunk.size
+    low, high = template.low, template.high
+    bottom, top = y + low[1], y + high[1]
+    if x + low[0] >= 0 and x + high[0] < size and z + low[2] >= 0 and z + high[2] < size and \
+            bottom >= 0 and top < chunk.height:
+        cells = template.cells(size, bitmask) + (y * size + z) * size + x
+    else:
+        positions = template.variant(bitmask) + np.array((x, y, z), dtype=np.int32)
+        in_height = (positions[:, 1] >= 0) & (positions[:, 1] < chunk.height)
+        inside = in_height & (positions[:, 0] >= 0) & (positions[:, 0] < size) & \
+            (positions[:, 2] >= 0) & (positions[:, 2] < size)
+        if pending_edits is not None:
+            for position in positions[in_height & ~inside].tolist():
+                _generate_block(pending_edits, chunk, position, material, only_air)
+        positions = positions[inside]
+        if not len(positions):
+            return
+        cells = (positions[:, 1] * size + positions[:, 2]) * size + positions[:, 0]
+        bottom, top = max(bottom, 0), min(top, chunk.height - 1)
+    layer = size * SECTION_HEIGHT * size
+    first, last = bottom // SECTION_HEIGHT, top // SECTION_HEIGHT
+    written = []
+    for section_y in range(first, last + 1):
+        section_cells = cells - section_y * layer
+        if first != last:
+            section_cells = section_cells[(section_cells >= 0) & (section_cells < layer)]
+        written.append(_stamp_section(chunk.sections[section_y], section_cells, material, only_air) +
+                       section_y * layer)
+    _update_heights(chunk, written[0] if len(written) == 1 else np.concatenate(written), material)
+    if chunk.blocks:
+        # Drop the data of the blocks which were replaced
+        for key in cells.tolist():
+            block = chunk.blocks.get(key)
+            if block is not None:
+                block_y, index = divmod(key, size * size)
+                if block.id is not chunk.get_material(index % size, block_y, index // size):
+                    del chunk.blocks[key]
+
+
 class AbstractTerrainFeature:
-    def generation_attempt(self, chunk_region: Region, random: float, chunk, chunk_x: int, chunk_y: int, chunk_z: int, is_top_layer: bool):
+    def generation_attempt(self, pending_edits, random: float, chunk: Chunk, chunk_x: int, chunk_y: int, chunk_z: int, is_top_layer: bool):
         pass
 
 
@@ -51,17 +178,17 @@ class OreFeature(AbstractTerrainFeature):
         self.min_y = minimum_y
         self.batch_min = min_size
         self.batch_max = max_size
+        # Vein shapes, one per vein size
+        self._templates = {size: FeatureTemplate([(round(i/3 + 0.66), round(i/3 + 0.33), round(i/3))
+                                                  for i in range(size)])
+                           for size in range(min_size, max_size + 1)}
     
-    def generation_attempt(self, chunk_region: Region, random: float, chunk: Chunk, chunk_x: int, chunk_y: int, chunk_z, is_top_layer: bool):
+    def generation_attempt(self, pending_edits, random: float, chunk: Chunk, chunk_x: int, chunk_y: int, chunk_z, is_top_layer: bool):
         if is_top_layer:
             pass
         elif random < self.chance and self.max_y > chunk_y > self.min_y:
-            blobsize: int = randint(self.batch_min, self.batch_max)
-            for x in range(blobsize):
-                delta_x: int = round(x/3 + 0.66)
-                delta_y: int = round(x/3 + 0.33)
-                delta_z: int = round(x/3)
-                _generate_block(chunk_region, chunk, [chunk_x + delta_x, chunk_y + delta_y, chunk_z + delta_z], self._ore)
+            template = self._templates[randint(self.batch_min, self.batch_max)]
+            stamp(pending_edits, chunk, template, chunk_x, chunk_y, chunk_z, self._ore)
         else:
             pass
 
@@ -75,17 +202,16 @@ class AbstractTreeGenerator(AbstractTerrainFeature):
         self.chance = weight
         self.max_y = max_height
         self.min_y = min_height
-    
-    def _leaves(self) -> [[int, int, int]]:
-        """ The Generator for the leaves; only marks their positions.
-        The Generator here is made to copy the generation of birch trees."""
+        self._trunks = {height: FeatureTemplate([(0, y, 0) for y in range(height)])
+                        for height in range(min_height, max_height + 1)}
+        self._leaf_templates = self._leaves()
+
+    def _leaves(self) -> [FeatureTemplate]:
+        """ The templates of the leaves, relative to the block above the trunk; a random one is used for each tree.
+        The templates here are made to copy the generation of birch trees."""
         plot = [[0, 0, 0]]  # top trunk block
         for y in (0, -1):  # top layers
             plot.extend(([-1, y, 0], [0, y, -1], [0, y, 1], [1, y, 0]))
-        # optional leaves at layer 2
-        for obj in ([-1, -1, -1], [-1, -1, 1], [1, -1, -1], [1, -1, 1]):
-            if choice((True, False)):
-                plot.append(obj)
         for y in (-2, -3):
             for x in range(-2, 2):
                 for z in range(-2, 2):
@@ -94,31 +220,26 @@ class AbstractTreeGenerator(AbstractTerrainFeature):
                         continue
                     else:
                         plot.append([x, y, z])
-        # optional leaves at layer 3 and 4
+        # optional leaves at layer 2, 3 and 4
+        optional = [[-1, -1, -1], [-1, -1, 1], [1, -1, -1], [1, -1, 1]]
         for y in (-2, -3):
-            for obj in ([-2, y, -2], [-2, y, 2], [2, y, -2], [2, y, 2]):
-                if choice((True, False)):
-                    plot.append(obj)
-        return plot
+            optional.extend(([-2, y, -2], [-2, y, 2], [2, y, -2], [2, y, 2]))
+        return [FeatureTemplate(plot, optional)]
     
-    def generation_attempt(self, chunk_region: Region, random: float, chunk: Chunk, chunk_x: int, chunk_y: int, chunk_z, is_top_layer: bool):
+    def generation_attempt(self, pending_edits, random: float, chunk: Chunk, chunk_x: int, chunk_y: int, chunk_z, is_top_layer: bool):
         if not is_top_layer:
             pass
-        elif random < self.chance and self.max_y > chunk_y > self.min_y:
+        elif random < self.chance:
             height: int = randint(self.min_y, self.max_y)
-            for delta_y in range(height):  # check If it can generate the trunk
-                if _is_air(chunk, chunk_x, chunk_y + delta_y, chunk_z):
-                    return
-            for delta_y in range(height):  # trunk generation
-                # TODO trunk orientation
-                _generate_block(chunk_region, chunk, [chunk_x, chunk_y + delta_y, chunk_z], self._trunk)
-                
-            blocks = self._leaves()
-            for b in blocks:
-                pos = [chunk_x + b[0], chunk_y + b[1] + height, chunk_z + b[2]]
-                if _is_air(chunk, pos[0], pos[1], pos[2]):
-                    continue
-                _generate_block(chunk_region, chunk, pos, self._leaves_mat)
+            if chunk_y + height + 1 >= chunk.height:  # the tree doesn't fit in the chunk
+                return
+            if chunk.get_height(Heightmap.WORLD_SURFACE, chunk_x, chunk_z) > chunk_y:  # something is above
+                return
+            # TODO trunk orientation
+            stamp(pending_edits, chunk, self._trunks[height], chunk_x, chunk_y, chunk_z, self._trunk)
+            leaves = self._leaf_templates[randint(0, len(self._leaf_templates) - 1)]
+            stamp(pending_edits, chunk, leaves, chunk_x, chunk_y + height, chunk_z, self._leaves_mat, only_air=True,
+                  bitmask=randint(0, leaves.variant_count - 1))
         else:
             pass
 
@@ -127,9 +248,11 @@ class MatchstickTreeGenerator(AbstractTreeGenerator):
     """Creates rather tall trees that have not many leaves,
     the shape of the canopy leads them to be called Matchstick trees"""
     
-    def _leaves(self) -> [[int, int, int]]:
-        plot: [[int, int, int]] = [[0, 0, 0]]  # top trunk block
-        height: int = -(randint(3, 5))
-        for y in range(height, -1):
-            plot.extend(([-1, y, 0], [0, y, -1], [0, y, 1], [1, y, 0]))
-        return plot
+    def _leaves(self) -> [FeatureTemplate]:
+        templates = []
+        for height in range(3, 6):
+            plot: [[int, int, int]] = [[0, 0, 0]]  # top trunk block
+            for y in range(-height, -1):
+                plot.extend(([-1, y, 0], [0, y, -1], [0, y, 1], [1, y, 0]))
+            templates.append(FeatureTemplate(plot))
+        return templates
@@ -1,9 +1,15 @@
 # coding=utf-8
+import asyncio
+from concurrent.futures import Future
 from math import floor, sqrt
-from random import randint
+from random import Random, randint
 
-from .BasicClasses import Block, Chunk, Region
+import numpy as np
+
+from .BasicClasses import SECTION_HEIGHT, Block, Chunk, Region
 from .TerrainFeatures import AbstractTerrainFeature, AbstractTreeGenerator, MatchstickTreeGenerator, OreFeature
+from . import WorldIO
+from .WorldIO import PendingEditStore
 from .blocks.Materials import Material
 
 # Ore height ranges: the lower range will have a higher chance of being selected
@@ -24,6 +30,9 @@ OAK_TREE = AbstractTreeGenerator(Material.OAK_LOG, Material.OAK_LEAVES, 1.5, 4,
 GENERATORS: [AbstractTerrainFeature] = [COAL_ORE, IRON_ORE, LAPIZ_ORE, GOLD_ORE, REDSTONE_ORE, DIAMOND_ORE, OAK_TREE,
                                         BIRCH_TREE, MATCHSTICK_TREE]
 
+# Palette of the chunks generated from noise grids
+_TERRAIN_PALETTE = (Material.AIR, Material.STONE, Material.DIRT, Material.GRASS_BLOCK, Material.BEDROCK)
+
 
 # Cave size settings
 WEIRDNESS = 0  # How random should the caves be? Lower values = short but very twisty: high values = long but very
@@ -64,6 +73,11 @@ _G2 = (3.0 - sqrt(3.0)) / 6.0
 _F3 = 1.0 / 3.0
 _G3 = 1.0 / 6.0
 
+# (i1, j1, k1, i2, j2, k2) corner offsets for each of the six tetrahedra a 3D simplex cell is split into,
+# in the order the branches of SimplexNoise.noise3 pick them
+_SIMPLEX3_OFFSETS = np.array(((1, 0, 0, 1, 1, 0), (1, 0, 0, 1, 0, 1), (0, 0, 1, 1, 0, 1),
+                              (0, 0, 1, 0, 1, 1), (0, 1, 0, 0, 1, 1), (0, 1, 0, 1, 1, 0)))
+
 
 def scaleNoise(noise: float, limit: tuple) -> float:
     upperLimit = int(limit[0])
@@ -215,22 +229,23 @@ class SimplexNoise(BaseNoise):
         gi2 = perm[ii + 1 + perm[jj + 1]] % 12
 
         # Calculate the contribution from the three corners
-        tt = 0.5 - x0 ** 2 - y0 ** 2
+        # Powers are written as products so noise2_grid rounds exactly the same way
+        tt = 0.5 - x0 * x0 - y0 * y0
         if tt > 0:
             g = _GRAD3[gi0]
-            noise = tt ** 4 * (g[0] * x0 + g[1] * y0)
+            noise = tt * tt * tt * tt * (g[0] * x0 + g[1] * y0)
         else:
             noise = 0.0
 
-        tt = 0.5 - x1 ** 2 - y1 ** 2
+        tt = 0.5 - x1 * x1 - y1 * y1
         if tt > 0:
             g = _GRAD3[gi1]
-            noise += tt ** 4 * (g[0] * x1 + g[1] * y1)
+            noise += tt * tt * tt * tt * (g[0] * x1 + g[1] * y1)
 
-        tt = 0.5 - x2 ** 2 - y2 ** 2
+        tt = 0.5 - x2 * x2 - y2 * y2
         if tt > 0:
             g = _GRAD3[gi2]
-            noise += tt ** 4 * (g[0] * x2 + g[1] * y2)
+            noise += tt * tt * tt * tt * (g[0] * x2 + g[1] * y2)
 
         return noise * 70.0  # scale noise to [-1, 1]
 
@@ -321,34 +336,145 @@ class SimplexNoise(BaseNoise):
 
         # Calculate the contribution from the four corners
         noise = 0.0
-        tt = 0.6 - x0 ** 2 - y0 ** 2 - z0 ** 2
+        tt = 0.6 - x0 * x0 - y0 * y0 - z0 * z0
         if tt > 0:
             g = _GRAD3[gi0]
-            noise = tt ** 4 * (g[0] * x0 + g[1] * y0 + g[2] * z0)
+            noise = tt * tt * tt * tt * (g[0] * x0 + g[1] * y0 + g[2] * z0)
         else:
             noise = 0.0
 
-        tt = 0.6 - x1 ** 2 - y1 ** 2 - z1 ** 2
+        tt = 0.6 - x1 * x1 - y1 * y1 - z1 * z1
         if tt > 0:
             g = _GRAD3[gi1]
-            noise += tt ** 4 * (g[0] * x1 + g[1] * y1 + g[2] * z1)
+            noise += tt * tt * tt * tt * (g[0] * x1 + g[1] * y1 + g[2] * z1)
 
-        tt = 0.6 - x2 ** 2 - y2 ** 2 - z2 ** 2
+        tt = 0.6 - x2 * x2 - y2 * y2 - z2 * z2
         if tt > 0:
             g = _GRAD3[gi2]
-            noise += tt ** 4 * (g[0] * x2 + g[1] * y2 + g[2] * z2)
+            noise += tt * tt * tt * tt * (g[0] * x2 + g[1] * y2 + g[2] * z2)
 
-        tt = 0.6 - x3 ** 2 - y3 ** 2 - z3 ** 2
+        tt = 0.6 - x3 * x3 - y3 * y3 - z3 * z3
         if tt > 0:
             g = _GRAD3[gi3]
-            noise += tt ** 4 * (g[0] * x3 + g[1] * y3 + g[2] * z3)
+            noise += tt * tt * tt * tt * (g[0] * x3 + g[1] * y3 + g[2] * z3)
+
+        return noise * 32.0
+
+    def noise2_grid(self, x, y):
+        """2D Perlin simplex noise over a grid.
+
+        Return a NumPy array of shape (len(x), len(y)) holding noise2(x[a], y[b])
+        for every pair of the given coordinates, computed in one batch. Values are
+        bit for bit the ones noise2 returns with the same permutation table.
+        """
+        x = np.asarray(x, dtype=np.float64)[:, np.newaxis]
+        y = np.asarray(y, dtype=np.float64)[np.newaxis, :]
+        # Skew input space to determine which simplex (triangle) we are in
+        s = (x + y) * _F2
+        i = np.floor(x + s)
+        j = np.floor(y + s)
+        t = (i + j) * _G2
+        x0 = x - (i - t)  # "Unskewed" distances from cell origin
+        y0 = y - (j - t)
+
+        i1 = (x0 > y0).astype(np.int64)  # 1 in the lower triangle, 0 in the upper one
+        j1 = 1 - i1
+
+        x1 = x0 - i1 + _G2  # Offsets for middle corner in (x,y) unskewed coords
+        y1 = y0 - j1 + _G2
+        x2 = x0 + _G2 * 2.0 - 1.0  # Offsets for last corner in (x,y) unskewed coords
+        y2 = y0 + _G2 * 2.0 - 1.0
+
+        # Determine hashed gradient indices of the three simplex corners
+        perm = np.array(self.permutation)
+        ii = i.astype(np.int64) % self.period
+        jj = j.astype(np.int64) % self.period
+        gi0 = perm[ii + perm[jj]] % 12
+        gi1 = perm[ii + i1 + perm[jj + j1]] % 12
+        gi2 = perm[ii + 1 + perm[jj + 1]] % 12
+
+        # Calculate the contribution from the three corners, in the same order as noise2
+        grad = np.array(_GRAD3)
+        tt = 0.5 - x0 * x0 - y0 * y0
+        g = grad[gi0]
+        noise = np.where(tt > 0, tt * tt * tt * tt * (g[..., 0] * x0 + g[..., 1] * y0), 0.0)
+        for gi, xn, yn in ((gi1, x1, y1), (gi2, x2, y2)):
+            tt = 0.5 - xn * xn - yn * yn
+            g = grad[gi]
+            noise = np.where(tt > 0, noise + tt * tt * tt * tt * (g[..., 0] * xn + g[..., 1] * yn), noise)
+
+        return noise * 70.0  # scale noise to [-1, 1]
+
+    def noise3_grid(self, x, y, z):
+        """3D Perlin simplex noise over a grid.
+
+        Return a NumPy array of shape (len(x), len(y), len(z)) holding
+        noise3(x[a], y[b], z[c]) for every combination of the given coordinates,
+        computed in one batch. Values are bit for bit the ones noise3 returns with
+        the same permutation table.
+        """
+        x = np.asarray(x, dtype=np.float64)[:, np.newaxis, np.newaxis]
+        y = np.asarray(y, dtype=np.float64)[np.newaxis, :, np.newaxis]
+        z = np.asarray(z, dtype=np.float64)[np.newaxis, np.newaxis, :]
+        # Skew the input space to determine which simplex cell we're in
+        s = (x + y + z) * _F3
+        i = np.floor(x + s)
+        j = np.floor(y + s)
+        k = np.floor(z + s)
+        t = (i + j + k) * _G3
+        x0 = x - (i - t)  # "Unskewed" distances from cell origin
+        y0 = y - (j - t)
+        z0 = z - (k - t)
+
+        # Pick the same tetrahedron as the branches of noise3 do
+        case = np.select([(x0 >= y0) & (y0 >= z0), (x0 >= y0) & (x0 >= z0), x0 >= y0, y0 < z0, x0 < z0],
+                         [0, 1, 2, 3, 4], 5)
+        i1, j1, k1, i2, j2, k2 = np.moveaxis(_SIMPLEX3_OFFSETS[case], -1, 0)
+
+        # Offsets for remaining corners
+        x1 = x0 - i1 + _G3
+        y1 = y0 - j1 + _G3
+        z1 = z0 - k1 + _G3
+        x2 = x0 - i2 + 2.0 * _G3
+        y2 = y0 - j2 + 2.0 * _G3
+        z2 = z0 - k2 + 2.0 * _G3
+        x3 = x0 - 1.0 + 3.0 * _G3
+        y3 = y0 - 1.0 + 3.0 * _G3
+        z3 = z0 - 1.0 + 3.0 * _G3
+
+        # Calculate the hashed gradient indices of the four simplex corners
+        perm = np.array(self.permutation)
+        ii = i.astype(np.int64) % self.period
+        jj = j.astype(np.int64) % self.period
+        kk = k.astype(np.int64) % self.period
+        gi0 = perm[ii + perm[jj + perm[kk]]] % 12
+        gi1 = perm[ii + i1 + perm[jj + j1 + perm[kk + k1]]] % 12
+        gi2 = perm[ii + i2 + perm[jj + j2 + perm[kk + k2]]] % 12
+        gi3 = perm[ii + 1 + perm[jj + 1 + perm[kk + 1]]] % 12
+
+        # Calculate the contribution from the four corners, in the same order as noise3
+        grad = np.array(_GRAD3)
+        tt = 0.6 - x0 * x0 - y0 * y0 - z0 * z0
+        g = grad[gi0]
+        noise = np.where(tt > 0, tt * tt * tt * tt * (g[..., 0] * x0 + g[..., 1] * y0 + g[..., 2] * z0), 0.0)
+        for gi, xn, yn, zn in ((gi1, x1, y1, z1), (gi2, x2, y2, z2), (gi3, x3, y3, z3)):
+            tt = 0.6 - xn * xn - yn * yn - zn * zn
+            g = grad[gi]
+            noise = np.where(tt > 0, noise + tt * tt * tt * tt * (g[..., 0] * xn + g[..., 1] * yn + g[..., 2] * zn),
+                             noise)
 
         return noise * 32.0
 
 
 class WorldGenerator(SimplexNoise):
     
-    async def generateNewChunk(self, x, y, z, width, height, region) -> Chunk:
+    async def generateNewChunk(self, x, y, z, width, height, region, vectorized=False,
+                               pending_edits: PendingEditStore = None) -> Chunk:
+        """Generates the chunk at the given chunk position.
+        When vectorized is set, the chunk is filled from noise grids instead of block by block.
+        Blocks of terrain features falling in neighbouring chunks are added to pending_edits, if given"""
+        if vectorized:
+            return await self._generate_chunk_grid(x, y, z, width, height, region, pending_edits)
         positions = []
         for blockX in range(1, width):
             for blockZ in range(1, width):
@@ -357,10 +483,47 @@ class WorldGenerator(SimplexNoise):
                 blockY = scaleNoise(bY, (63, 80))  # Scale the noise to be between min-max y value
                 positions.append((blockX, blockY, blockZ))
         chunk = Chunk(x, y, z, [], region, width, height)
-        await self._regenerate_chunk(x, y, z, region, positions, chunk)
+        await self._regenerate_chunk(x, y, z, pending_edits, positions, chunk)
+        return chunk
+
+    async def _generate_chunk_grid(self, x, y, z, width, height, region, pending_edits) -> Chunk:
+        """Generates a chunk from the heightmap and density field of all of its blocks, each computed in one call.
+        Sections are filled straight from the palette indices grid; terrain features are only attempted on
+        the cells the density field selects, using that cell's density as their random value"""
+        chunk = Chunk(x, y, z, [], region, width, height)
+        block_x = np.arange(width) + x * width
+        block_y = np.arange(height) + y * height
+        block_z = np.arange(width) + z * width
+        # Heightmap indexed as [z, x] and heights indexed as [y, z, x], the order of the section indices
+        surface = np.floor(scaleNoise(self.noise2_grid(block_x, block_z), (63, 80))).astype(np.int64).T
+        world_y = block_y[:, np.newaxis, np.newaxis]
+        terrain = np.select([world_y > surface, world_y == surface, world_y >= surface - 5, world_y >= 1],
+                            [0, 3, 2, 1], 4)  # Indices into _TERRAIN_PALETTE
+        layer = width * SECTION_HEIGHT * width
+        indices = np.zeros(len(chunk.sections) * layer, dtype=np.uint8)
+        indices[:terrain.size] = terrain.ravel()
+        for section_y, section in enumerate(chunk.sections):
+            section.load(_TERRAIN_PALETTE, indices[section_y * layer:(section_y + 1) * layer].tobytes())
+        chunk.update_heightmaps()
+
+        # Density indexed as [y, z, x], scaled like _regenerate_chunk does
+        density = scaleNoise(self.noise3_grid(block_x, block_y, block_z), (1, 100)).transpose(1, 2, 0)
+        chance = max(gen.chance for gen in GENERATORS)
+        underground = (world_y >= 1) & (world_y < surface - 6)
+        for blockY, blockZ, blockX in zip(*np.nonzero(underground & (density < chance))):
+            noise = float(density[blockY, blockZ, blockX])
+            for gen in GENERATORS:
+                gen.generation_attempt(pending_edits, noise, chunk, int(blockX), int(blockY), int(blockZ), False)
+        for blockZ in range(width):
+            for blockX in range(width):
+                blockY = int(surface[blockZ, blockX]) - y * height
+                if 0 <= blockY < height - 1:
+                    noise = float(density[blockY, blockZ, blockX])
+                    for gen in GENERATORS:
+                        gen.generation_attempt(pending_edits, noise, chunk, blockX, blockY + 1, blockZ, True)
         return chunk
 
-    async def _regenerate_chunk(self, x, y, z, region, positions, chunk: Chunk):
+    async def _regenerate_chunk(self, x, y, z, pending_edits, positions, chunk: Chunk):
         for x, y, z in positions:
             if y < chunk.height*chunk.yPos:
                 continue
@@ -374,6 +537,77 @@ class WorldGenerator(SimplexNoise):
             await chunk.addNewBlock(x, y, z, Block(x, y, z, Material.GRASS_BLOCK, {}))  # Generate grass at the top layer
             for height in range(1, y-6):  # Randomly add ores
                 for gen in GENERATORS:
-                    gen.generation_attempt(region, scaleNoise(noise, (1, 100)), chunk, x, height, z, False)
+                    gen.generation_attempt(pending_edits, scaleNoise(noise, (1, 100)), chunk, x, height, z, False)
             for gen in GENERATORS:
-                gen.generation_attempt(region, scaleNoise(noise, (1, 100)), chunk, x, y + 1, z, True)
+                gen.generation_attempt(pending_edits, scaleNoise(noise, (1, 100)), chunk, x, y + 1, z, True)
+
+
+# Per process WorldGenerators used by generate_chunk_column, keyed by seed
+_SEEDED_GENERATORS: {int: WorldGenerator} = {}
+_GENERATOR_LOOP = None
+
+
+def generate_chunk_column(chunk_x: int, chunk_z: int, seed: int, height: int = 256) -> (bytes, PendingEditStore):
+    """ Generates the chunk column at the given chunk position and returns it serialized with Chunk.to_bytes,
+    with the blocks its terrain features placed in neighbouring chunks.
+    This is the function ChunkGenerationService runs on the MultiProcessing workers """
+    global _GENERATOR_LOOP
+    generator = _SEEDED_GENERATORS.get(seed)
+    if generator is None:
+        generator = _SEEDED_GENERATORS[seed] = WorldGenerator(randint_function=Random(seed).randint)
+    if _GENERATOR_LOOP is None:
+        _GENERATOR_LOOP = asyncio.new_event_loop()
+    pending_edits = PendingEditStore()
+    chunk = _GENERATOR_LOOP.run_until_complete(
+        generator.generateNewChunk(chunk_x, 0, chunk_z, 16, height, None, vectorized=True, pending_edits=pending_edits))
+    return chunk.to_bytes(), pending_edits
+
+
+class ChunkGenerationService:
+    """ Fans chunk generation out to the MultiProcessing workers.
+    Workers send chunks back serialized, they are rebuilt on the thread reading the worker results.\n
+    Blocks placed in neighbouring chunks go to pending_edits, or to the opened world (see WorldIO.addPendingEdits)
+    if it is None: the ones of chunks in memory are then applied on the tick thread by scheduler (a SchedulerManager)
+    if given. Pending edits of a chunk are applied before its Future is done """
+
+    def __init__(self, multi_processing, seed: int, height: int = 256, pending_edits: PendingEditStore = None,
+                 scheduler=None):
+        self.multi_processing = multi_processing
+        self.seed = seed
+        self.height = height
+        self.pending_edits = pending_edits
+        self.scheduler = scheduler
+
+    def generate(self, chunk_x: int, chunk_z: int, callback=None) -> Future:
+        """ Generates the chunk column at the given chunk position on a worker.
+        Returns a Future holding the Chunk, callback (if any) is called with that Future once it is done """
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        future.set_running_or_notify_cancel()
+
+        def on_generated(task: Future):
+            try:
+                data, edits = task.result()
+                chunk = Chunk.from_bytes(data)
+                if self.pending_edits is None:
+                    WorldIO.addPendingEdits(edits, self.scheduler)
+                    # Not shared yet, so it can be changed on this thread
+                    WorldIO.get_pending_edits().apply(chunk)
+                else:
+                    self.pending_edits.merge(edits)
+                    self.pending_edits.apply(chunk)
+                future.set_result(chunk)
+            except Exception as e:
+                future.set_exception(e)
+
+        self.multi_processing.submit(generate_chunk_column, [chunk_x, chunk_z, self.seed, self.height],
+                                     callback=on_generated)
+        return future
+
+    def generate_area(self, center_x: int, center_z: int, radius: int, callback=None) -> [Future]:
+        """ Generates every chunk column within radius chunks of the given chunk position (a square of
+        2 * radius + 1 chunks wide), and returns their Futures """
+        return [self.generate(chunk_x, chunk_z, callback)
+                for chunk_x in range(center_x - radius, center_x + radius + 1)
+                for chunk_z in range(center_z - radius, center_z + radius + 1)]
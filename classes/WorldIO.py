@@ -1,19 +1,46 @@
 """ API Class for accessing things in the World """
-from .BasicClasses import Block, Chunk, Region
-from .blocks.materials import Material
+import json
+import os
+import threading
+
+from .BasicClasses import SECTION_HEIGHT, Block, Chunk, Region
+from .ChunkCache import ChunkCache
+from .Exceptions import ChunkNotFound, WorldError
+from .RegionFile import REGION_SIZE, RegionStorage
+from .blocks.Materials import Material
+
+CHUNK_SIZE = 16
+# Pending edits are saved in this file of the world folder when the world is closed
+PENDING_EDITS_FILE = 'pending_edits.json'
+
+# Chunk cache & pending edits of the opened world, see open_world
+_cache: [ChunkCache, None] = None
+_pending_edits: ['PendingEditStore', None] = None
 
 
 class BasicBlockContainer:
     """ BasicBlockContainers are used to cache changes of Blocks in a Chunk, reducing the amount of required WorldIO.
-     Please note that this class is mostly meant to cache additions, and as such will have memory leaks when updating
-     a block multiple times as well being only sorted in insertion order """
+     Changes are grouped by section (SECTION_HEIGHT blocks tall slices) and keyed by position: updating a block
+     multiple times only keeps the last change, and a whole section is formalised in one go """
     def __init__(self):
-        self.container: [(int, int, int, Block)] = []
+        self.sections: {int: {(int, int, int): [Block, Material]}} = {}
 
-    def addBlock(self, blockX: int, blockY: int, blockZ: int, block: Block):
+    def addBlock(self, blockX: int, blockY: int, blockZ: int, block: [Block, Material]):
         """ Adds a block to the container; blockX, blockY and blockZ are relative to the container origin, what it means
         is left to the whatever function that formalises the changes. """
-        self.container.append((blockX, blockY, blockZ, block))
+        section = self.sections.get(blockY // SECTION_HEIGHT)
+        if section is None:
+            section = self.sections[blockY // SECTION_HEIGHT] = {}
+        section[(blockX, blockY, blockZ)] = block
+
+    def __len__(self):
+        return sum(len(section) for section in self.sections.values())
+
+    def __iter__(self):
+        """ Iterates over the changes as (blockX, blockY, blockZ, block), section by section """
+        for section in self.sections.values():
+            for (blockX, blockY, blockZ), block in section.items():
+                yield blockX, blockY, blockZ, block
 
 
 def mergeContainers(destination: BasicBlockContainer,
@@ -22,34 +49,203 @@ def mergeContainers(destination: BasicBlockContainer,
                     offsetY: int = 0,
                     offsetZ: int = 0):
     """ Merges the specified source container into the specified destination container with a configurable offset.
-    The source container will be handled last in the formalisation process"""
-    for item in source.container:
-        destination.container.append((item[0]+offsetX, item[1]+offsetY, item[2]+offsetZ, item[3]))
+    Changes of the source container win over the ones of the destination container at the same position """
+    if offsetX == offsetY == offsetZ == 0:
+        for sectionY, section in source.sections.items():
+            destination.sections.setdefault(sectionY, {}).update(section)
+        return
+    for blockX, blockY, blockZ, block in source:
+        destination.addBlock(blockX + offsetX, blockY + offsetY, blockZ + offsetZ, block)
+
+
+class PendingEditStore:
+    """ Changes waiting for chunks which aren't in memory, such as the parts of a tree crossing a chunk border.
+    Changes are kept per chunk column in BasicBlockContainers relative to that chunk, and applied when the chunk is
+    generated or loaded. Changes added with only_air (e.g. leaves) are kept apart & only replace air blocks, once the
+    other changes are applied. Only Materials are stored, Blocks are reduced to their Material """
+    def __init__(self):
+        self.chunks: {(int, int): BasicBlockContainer} = {}
+        self.air_chunks: {(int, int): BasicBlockContainer} = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Stores are sent back by the workers generating chunks, locks can't be pickled
+        return self.chunks, self.air_chunks
+
+    def __setstate__(self, state):
+        self.chunks, self.air_chunks = state
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self) -> {(int, int)}:
+        """ The positions of the chunks with changes waiting """
+        return self.chunks.keys() | self.air_chunks.keys()
+
+    def addBlock(self, chunkX: int, chunkZ: int, blockX: int, blockY: int, blockZ: int, block: [Block, Material],
+                 only_air: bool = False):
+        """ Adds a change to the chunk at the given chunk position, blockX, blockY and blockZ are relative to it.
+        With only_air, the change is dropped if the block isn't air when it is applied """
+        if isinstance(block, Block):
+            block = block.id
+        chunks = self.air_chunks if only_air else self.chunks
+        with self._lock:
+            container = chunks.get((chunkX, chunkZ))
+            if container is None:
+                container = chunks[(chunkX, chunkZ)] = BasicBlockContainer()
+            container.addBlock(blockX, blockY, blockZ, block)
+
+    def merge(self, other: 'PendingEditStore'):
+        """ Adds the changes of another store, which win over the changes of this store at the same position """
+        with self._lock:
+            for chunks, other_chunks in ((self.chunks, other.chunks), (self.air_chunks, other.air_chunks)):
+                for key, changes in other_chunks.items():
+                    container = chunks.get(key)
+                    if container is None:
+                        container = chunks[key] = BasicBlockContainer()
+                    mergeContainers(container, changes)
+
+    def pop(self, chunkX: int, chunkZ: int) -> ([BasicBlockContainer, None], [BasicBlockContainer, None]):
+        """ Forgets & returns the changes & the air only changes of a chunk """
+        with self._lock:
+            return self.chunks.pop((chunkX, chunkZ), None), self.air_chunks.pop((chunkX, chunkZ), None)
+
+    def apply(self, chunk: Chunk) -> bool:
+        """ Applies & forgets the changes waiting for the given chunk, returns whether there were any """
+        changes, air_changes = self.pop(chunk.xPos, chunk.zPos)
+        if changes is None and air_changes is None:
+            return False
+        if changes is not None:
+            for section in changes.sections.values():
+                chunk.set_blocks({position: block for position, block in section.items()
+                                  if 0 <= position[1] < chunk.height})
+        if air_changes is not None:
+            for section in air_changes.sections.values():
+                chunk.set_blocks({position: block for position, block in section.items()
+                                  if 0 <= position[1] < chunk.height and chunk.get_material(*position).is_air()})
+        return True
+
+    def save(self, path: str):
+        with self._lock:
+            data = {}
+            for chunks, only_air in ((self.chunks, False), (self.air_chunks, True)):
+                for key, changes in chunks.items():
+                    data.setdefault("{0},{1}".format(*key), []).extend(
+                        [x, y, z, material.name] + ([True] if only_air else []) for x, y, z, material in changes)
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    def load(self, path: str):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        for key, changes in data.items():
+            chunkX, chunkZ = (int(i) for i in key.split(','))
+            # Air only changes have a fifth item
+            for x, y, z, name, *only_air in changes:
+                self.addBlock(chunkX, chunkZ, x, y, z, Material[name], only_air=bool(only_air))
+
+
+def open_world(path: str, cache_size: int = 1024, cache_memory: [int, None] = None):
+    """ Opens the world stored in the given folder (created if needed), every other function of this module reads
+    from and writes to it. Chunks are stored as full height columns in Anvil-like region files, and go through a
+    ChunkCache holding up to cache_size chunks & cache_memory bytes of blocks """
+    global _cache, _pending_edits
+    close_world()
+    _pending_edits = PendingEditStore()
+    if os.path.exists(os.path.join(path, PENDING_EDITS_FILE)):
+        _pending_edits.load(os.path.join(path, PENDING_EDITS_FILE))
+    _cache = ChunkCache(RegionStorage(path), cache_size, cache_memory, pending_edits=_pending_edits)
+    _cache.start()
+
+
+def close_world():
+    """ Writes every changed chunk & closes the world """
+    global _cache, _pending_edits
+    if _cache is not None:
+        _cache.stop()
+        _pending_edits.save(os.path.join(_cache.storage.world_path, PENDING_EDITS_FILE))
+        _cache.storage.close()
+        _cache = None
+        _pending_edits = None
+
+
+def get_chunk_cache() -> ChunkCache:
+    if _cache is None:
+        raise WorldError("No world is opened")
+    return _cache
+
+
+def get_pending_edits() -> PendingEditStore:
+    if _pending_edits is None:
+        raise WorldError("No world is opened")
+    return _pending_edits
+
+
+def addPendingEdits(edits: PendingEditStore, scheduler=None):
+    """ Applies changes to chunks generated elsewhere (e.g. by the workers generating chunks): changes of chunks
+    in memory are applied now, or in the next tick by scheduler (a SchedulerManager) if given, so threads other than
+    the tick thread never change the chunks it uses. The others are applied once their chunk is generated or loaded """
+    get_pending_edits().merge(edits)
+    if scheduler is not None:
+        scheduler.schedule(_applyPendingEdits, keys=list(edits.keys()))
+    else:
+        _applyPendingEdits(None, list(edits.keys()))
+
+
+def _applyPendingEdits(server, keys: [(int, int)]):
+    cache = get_chunk_cache()
+    for chunkX, chunkZ in keys:
+        cache.apply_pending_edits(chunkX, chunkZ)
+
+
+def hasChunk(chunkX: int, chunkZ: int) -> bool:
+    return get_chunk_cache().has_chunk(chunkX, chunkZ)
 
 
 def getChunk(chunkX: int, chunkY: int, chunkZ: int) -> Chunk:
     """ Returns the Chunk  at a given position relative to origin in chunk sizes. A chunk is 16 blocks wide.
       It may raise a ChunkNotFound exception if the requested chunk does not exist."""
-    pass
+    chunk = get_chunk_cache().get_chunk(chunkX, chunkZ)
+    if chunk.yPos != chunkY:
+        raise ChunkNotFound("Chunk {0}, {1}, {2} does not exist".format(chunkX, chunkY, chunkZ))
+    return chunk
+
+
+def saveChunk(chunk: Chunk):
+    """ Stores a Chunk, replacing the saved version if any. It is written to its region file in the background """
+    get_chunk_cache().put_chunk(chunk)
 
 
 def getRegion(regionX: int, regionY: int, regionZ: int) -> Region:
     """ Returns the Region at a given position relative to origin in region sizes.
     A region is 32 chunks large which are 512 blocks in total. """
-    pass
+    chunks = {}
+    for localX in range(REGION_SIZE):
+        for localZ in range(REGION_SIZE):
+            chunkX, chunkZ = regionX * REGION_SIZE + localX, regionZ * REGION_SIZE + localZ
+            if hasChunk(chunkX, chunkZ):
+                chunks["{0},{1}".format(localX, localZ)] = get_chunk_cache().get_chunk(chunkX, chunkZ)
+    return Region(regionX, regionZ, chunks)
 
 
 def getBlockAt(blockX: int, blockY: int, blockZ: int) -> Block:
     """ Returns the Block at a given position relative to origin """
-    pass
+    chunk = getChunk(blockX // CHUNK_SIZE, 0, blockZ // CHUNK_SIZE)
+    return chunk.get_block(blockX % CHUNK_SIZE, blockY, blockZ % CHUNK_SIZE)
 
 
 def setMaterialAt(blockX: int, blockY: int, blockZ: int, newMaterial: Material):
     """ Sets the Material of a block at a given position relative to origin to the given Material. """
-    pass
+    chunk = getChunk(blockX // CHUNK_SIZE, 0, blockZ // CHUNK_SIZE)
+    with get_chunk_cache().editing(chunk):
+        chunk.set_block(blockX % CHUNK_SIZE, blockY, blockZ % CHUNK_SIZE, newMaterial)
 
 
 def formaliseChunk(chunkX: int, chunkY: int, chunkZ: int, changes: BasicBlockContainer):
     """ Applies changes stated in the given BasicBlockContainer to a chunk with a given position relative to origin
      in Chunk sizes. It may raise a ChunkNotFound exception if the chunk does not exist. """
-    pass
+    chunk = getChunk(chunkX, chunkY, chunkZ)
+    with get_chunk_cache().editing(chunk):
+        for section in changes.sections.values():
+            chunk.set_blocks(section)
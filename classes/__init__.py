@@ -10,11 +10,14 @@ from . import utils
 
 # Import files
 from . import BasicClasses
+from . import ChunkStreamer
 from . import Exceptions
 # Library not found, uncomment next line when this will be fixed
 #from . import PathFinder
+from . import RegionFile
 from . import TerrainFeatures
 from . import WorldGenerator
+from . import WorldIO
 
 # Other stuff, which require above stuff to be loaded
 from . import mcPy
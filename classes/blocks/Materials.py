@@ -38,3 +38,11 @@ class Material(Enum):
     # ----------- UTILITY METHODS BELOW ----------
     def is_air(self):
         return bool(self is Material.AIR or self is Material.CAVE_AIR or self is Material.VOID_AIR)
+
+    def blocks_motion(self):
+        """ Whether entities collide with blocks of this Material """
+        return not (self.is_air() or self is Material.GRASS)
+
+    def is_fluid(self):
+        # No fluid Material exists yet
+        return False
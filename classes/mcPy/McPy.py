@@ -20,17 +20,19 @@ def get_available_core():
 
 
 def _launch(parser: Parser):
-    try:
-        # noinspection PyUnresolvedReferences
-        from blackfire import probe  # Profiler: https://blackfire.io free with the Git Student Package
-    except ImportError:
-        BLACKFIRE_ENABLED = False
-        logging.info("Blackfire not installed: passing")
-    else:
-        BLACKFIRE_ENABLED = True
-        probe.initialize()
-        probe.enable()
-        logging.info("Blackfire Enabled!")
+    # Ticks are always profiled by Server.profiler, Blackfire profiles everything but is too heavy to leave on
+    BLACKFIRE_ENABLED = False
+    if parser.blackfire:
+        try:
+            # noinspection PyUnresolvedReferences
+            from blackfire import probe  # Profiler: https://blackfire.io free with the Git Student Package
+        except ImportError:
+            logging.warning("Blackfire not installed: passing")
+        else:
+            BLACKFIRE_ENABLED = True
+            probe.initialize()
+            probe.enable()
+            logging.info("Blackfire Enabled!")
 
     avail_cores = get_available_core()
 
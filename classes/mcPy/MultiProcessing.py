@@ -1,11 +1,14 @@
 import logging
 import multiprocessing
+import threading
 import time
-from queue import Full
+from concurrent.futures import Future
+from queue import Empty, Full
 
 import classes.Server as Server
 
 from ..Exceptions import ServerException
+from ..utils.Thread import AtomicInteger
 
 
 class MultiProcessing():
@@ -16,9 +19,15 @@ class MultiProcessing():
         self.max_size = max_size
         self.started = True
         self.TASK_LIST = multiprocessing.Queue(maxsize=max_size)
+        # Results of the tasks added with submit, as (task id, result, exception) tuples
+        self.RESULT_LIST = multiprocessing.Queue()
+        self.atomic_id = AtomicInteger()
+        self._futures: {int: Future} = {}
+        self._futures_lock = threading.Lock()
+        self._result_thread = None
         self.workers = []
         for i in range(self.worker_number):
-            func_args = (self.TASK_LIST,)
+            func_args = (self.TASK_LIST, self.RESULT_LIST)
             p = multiprocessing.Process(target=MultiProcessing.worker, args=func_args, name='PROCESS_%d' % (i,))
             self.workers.append(p)
 
@@ -27,21 +36,39 @@ class MultiProcessing():
         for p in self.workers:
             logging.info('Starting worker %s', p.name)
             p.start()
+        self._result_thread = threading.Thread(target=self._read_results, name='RESULT_THREAD', daemon=True)
+        self._result_thread.start()
         logging.info('Workers started !')
 
     def stop(self, timeout=0):
         self.started = False
         if timeout < 0:
             timeout = 0
-        # Sleep & then terminate processes
+        # Ask workers to end, wait up to timeout milliseconds & then terminate processes
+        for _ in self.workers:
+            try:
+                self.TASK_LIST.put_nowait(None)
+            except Full:
+                break
         start = time.time()
         logging.info('Waiting for process to end ...')
-        while time.time() - start >= timeout:
+        while (time.time() - start) * 1000 < timeout:
             if not any(p.is_alive() for p in self.workers):
                 break
             time.sleep(0.1)
         for p in self.workers:
             p.terminate()
+        # Stop the result thread & fail tasks that will never complete
+        if self._result_thread:
+            self._result_thread.join(1)
+        # Terminated workers may leave items behind, don't wait for them to be flushed when exiting
+        self.TASK_LIST.cancel_join_thread()
+        self.RESULT_LIST.cancel_join_thread()
+        with self._futures_lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+        for future in futures:
+            future.set_exception(ServerException('Workers stopped before the task completed'))
         logging.info('Process stopped !')
 
     def get_worker(self, id):
@@ -51,6 +78,33 @@ class MultiProcessing():
         if not self.started:
             raise ServerException('Cannot add tasks while server is not started')
         data = {
+            'id': None,
+            'func': func,
+            'args': args,
+            'kwargs': kwargs,
+        }
+        try:
+            self.TASK_LIST.put_nowait(data)
+        except Full:
+            logging.warning('Task list is full, dropping task %s', func)
+
+    def submit(self, func, args: list, callback=None, **kwargs) -> Future:
+        """
+        Runs func(*args, **kwargs) on a worker and returns a Future holding its result.\n
+        func and its arguments must be picklable, callback (if any) is called with the Future once it is done,
+        from the thread reading the results
+        """
+        if not self.started:
+            raise ServerException('Cannot add tasks while server is not started')
+        task_id = self.atomic_id.get_and_increment()
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        future.set_running_or_notify_cancel()
+        with self._futures_lock:
+            self._futures[task_id] = future
+        data = {
+            'id': task_id,
             'func': func,
             'args': args,
             'kwargs': kwargs,
@@ -58,10 +112,31 @@ class MultiProcessing():
         try:
             self.TASK_LIST.put_nowait(data)
         except Full:
-            logging.warning()
+            with self._futures_lock:
+                del self._futures[task_id]
+            future.set_exception(ServerException('Task list is full'))
+        return future
+
+    def _read_results(self):
+        while self.started:
+            try:
+                item = self.RESULT_LIST.get(timeout=0.1)
+            except Empty:
+                continue
+            except (KeyboardInterrupt, EOFError, OSError):
+                break
+            task_id, result, exception = item
+            with self._futures_lock:
+                future = self._futures.pop(task_id, None)
+            if future is None:
+                continue
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
 
     @staticmethod
-    def worker(in_queue: multiprocessing.Queue):
+    def worker(in_queue: multiprocessing.Queue, out_queue: multiprocessing.Queue):
         while True:
             try:
                 item = in_queue.get()
@@ -69,11 +144,17 @@ class MultiProcessing():
                 break
             if item is None:
                 break
+            task_id = item['id']
             func = item['func']
             args = item['args']
             kwargs = item['kwargs']
             # Call the function
             try:
-                func(*args, **kwargs)
-            except Exception:
+                result = func(*args, **kwargs)
+            except Exception as e:
                 logging.exception('Exception while running task %s (args = %s, kwargs = %s)', func, args, kwargs)
+                if task_id is not None:
+                    out_queue.put((task_id, None, ServerException(repr(e))))
+            else:
+                if task_id is not None:
+                    out_queue.put((task_id, result, None))
@@ -15,13 +15,90 @@ class Parser:
         self.parser.add_argument("--test",               # Only launch tests
                                  action="store_true",    # Syntactic sugar to say 'default:"false"'
                                  help="Do not launch the server, only launch tests")
+        self.parser.add_argument("--catch-up",           # Tick clock
+                                 choices=["burst", "skip", "dilate"],
+                                 default="burst",
+                                 help="When ticks fall behind schedule, run them back to back (burst), drop them "
+                                      "(skip) or slow the game down (dilate). (Default: %(default)s)")
+        self.parser.add_argument("--slow-tick",          # Tick profiler
+                                 type=float,
+                                 default=50,
+                                 help="Log the phases of ticks taking more than the specified number of "
+                                      "milliseconds. (Default: %(default)s)")
+        self.parser.add_argument("--profile-sampling",
+                                 action="store_true",
+                                 help="Sample the stacks of the tick thread & log where slow ticks spent their time")
+        self.parser.add_argument("--blackfire",          # Profiler: https://blackfire.io
+                                 action="store_true",
+                                 help="Profile the whole run with Blackfire, if it is installed")
         self.parser.add_argument("--format",             # Command line flag to set the log format
                                  nargs='?',              # We expect another argument after that
                                  default="[%(asctime)s - %(levelname)s - %(threadName)s] %(message)s",
                                  help="Set the logging format to the specified format. (Default: \"%(default)s\")")
+        self.parser.add_argument("--chunk-cache",        # Size of the chunk cache
+                                 type=int,
+                                 default=1024,
+                                 help="Keep up to the specified number of chunks in memory. (Default: %(default)s)")
+        self.parser.add_argument("--world",              # Folder of the world
+                                 nargs='?',              # We expect another argument after that
+                                 default="world",
+                                 help="Load and save the world in the specified folder. (Default: \"%(default)s\")")
+        self.parser.add_argument("--seed",               # Seed of the world generator
+                                 type=int,
+                                 default=0,
+                                 help="Generate missing chunks with the specified seed. (Default: %(default)s)")
+        self.parser.add_argument("--chunks-per-tick",    # Chunk streaming
+                                 type=int,
+                                 default=4,
+                                 help="Send up to the specified number of chunks per player per tick. "
+                                      "(Default: %(default)s)")
+        self.parser.add_argument("--outbound-high-watermark",  # Backpressure of the player connections
+                                 type=int,
+                                 default=1 << 21,
+                                 help="Hold back chunks for a player once the specified number of bytes "
+                                      "wait to be sent to them. (Default: %(default)s)")
+        self.parser.add_argument("--outbound-low-watermark",
+                                 type=int,
+                                 default=1 << 19,
+                                 help="Send chunks again once less than the specified number of bytes "
+                                      "wait to be sent. (Default: %(default)s)")
+        self.parser.add_argument("--network-shards",   # Network processes
+                                 type=int,
+                                 default=1,
+                                 help="Run the specified number of network processes, sharing the port with "
+                                      "SO_REUSEPORT. (Default: %(default)s)")
+        self.parser.add_argument("--network-backend",  # Event loop of the network processes
+                                 choices=["twisted", "asyncio"],
+                                 default="twisted",
+                                 help="Serve the players with the specified network backend, asyncio uses uvloop "
+                                      "when it is installed. (Default: %(default)s)")
+        self.parser.add_argument("--compression-threshold",  # Packet compression
+                                 type=int,
+                                 default=256,
+                                 help="Compress packets of at least the specified number of bytes (every packet "
+                                      "for 0), a negative value disables compression. (Default: %(default)s)")
+        self.parser.add_argument("--compression-workers",
+                                 type=int,
+                                 default=2,
+                                 help="Compress large packets (like chunks) on the specified number of threads, "
+                                      "0 compresses them on the network thread. (Default: %(default)s)")
 
     def parse_arguments(self):
         self.args = self.parser.parse_args()
         self.debug = self.args.debug
         self.test = self.args.test
         self.format = self.args.format
+        self.catch_up = self.args.catch_up
+        self.slow_tick = self.args.slow_tick
+        self.profile_sampling = self.args.profile_sampling
+        self.blackfire = self.args.blackfire
+        self.world = self.args.world
+        self.chunk_cache = self.args.chunk_cache
+        self.seed = self.args.seed
+        self.chunks_per_tick = self.args.chunks_per_tick
+        self.outbound_high_watermark = self.args.outbound_high_watermark
+        self.outbound_low_watermark = self.args.outbound_low_watermark
+        self.network_shards = self.args.network_shards
+        self.network_backend = self.args.network_backend
+        self.compression_threshold = self.args.compression_threshold
+        self.compression_workers = self.args.compression_workers
@@ -0,0 +1,202 @@
+# coding=utf-8
+""" Network backend running the player connections on an asyncio event loop (uvloop when it is installed) instead of
+the Twisted reactor. Connections are the same PlayerNetwork protocols: handshake, login, packet dispatch & outbound
+buffers are shared with the Twisted backend, only the transport, the ticker & Mojang authentication differ """
+import asyncio
+import json
+import urllib.parse
+import urllib.request
+
+from quarry.net import auth, crypto
+from quarry.net.protocol import ProtocolError
+from quarry.net.ticker import Ticker
+from twisted.internet.address import IPv4Address
+
+from .Connection import STATS_INTERVAL, PlayerNetwork, ServerFactory
+
+try:
+    # noinspection PyUnresolvedReferences
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+def new_event_loop() -> asyncio.AbstractEventLoop:
+    """ Returns a new uvloop loop if uvloop is installed, else a new asyncio loop """
+    if uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def has_joined(timeout, digest, display_name, remote_host=None) -> dict:
+    """ Blocking version of quarry's auth.has_joined, asks the session server whether the player joined """
+    data = {"username": display_name, "serverId": digest}
+    if remote_host:
+        data["ip"] = remote_host
+    url = auth.SESSION_SERVER.decode('ascii') + "hasJoined?" + urllib.parse.urlencode(data)
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        content = response.read()
+    if not content:
+        raise auth.AuthException('invalid', 'Session server returned no profile')
+    return json.loads(content)
+
+
+class AsyncioTicker(Ticker):
+    """
+    quarry's Ticker scheduled on the running asyncio loop.
+    Ticks are scheduled from the time of the first one, late ticks are run together like LoopingCall.withCount
+    """
+
+    def __init__(self, logger):
+        super(AsyncioTicker, self).__init__(logger)
+        self._loop = asyncio.get_event_loop()
+        self._handle = None
+        self._next = 0.0
+
+    def start(self):
+        if not self.running:
+            self._next = self._loop.time() + self.interval
+            self._handle = self._loop.call_at(self._next, self._run)
+            self.running = True
+
+    def stop(self):
+        if self.running:
+            self._handle.cancel()
+            self.running = False
+
+    def _run(self):
+        count = int((self._loop.time() - self._next) / self.interval) + 1
+        self._next += count * self.interval
+        # Scheduled first so a task stopping the ticker cancels the next tick
+        self._handle = self._loop.call_at(self._next, self._run)
+        self._update(count)
+
+
+class AsyncioConnection(asyncio.Protocol):
+    """
+    Drives a PlayerNetwork from an asyncio transport & is its transport, with the few methods of Twisted's
+    transports it uses
+    """
+
+    def __init__(self, factory: ServerFactory):
+        self.factory = factory
+        self.transport: asyncio.Transport = None
+        self.protocol: PlayerNetwork = None
+        self.producer = None
+
+    # asyncio protocol --------------------------------------------------------
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        host, port = transport.get_extra_info('peername')[:2]
+        self.protocol = self.factory.buildProtocol(IPv4Address('TCP', host, port))
+        self.protocol.transport = self
+        self.protocol.connectionMade()
+
+    def data_received(self, data: bytes):
+        self.protocol.dataReceived(data)
+
+    def connection_lost(self, exc):
+        self.protocol.connectionLost(exc)
+
+    def pause_writing(self):
+        if self.producer:
+            self.producer.pauseProducing()
+
+    def resume_writing(self):
+        if self.producer:
+            self.producer.resumeProducing()
+
+    # Transport of the PlayerNetwork ------------------------------------------
+    def write(self, data: bytes):
+        self.transport.write(data)
+
+    def loseConnection(self):
+        self.transport.close()
+
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+
+    def unregisterProducer(self):
+        self.producer = None
+
+    def getPeer(self) -> IPv4Address:
+        return self.protocol.remote_addr
+
+
+class AsyncioPlayerNetwork(PlayerNetwork):
+
+    def packet_login_encryption_response(self, buff):
+        """
+        quarry's key exchange for 1.15.2, with the session server request made on a thread of the loop's executor
+        instead of Twisted's http client
+        """
+        if self.login_expecting != 1:
+            raise ProtocolError("Out-of-order login")
+        shared_secret = crypto.decrypt_secret(self.factory.keypair, buff.read(buff.unpack_varint(max_bits=16)))
+        verify_token = crypto.decrypt_secret(self.factory.keypair, buff.read(buff.unpack_varint(max_bits=16)))
+        if verify_token != self.verify_token:
+            raise ProtocolError("Verify token incorrect")
+        self.login_expecting = None
+        self.cipher.enable(shared_secret)
+        digest = crypto.make_digest(self.server_id.encode('ascii'), shared_secret, self.factory.public_key)
+        remote_host = self.remote_addr.host if self.factory.prevent_proxy_connections else None
+        future = asyncio.get_event_loop().run_in_executor(None, has_joined, self.factory.auth_timeout, digest,
+                                                          self.display_name, remote_host)
+        future.add_done_callback(self._auth_done)
+
+    def _auth_done(self, future: asyncio.Future):
+        if self.closed:
+            return
+        if future.exception() is not None:
+            self.logger.warning("Auth failed: %s" % future.exception())
+            self.close("Auth failed: %s" % future.exception())
+        else:
+            self.auth_ok(future.result())
+
+
+class AsyncioServerFactory(ServerFactory):
+    """
+    ServerFactory serving the players from an asyncio event loop, the loop is created by pre_start_server &
+    run by start_server in the network thread
+    """
+    ticker_type = AsyncioTicker
+
+    def __init__(self, *args, **kwargs):
+        super(AsyncioServerFactory, self).__init__(*args, **kwargs)
+        self.protocol = AsyncioPlayerNetwork
+        self.loop: asyncio.AbstractEventLoop = None
+        self._server: asyncio.AbstractServer = None
+
+    def pre_start_server(self):
+        self.loop = new_event_loop()
+        self.listen(self._host, self._port)
+        self._stats_loop = self.loop.call_later(STATS_INTERVAL, self._log_stats_later)
+
+    def listen(self, host, port=25565):
+        self._server = self.loop.run_until_complete(self.loop.create_server(
+            lambda: AsyncioConnection(self), host, port, reuse_port=self.reuse_port or None))
+
+    def _log_stats_later(self):
+        self._stats_loop = self.loop.call_later(STATS_INTERVAL, self._log_stats_later)
+        self.log_stats()
+
+    def start_server(self):
+        """
+        Start the server\n
+        THIS METHOD BLOCKS, IT SHOULD BE CALLED IN ASYNC OR IN ANOTHER THREAD
+        """
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def stop_server(self):
+        """
+        Stop the server started by start_server, from any thread
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+# Network backends selectable with --network-backend
+BACKENDS = {
+    'twisted': ServerFactory,
+    'asyncio': AsyncioServerFactory,
+}
@@ -0,0 +1,62 @@
+# coding=utf-8
+""" Audiences select which players receive a broadcast packet, see PlayerManager.broadcast """
+import math
+
+
+class Audience:
+    """
+    Abstract class, select returns the entity ids of the players receiving the packet,
+    or None when every player does
+    """
+
+    def select(self, players) -> [[int], None]:
+        raise NotImplementedError()
+
+
+class Everyone(Audience):
+
+    def select(self, players) -> None:
+        return None
+
+
+class WithinRadius(Audience):
+    """
+    Players whose location is at most radius blocks away from a point
+    """
+
+    def __init__(self, x: float, y: float, z: float, radius: float):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.radius = radius
+
+    def select(self, players) -> [int]:
+        radius_squared = self.radius * self.radius
+        selected = []
+        for player in players:
+            location = player.entity_location
+            if (location.x - self.x) ** 2 + (location.y - self.y) ** 2 + (location.z - self.z) ** 2 <= radius_squared:
+                selected.append(player.entity_id)
+        return selected
+
+
+class ChunkViewers(Audience):
+    """
+    Players having a chunk inside the square of chunks of their view distance
+    """
+
+    def __init__(self, chunk_x: int, chunk_z: int):
+        self.chunk_x = chunk_x
+        self.chunk_z = chunk_z
+
+    def select(self, players) -> [int]:
+        selected = []
+        for player in players:
+            distance = player.view_distance
+            if abs((math.floor(player.entity_location.x) >> 4) - self.chunk_x) <= distance \
+                    and abs((math.floor(player.entity_location.z) >> 4) - self.chunk_z) <= distance:
+                selected.append(player.entity_id)
+        return selected
+
+
+ALL = Everyone()
@@ -0,0 +1,141 @@
+# coding=utf-8
+""" Packet codecs compiled from field schemas.
+
+A schema lists the fields of a packet as (name, type, default) in wire order. Types are struct format characters
+(such as 'i', 'q', '?' or 'd', always big endian) or one of 'varint', 'string' & 'chat'.
+Consecutive struct fields are packed by a single precompiled struct.Struct & an encoder writes its whole packet into
+one preallocated bytearray. Encoders & decoders are generated as Python source once, when the protocol is loaded """
+import struct
+
+from classes.network.VarInt import read_varint, varint_size, write_varint
+
+VARIABLE_TYPES = ('varint', 'string', 'chat')
+_STRING_MAX = 32767
+# Names used by the generated code, which also starts its own names with an underscore
+_RESERVED = ('buff', 'buff_type')
+
+
+def encode_string(text: str) -> bytes:
+    """ The utf-8 bytes of a string field, checking its length """
+    data = text.encode('utf-8')
+    if len(data) > _STRING_MAX:
+        raise ValueError("String of {0} bytes is longer than {1}".format(len(data), _STRING_MAX))
+    return data
+
+
+def read_string(buff) -> str:
+    """ Reads a string field from a quarry Buffer, like buff.unpack_string() """
+    return buff.read(read_varint(buff, max_bits=16)).decode('utf-8')
+
+
+def _groups(schema) -> [(str, [str])]:
+    """ Splits a schema into struct groups ('struct', [fields]) & variable fields (type, [field]) """
+    groups = []
+    for name, field_type, _ in schema:
+        if name in _RESERVED or name.startswith('_') or not name.isidentifier():
+            raise ValueError("Invalid field name {0!r}".format(name))
+        if field_type in VARIABLE_TYPES:
+            groups.append((field_type, [name]))
+        elif groups and groups[-1][0] == 'struct':
+            groups[-1][1].append(name)
+        else:
+            groups.append(('struct', [name]))
+    return groups
+
+
+def _structs(schema) -> [struct.Struct]:
+    types = {name: field_type for name, field_type, _ in schema}
+    return [struct.Struct('>' + ''.join(types[name] for name in names))
+            for kind, names in _groups(schema) if kind == 'struct']
+
+
+def compile_encoder(packet: str, schema):
+    """
+    Returns the encoder function(buff_type, **fields) of a packet, returning a list with the packet's body like the
+    encoders of BasicNetwork
+    """
+    structs = _structs(schema)
+    namespace = {'_varint_size': varint_size, '_write_varint': write_varint, '_encode_string': encode_string}
+    arguments = ', '.join('{0}={1!r}'.format(name, default) for name, _, default in schema)
+    lines = ['def {0}(buff_type{1}):'.format(packet, ', ' + arguments if arguments else '')]
+    groups = _groups(schema)
+    if len(groups) == 1 and groups[0][0] == 'struct':
+        # A single struct: its bytes are the body
+        namespace['_s0'] = structs[0]
+        lines.append('    return [_s0.pack({0})]'.format(', '.join(groups[0][1])))
+    else:
+        sizes = []
+        struct_index = 0
+        for kind, names in groups:
+            name = names[0]
+            if kind == 'struct':
+                namespace['_s%d' % struct_index] = structs[struct_index]
+                sizes.append(str(structs[struct_index].size))
+                struct_index += 1
+            elif kind == 'varint':
+                sizes.append('_varint_size({0})'.format(name))
+            elif kind == 'string':
+                lines.append('    {0} = _encode_string({0})'.format(name))
+                sizes.append('_varint_size(len({0})) + len({0})'.format(name))
+            else:
+                lines.append('    {0} = buff_type.pack_chat({0})'.format(name))
+                sizes.append('len({0})'.format(name))
+        lines.append('    _buf = bytearray({0})'.format(' + '.join(sizes)))
+        lines.append('    _position = 0')
+        struct_index = 0
+        for kind, names in groups:
+            name = names[0]
+            if kind == 'struct':
+                lines.append('    _s{0}.pack_into(_buf, _position, {1})'.format(struct_index, ', '.join(names)))
+                lines.append('    _position += {0}'.format(structs[struct_index].size))
+                struct_index += 1
+            elif kind == 'varint':
+                lines.append('    _position = _write_varint(_buf, _position, {0})'.format(name))
+            else:
+                if kind == 'string':
+                    lines.append('    _position = _write_varint(_buf, _position, len({0}))'.format(name))
+                lines.append('    _buf[_position:_position + len({0})] = {0}'.format(name))
+                lines.append('    _position += len({0})'.format(name))
+        lines.append('    return [_buf]')
+    exec('\n'.join(lines), namespace)
+    return namespace[packet]
+
+
+def compile_decoder(packet: str, schema):
+    """
+    Returns the decoder function(buff) of a packet, returning its fields as a dict like the decoders of
+    BasicNetworkInput
+    """
+    structs = _structs(schema)
+    namespace = {'_read_varint': read_varint, '_read_string': read_string}
+    lines = ['def {0}(buff):'.format(packet)]
+    struct_index = 0
+    for kind, names in _groups(schema):
+        if kind == 'struct':
+            namespace['_s%d' % struct_index] = structs[struct_index]
+            lines.append('    {0}, = _s{1}.unpack(buff.read({2}))'.format(
+                ', '.join(names), struct_index, structs[struct_index].size))
+            struct_index += 1
+        elif kind == 'varint':
+            lines.append('    {0} = _read_varint(buff)'.format(names[0]))
+        elif kind == 'string':
+            lines.append('    {0} = _read_string(buff)'.format(names[0]))
+        else:
+            lines.append('    {0} = buff.unpack_chat()'.format(names[0]))
+    lines.append('    return {{{0}}}'.format(', '.join('{0!r}: {0}'.format(name) for name, _, _ in schema)))
+    exec('\n'.join(lines), namespace)
+    return namespace[packet]
+
+
+def compile_protocol(name: str, base: type, encoders: dict = None, decoders: dict = None) -> type:
+    """
+    Returns a subclass of base (BasicNetwork or BasicNetworkInput) with a static method compiled for each packet of
+    encoders or decoders, which map packet names to schemas. Packets that can't be described by a schema are written
+    as static methods of a subclass of the returned class
+    """
+    methods = {}
+    for packet, schema in (encoders or {}).items():
+        methods[packet] = staticmethod(compile_encoder(packet, schema))
+    for packet, schema in (decoders or {}).items():
+        methods[packet] = staticmethod(compile_decoder(packet, schema))
+    return type(name, (base,), methods)
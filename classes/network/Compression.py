@@ -0,0 +1,125 @@
+# coding=utf-8
+""" Packet compression of the network process: small packets are compressed inline, large ones on a thread pool
+(zlib releases the GIL) & their frames are cached so every player receiving the same payload reuses them """
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from .VarInt import pack_varint
+from ..utils.Thread import CancellableExecutor
+
+DEFAULT_THRESHOLD = 256
+DEFAULT_WORKERS = 2
+# Packets of at least this many bytes (such as chunk data) are compressed on the pool & cached
+DEFAULT_OFFLOAD_SIZE = 8192
+
+
+class NetworkStats:
+    """ Counters of the compression & encryption work, read & reset by take """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.packets = 0
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cache_hits = 0
+        self.compress_time = 0.0
+        self.encrypt_time = 0.0
+
+    def add_compression(self, bytes_in: int, bytes_out: int, cpu_time: float, compressed: bool):
+        with self._lock:
+            self.packets += 1
+            self.compressed += compressed
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.compress_time += cpu_time
+
+    def add_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def add_encryption(self, cpu_time: float):
+        with self._lock:
+            self.encrypt_time += cpu_time
+
+    def take(self, ticks: float = 1.0) -> dict:
+        """ Returns the counters since the last call with times per tick in milliseconds, then resets them """
+        with self._lock:
+            stats = {
+                'packets': self.packets,
+                'compressed': self.compressed,
+                'cache_hits': self.cache_hits,
+                'ratio': self.bytes_out / self.bytes_in if self.bytes_in else 1.0,
+                'compress_ms_per_tick': self.compress_time * 1000 / ticks,
+                'encrypt_ms_per_tick': self.encrypt_time * 1000 / ticks,
+            }
+            self._reset()
+        return stats
+
+
+class Compressor:
+    """
+    Packs packets like quarry's Buffer.pack_packet, for any compression threshold (-1 for none).\n
+    Packets of at least offload_size bytes are compressed on a pool of worker threads (unless workers is 0) & frame
+    returns a Future. Their frames are kept in a LRU cache of cache_size entries keyed by the packet, so a payload sent to many players
+    (or sent again, like chunks) is only compressed once
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, offload_size: int = DEFAULT_OFFLOAD_SIZE, level: int = 6,
+                 cache_size: int = 256):
+        self.offload_size = offload_size
+        self.level = level
+        self.cache_size = cache_size
+        self.stats = NetworkStats()
+        self._executor = CancellableExecutor(workers, thread_name_prefix='COMPRESSION') if workers > 0 else None
+        self._cache: OrderedDict = OrderedDict()  # (threshold, packet) -> frame or Future of the frame
+        self._cache_lock = threading.Lock()
+
+    def frame(self, buff_type, data: bytes, threshold: int) -> [bytes, Future]:
+        """ Frames data (packet id & body), returns the frame or a Future of it for large packets """
+        if threshold < 0 or len(data) < self.offload_size:
+            return self._pack(buff_type, data, threshold)
+        key = (threshold, data)
+        with self._cache_lock:
+            frame = self._cache.get(key)
+            if frame is not None:
+                self._cache.move_to_end(key)
+                self.stats.add_cache_hit()
+                return frame
+            if self._executor is None:
+                frame = self._pack(buff_type, data, threshold)
+            else:
+                frame = self._executor.submit(self._pack, buff_type, data, threshold)
+                frame.add_done_callback(self._log_failure)
+            self._cache[key] = frame
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return frame
+
+    def _pack(self, buff_type, data: bytes, threshold: int) -> bytes:
+        start = time.thread_time()
+        length = len(data)
+        compressed = 0 <= threshold <= length
+        if compressed:
+            data = pack_varint(length) + zlib.compress(data, self.level)
+        elif threshold >= 0:
+            data = pack_varint(0) + data
+        frame = pack_varint(len(data)) + data
+        self.stats.add_compression(length, len(frame), time.thread_time() - start, compressed)
+        return frame
+
+    @staticmethod
+    def _log_failure(future: Future):
+        if future.exception() is not None:
+            logging.error('Cannot compress packet', exc_info=future.exception())
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,44 +1,117 @@
 import logging
 import multiprocessing
+import socket
 import threading
+import time
 
+from concurrent.futures import Future
+from functools import partial
 from multiprocessing.queues import Empty
 
 from classes.utils.Utils import Version
-from quarry.data import packets
 from quarry.net import server
 from quarry.net.protocol import ProtocolError
-from twisted.internet import reactor
+from quarry.types.buffer import BufferUnderrun, buff_types
+from quarry.types.uuid import UUID
+from twisted.internet import reactor, task
 
 import classes.Server as Server
 
+from .Compression import DEFAULT_THRESHOLD, DEFAULT_WORKERS, Compressor
+from .Dispatch import DispatchTable
+from .IPC import Opcode, RingBuffer, pack_frame, unpack_frame
 from .IncomingPacketAction import ServerAction, ServerActionType
-from .PacketType import BasicNetwork, PacketType, PacketTypeInput
+from .Outbound import DEFAULT_HIGH_WATERMARK, DEFAULT_LOW_WATERMARK, OutboundBuffer
+from .PacketType import BasicNetwork, PacketType
+from .VarInt import pack_varint, read_varint
 from .versions.v578 import v1_15_2, v1_15_2_Input
 
 
 QUEUE_SIZE = 100000
+# Seconds between two logs of the network stats
+STATS_INTERVAL = 5
+# Capacity in bytes of the ring buffer carrying frames to the network process
+RING_SIZE = 1 << 22
+# Seconds given to a network process to stop before it is killed
+STOP_TIMEOUT = 5
+# Seconds a control frame (INIT_PLAYER, DESTROY_PLAYER, STOP) waits for space in a full ring, they are never dropped
+# otherwise: both processes must agree on who is connected
+CONTROL_TIMEOUT = 10
+# Encoders of the supported protocol versions
+PROTOCOLS = {
+    578: v1_15_2,
+}
+# Decoders of the supported protocol versions
+PROTOCOLS_INPUT = {
+    578: v1_15_2_Input,
+}
+# Status pings are answered with the packets of this version, whatever the version of the client
+STATUS_PROTOCOL = 578
+_DISPATCH_TABLES = {}
+# (protocol version, encoders indexed by PacketType.index, buffer type) of each version packets are sent with
+_ENCODERS = None
+
+
+def get_buff_type(protocol_version: int):
+    """ Returns the quarry Buffer class used after handshaking by the given protocol version """
+    for version, buff_type in reversed(buff_types):
+        if protocol_version >= version:
+            return buff_type
+
+
+def get_dispatch_table(protocol_version: int) -> DispatchTable:
+    """ Returns the DispatchTable of the given protocol version, built on first use """
+    table = _DISPATCH_TABLES.get(protocol_version)
+    if table is None:
+        table = _DISPATCH_TABLES[protocol_version] = DispatchTable(
+            protocol_version, PROTOCOLS.get(protocol_version), PROTOCOLS_INPUT.get(protocol_version))
+    return table
+
+
+def get_encoders() -> [(int, list, type)]:
+    """ Returns the protocol version, encoders & buffer type of each supported version, resolved on first use """
+    global _ENCODERS
+    if _ENCODERS is None:
+        _ENCODERS = [(protocol, get_dispatch_table(protocol).encoders, get_buff_type(protocol))
+                     for protocol in PROTOCOLS]
+    return _ENCODERS
 
 
 class PlayerNetwork(server.ServerProtocol):
+    # Set by the server once the player is loaded, see ServerFactory.player_joined_server
+    entity_id = -1
+    # Names & handlers of the packets received in the current protocol mode, indexed by packet id
+    _names = ()
+    _handlers = ()
+
+    def setup(self):
+        self._log_packets = self.logger.isEnabledFor(logging.DEBUG)
+        self._update_dispatch()
+
+    def _update_dispatch(self):
+        """
+        Resolves the dispatch table, packet names & bound handlers of the current protocol version & mode.
+        Called whenever either changes
+        """
+        protocol_version = STATUS_PROTOCOL if self.protocol_mode == 'status' else self.protocol_version
+        self._dispatch = get_dispatch_table(protocol_version)
+        self._names = self._dispatch.names.get(self.protocol_mode, ())
+        self._idents = self._dispatch.idents.get(self.protocol_mode, {})
+        handlers = []
+        for ident, name in enumerate(self._names):
+            handler = getattr(self, 'packet_' + name, None) if name else None
+            if handler is None and self.protocol_mode == 'play' and self._dispatch.decoders[ident]:
+                decoder, packet_type = self._dispatch.decoders[ident]
+                handler = partial(self.on_packet, decoder, packet_type)
+            handlers.append(handler)
+        self._handlers = handlers
 
     def handle_loop(self):
         """
-        This method will check if there is a packet to send to the player and if there is, it sends the packet\n
+        This method sends every packet waiting for the player in a single write\n
         This method is called 20 times per seconds
         """
-        while True:
-            try:
-                item = self.TASK_QUEUE.get_nowait()
-            except (KeyboardInterrupt, Empty):
-                return
-            if item:
-                # Handle it
-                packet_type = item['packet_type']
-                data = item['data']
-                self.make_packet_and_send(packet_type=packet_type, data=data)
-            else:
-                break
+        self.outbound.flush(self.send_prepared)
 
     def player_joined(self):
         """
@@ -51,11 +124,12 @@ class PlayerNetwork(server.ServerProtocol):
             # Version not supported
             self.close('Invalid or unsupported protocol, please use a supported version of Minecraft !')
             return
-        self._protocol = self.factory._protocol[str(self.protocol_version)]
-        self._protocol_input = self.factory._protocol_input[str(self.protocol_version)]
         self.version = Version.get_version(self.protocol_version)
 
-        self.TASK_QUEUE = multiprocessing.Queue(QUEUE_SIZE)
+        self.outbound = OutboundBuffer(self.factory.high_watermark, self.factory.low_watermark,
+                                       on_writable=self._writable_changed, on_error=self._frame_failed)
+        # Stop flushing while the transport's own buffer is full
+        self.transport.registerProducer(self, True)
         self._handle_loop = self.ticker.add_loop(1, self.handle_loop)
         # Keep alive loop
         self.ticker.add_loop(20, self._update_keep_alive)
@@ -71,9 +145,9 @@ class PlayerNetwork(server.ServerProtocol):
         self.factory.player_left_network(self)
 
     def make_packet(self, packet_type: PacketType, data):
-        packet_class = getattr(self._protocol, packet_type.id, None)
-        if packet_class:
-            return packet_class(self.buff_type, **data)
+        encoder = self._dispatch.encoders[packet_type.index]
+        if encoder:
+            return encoder(self.buff_type, **data)
         return None
 
     def make_packet_and_send(self, packet_type: PacketType, data):
@@ -93,24 +167,68 @@ class PlayerNetwork(server.ServerProtocol):
         NetworkController.send_packet(packet_type=PacketType.CHAT_MESSAGE,
                                       message=message)
 
-    def add_packet(self, packet_type: PacketType, data):
+    def prepare_packet(self, packet_type: PacketType, body: bytes) -> [bytes, Future]:
+        """
+        Frames an encoded packet like send_packet does, without encrypting it.
+        The frame can be sent to every player with the same protocol version & compression threshold.
+        Large packets are compressed by the factory's Compressor on another thread, a Future of the frame is returned
+        """
+        data = pack_varint(self._dispatch.packet_idents[packet_type.index]) + body
+        return self.factory.compressor.frame(self.buff_type, data, self.compression_threshold)
+
+    def send_prepared(self, frame: bytes):
+        """
+        Sends a frame made by prepare_packet
+        """
+        if self.closed:
+            return
+        start = time.thread_time()
+        frame = self.cipher.encrypt(frame)
+        self.factory.compressor.stats.add_encryption(time.thread_time() - start)
+        self.transport.write(frame)
+
+    def add_packet(self, packet_type: PacketType, body: bytes):
         """
-        Add a packet into the QUEUE\n
+        Add an encoded packet into the outbound buffer\n
         The packet will be sent to the player on the next tick
         """
-        self.TASK_QUEUE.put_nowait({
-            'packet_type': packet_type,
-            'data': data,
-        })
+        self.add_frame(self.prepare_packet(packet_type, body), len(body))
+
+    def add_frame(self, frame: [bytes, Future], size: [int, None] = None):
+        """
+        Add a frame made by prepare_packet into the outbound buffer, size estimates the size of Futures
+        """
+        self.outbound.append(frame, size)
+
+    def _frame_failed(self, error: Exception):
+        """
+        A frame couldn't be made (see OutboundBuffer): the client would read the next packets out of order
+        """
+        logging.error('Cannot send a packet to %s, closing the connection', self.display_name, exc_info=error)
+        self.close('Internal server error')
+
+    def _writable_changed(self, writable: bool):
+        """
+        Tells the server to hold back chunks while the client is behind, see OutboundBuffer
+        """
+        NetworkController.execute_server(ServerActionType.CONNECTION_WRITABLE, uuid=self.uuid, writable=writable)
+
+    # Streaming producer of the transport -------------------------------------
+    def pauseProducing(self):
+        self.outbound.pause()
 
-    def on_packet(self, buff, packet_type: PacketTypeInput):
-        packet_class = getattr(self._protocol_input, packet_type.id, None)
-        if packet_class:
-            data = packet_class(buff)
-            NetworkController.execute_server(packet_type.server_action_type, uuid=self.uuid, **data)
+    def resumeProducing(self):
+        self.outbound.resume()
+        self.outbound.flush(self.send_prepared)
 
-    def packet_client_settings(self, buff):
-        self.on_packet(buff, PacketTypeInput.CLIENT_SETTINGS)
+    def stopProducing(self):
+        self.outbound.pause()
+
+    def on_packet(self, decoder, packet_type, buff):
+        """
+        Handler of the packets of PacketTypeInput, sends their decoded fields to the server
+        """
+        NetworkController.execute_server(packet_type.server_action_type, uuid=self.uuid, **decoder(buff))
 
     # def update_tablist(self):
     #     parsed_player_list = []
@@ -125,34 +243,88 @@ class PlayerNetwork(server.ServerProtocol):
     #     ))
 
     # Methods overridden for compatibility ------------------------------------
+    def switch_protocol_mode(self, mode):
+        super(PlayerNetwork, self).switch_protocol_mode(mode)
+        self._update_dispatch()
+
+    def packet_handshake(self, buff):
+        super(PlayerNetwork, self).packet_handshake(buff)
+        # The handshake sets the protocol version
+        self._update_dispatch()
+
+    def data_received(self, data):
+        """
+        quarry's data_received, packets are dispatched by id to the handlers of the current protocol mode
+        """
+        data = self.cipher.decrypt(data)
+        self.recv_buff.add(data)
+        while not self.closed:
+            # Save the buffer, in case we read an incomplete packet
+            self.recv_buff.save()
+            try:
+                buff = self.recv_buff.unpack_packet(self.buff_type, self.compression_threshold)
+            except BufferUnderrun:
+                self.recv_buff.restore()
+                break
+
+            try:
+                ident = read_varint(buff)
+                name = self.get_packet_name(ident)
+                handler = self._handlers[ident]
+                if self._log_packets:
+                    self.log_packet(". recv", name)
+                try:
+                    if handler is None:
+                        self.packet_unhandled(buff, name)
+                    else:
+                        handler(buff)
+                except BufferUnderrun:
+                    raise ProtocolError("Packet is too short: %s" % name)
+                if len(buff) > 0:
+                    raise ProtocolError("Packet is too long: %s" % name)
+
+                # Reset the inactivity timer
+                self.connection_timer.restart()
+
+            except ProtocolError as e:
+                self.protocol_error(e)
+
     def get_packet_name(self, ident):
-        protver = self.protocol_version
-        if self.protocol_mode == 'status':
-            protver = 578
-        key = (protver, self.protocol_mode, self.recv_direction,
-               ident)
-        try:
-            return packets.packet_names[key]
-        except KeyError:
+        name = self._names[ident] if 0 <= ident < len(self._names) else None
+        if name is None:
+            key = (self.protocol_version, self.protocol_mode, self.recv_direction, ident)
             raise ProtocolError("No name known for packet: %s" % (key,))
+        return name
 
     def get_packet_ident(self, name):
-        protver = self.protocol_version
-        if self.protocol_mode == 'status':
-            protver = 578
-        key = (protver, self.protocol_mode, self.send_direction,
-               name)
         try:
-            return packets.packet_idents[key]
+            return self._idents[name]
         except KeyError:
+            key = (self.protocol_version, self.protocol_mode, self.send_direction, name)
             raise ProtocolError("No ID known for packet: %s" % (key,))
 
+
 class ServerFactory(server.ServerFactory):
 
-    def __init__(self, host='localhost', port=25565):
+    def __init__(self, host='localhost', port=25565, high_watermark=DEFAULT_HIGH_WATERMARK,
+                 low_watermark=DEFAULT_LOW_WATERMARK, compression_threshold=DEFAULT_THRESHOLD,
+                 compression_workers=DEFAULT_WORKERS, shard=0, reuse_port=False, online_mode=True):
         super(ServerFactory, self).__init__()
         self._host = host
         self._port = port
+        # Index of this network process & whether other processes listen on the same port
+        self.shard = shard
+        self.reuse_port = reuse_port
+        # Authenticate players with Mojang's session server
+        self.online_mode = online_mode
+        # Outbound buffer sizes of the players, see OutboundBuffer
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        # Packets of at least this many bytes are compressed. quarry doesn't enable compression for 0, 1 compresses
+        # every packet (they all have an id) & negative values disable it
+        self.compression_threshold = 1 if compression_threshold == 0 else max(compression_threshold, 0)
+        self.compressor = Compressor(compression_workers)
+        self._stats_loop = None
         self.protocol = PlayerNetwork
         self._players = self.protocol._players = {}
         self._unloaded_players = self.protocol._unloaded_players = {}
@@ -164,7 +336,33 @@ class ServerFactory(server.ServerFactory):
         }
 
     def pre_start_server(self):
-        self.listen(self._host, self._port)
+        if self.reuse_port:
+            self.listen_reuse_port(self._host, self._port)
+        else:
+            self.listen(self._host, self._port)
+        self._stats_loop = task.LoopingCall(self.log_stats)
+        self._stats_loop.start(STATS_INTERVAL, now=False)
+
+    def listen_reuse_port(self, host, port):
+        """
+        Listen with SO_REUSEPORT, the kernel spreads the connections between every process listening on this port
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+        sock.listen(50)
+        sock.setblocking(False)
+        # The reactor uses a copy of the file descriptor
+        port = reactor.adoptStreamPort(sock.fileno(), socket.AF_INET, self)
+        sock.close()
+        return port
+
+    def log_stats(self):
+        stats = self.compressor.stats.take(STATS_INTERVAL * 20)
+        logging.debug('Network: %d packets (%d compressed, %d cached), compression ratio %.2f, '
+                      'compression %.2f ms/tick, encryption %.2f ms/tick', stats['packets'], stats['compressed'],
+                      stats['cache_hits'], stats['ratio'], stats['compress_ms_per_tick'], stats['encrypt_ms_per_tick'])
 
     def start_server(self):
         """
@@ -173,6 +371,12 @@ class ServerFactory(server.ServerFactory):
         """
         reactor.run(installSignalHandlers=False)
 
+    def stop_server(self):
+        """
+        Stop the server started by start_server, from any thread
+        """
+        reactor.callFromThread(reactor.stop)
+
     def set_motd(self, motd):
         self.motd = motd
 
@@ -194,7 +398,7 @@ class ServerFactory(server.ServerFactory):
         """
         # We can add player to the list
         self._unloaded_players[str(player.uuid)] = player
-        NetworkController.execute_server(ServerActionType.PLAYER_JOIN, uuid=player.uuid, display_name=player.display_name, version=player.version)
+        NetworkController.execute_server(ServerActionType.PLAYER_JOIN, uuid=player.uuid, display_name=player.display_name, version=player.version, shard=self.shard)
         # NetworkController.send_packet(packet_type=PacketType.CHAT_MESSAGE,
         #                               message=u"\u00a7e%s joined the game" % player.display_name)
 
@@ -229,91 +433,164 @@ class ServerFactory(server.ServerFactory):
         if entity_id != -1:
             del self._players[str(entity_id)]
 
-    def send_packet(self, packet_type: PacketType, **data):
-        for entity_id in self._players:
-            self.send_packet_player(entity_id, packet_type, **data)
-
-    def send_packet_player(self, entity_id, packet_type: PacketType, **data):
-        p = self.get_player(entity_id)
-        if p:
-            p.add_packet(packet_type, **data)
+    def send_packet(self, protocol: int, packet_type: PacketType, body: bytes, targets=None):
+        """
+        Send a packet encoded for the given protocol version to the players using this version,
+        either every player or only the given entity ids.\n
+        The packet is framed once per compression threshold and the same frame is queued for every player
+        """
+        if targets is None:
+            players = self._players.values()
+        else:
+            players = filter(None, (self.get_player(entity_id) for entity_id in targets))
+        frames = {}
+        for p in players:
+            if p.protocol_version != protocol:
+                continue
+            frame = frames.get(p.compression_threshold)
+            if frame is None:
+                frame = frames[p.compression_threshold] = p.prepare_packet(packet_type, body)
+            p.add_frame(frame, len(body))
+
+    def send_packet_player(self, entity_id, protocol: int, packet_type: PacketType, body: bytes):
+        self.send_packet(protocol, packet_type, body, (entity_id,))
 
 
 class NetworkController:
-    # Outgoing data (Server => Clients)
-    OUT_QUEUE = multiprocessing.Queue(QUEUE_SIZE)
+    # Outgoing data (Server => Clients), as frames of classes.network.IPC, one ring per network process
+    OUT_RINGS: [RingBuffer] = []
     # Incoming data (Clients => Server)
     IN_QUEUE = multiprocessing.Queue(QUEUE_SIZE)
-    # The Network Process
-    networking_process: multiprocessing.Process
+    # Methods of ServerAction handling each ServerActionType, indexed by ServerActionType.index
+    _action_handlers = []
+    # The Network Processes
+    networking_processes: [multiprocessing.Process] = []
+    # Network process of each player, by uuid until they get an entity id & then by entity id
+    _uuid_shards: {str: int} = {}
+    _entity_shards: {int: int} = {}
 
     @staticmethod
-    def start_process(server: Server, host='localhost', port=25565):
+    def start_process(server: Server, host='localhost', port=25565, shards=1, factory_type=None, **factory_options):
         """
-        Start the Network process
+        Start the Network processes, factory_options are given to the ServerFactory.\n
+        factory_type is the ServerFactory class of the network backend, see classes.network.AsyncioNetwork.BACKENDS.\n
+        With more than one shard, every process listens on the same port with SO_REUSEPORT
         """
         NetworkController.actions = ServerAction(server)
-        NetworkController.networking_process = multiprocessing.Process(target=NetworkController.networker, args=(NetworkController.OUT_QUEUE, NetworkController.IN_QUEUE, host, port), name='NETWORK_PROCESS')
-        NetworkController.networking_process.start()
+        NetworkController._action_handlers = [getattr(NetworkController.actions, action.id, None)
+                                              for action in ServerActionType]
+        NetworkController.OUT_RINGS = [RingBuffer(RING_SIZE) for _ in range(shards)]
+        NetworkController.networking_processes = []
+        for shard in range(shards):
+            options = dict(factory_options, shard=shard, reuse_port=shards > 1)
+            process = multiprocessing.Process(target=NetworkController.networker, args=(NetworkController.OUT_RINGS, shard, NetworkController.IN_QUEUE, host, port, factory_type or ServerFactory, options), name='NETWORK_PROCESS_%d' % (shard,))
+            NetworkController.networking_processes.append(process)
+            process.start()
 
     @staticmethod
     def stop_process():
         """
-        Stop the Network process
+        Stop the Network processes
         """
-        if NetworkController.networking_process:
-            NetworkController.networking_process.terminate()
+        NetworkController._write(pack_frame(Opcode.STOP), control=True)
+        for process in NetworkController.networking_processes:
+            # Killing a process while it writes to IN_QUEUE would leave the queue locked
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        NetworkController.networking_processes = []
+        for ring in NetworkController.OUT_RINGS:
+            ring.close()
+        NetworkController.OUT_RINGS = []
 
     @staticmethod
-    def networker(OUT_QUEUE, IN_QUEUE, host, port):
+    def networker(OUT_RINGS, shard, IN_QUEUE, host, port, factory_type, factory_options):
         """
         Here, we should be in another process.
-        This process is used by the network.
+        This process is used by the network, it reads the frames of its shard
         """
         NetworkController.IN_QUEUE = IN_QUEUE
-        NetworkController.OUT_QUEUE = OUT_QUEUE
-        server_factory = ServerFactory(host, port)
+        NetworkController.OUT_RINGS = OUT_RINGS
+        out_ring = OUT_RINGS[shard]
+        server_factory = factory_type(host, port, **factory_options)
         server_factory.pre_start_server()
 
         # Let's start another thread that will start the server :D
         server_thread = threading.Thread(target=server_factory.start_server, name='NETWORK_THREAD')
         server_thread.start()
-        # Enter in a loop and read outgoing network packet
+        # Enter in a loop and read outgoing frames
         while True:
             try:
-                item = NetworkController.OUT_QUEUE.get()
+                for frame in out_ring.read():
+                    try:
+                        if not NetworkController._execute(server_factory, frame):
+                            server_factory.stop_server()
+                            server_thread.join()
+                            return
+                    except Exception:
+                        # TODO Catch this exception
+                        logging.exception('Cannot execute frame')
+                out_ring.wait(0.05)
             except KeyboardInterrupt:
                 break
-            if item is None:
-                break
-            NetworkController._execute(server_factory, item)
 
     @staticmethod
-    def _execute(server_factory: ServerFactory, item):
-        if type(item) is not dict:
-            return
-        if 'action' not in item:
-            return
-        action = item['action']
-        option = item['option'] if 'option' in item else {}
-        if action == 'call_method':
-            NetworkController._execute_call_method(server_factory, option)
+    def _execute(server_factory: ServerFactory, frame) -> bool:
+        """
+        Executes a frame, returns False if the network process should stop
+        """
+        opcode, packet_type, protocol, targets, body = unpack_frame(frame)
+        if opcode == Opcode.BROADCAST:
+            server_factory.send_packet(protocol, packet_type, body)
+        elif opcode == Opcode.SEND_PACKET:
+            server_factory.send_packet(protocol, packet_type, body, targets)
+        elif opcode == Opcode.INIT_PLAYER:
+            server_factory.player_joined_server(UUID(bytes=body), targets[0])
+        elif opcode == Opcode.DESTROY_PLAYER:
+            server_factory.player_left_server(UUID(bytes=body) if body else None, targets[0] if targets else -1)
+        elif opcode == Opcode.STOP:
+            return False
+        return True
 
     @staticmethod
-    def _execute_call_method(server_factory: ServerFactory, option):
-        # We want to call specific method
-        method_name = option['name'] if 'name' in option else None
-        # Check if method exists
-        if method_name and hasattr(server_factory, method_name) and callable(getattr(server_factory, method_name)):
-            # The method exists
-            args = option['args'] if 'args' in option else {}
-            # Call method
-            method = getattr(server_factory, method_name)
-            try:
-                method(**args)
-            except:
-                # TODO Catch this exception
-                pass
+    def _write(frame: [bytes], shard=None, control=False) -> bool:
+        """
+        Write a frame to the ring of a network process, or of every one if shard is None.
+        Returns False if a ring is full: packets are dropped so the caller can send them again later, control frames
+        wait up to CONTROL_TIMEOUT seconds for the network process to read
+        """
+        rings = NetworkController.OUT_RINGS if shard is None else NetworkController.OUT_RINGS[shard:shard + 1]
+        written = True
+        for ring in rings:
+            if not ring.write(frame, CONTROL_TIMEOUT if control else 0.0):
+                if control:
+                    logging.error('Network ring buffer is still full after %d s, dropping control frame',
+                                  CONTROL_TIMEOUT)
+                else:
+                    logging.debug('Network ring buffer is full, dropping frame')
+                written = False
+        return written
+
+    @staticmethod
+    def _shards_of(entity_ids) -> {int: [int]}:
+        """
+        Group entity ids by network process, players of unknown processes are grouped under None
+        """
+        shards = {}
+        for entity_id in entity_ids:
+            shards.setdefault(NetworkController._entity_shards.get(entity_id), []).append(entity_id)
+        return shards
+
+    @staticmethod
+    def _encode(packet_type: PacketType, data: dict):
+        """
+        Yields the protocol versions & the packet encoded for each of them
+        """
+        index = packet_type.index
+        for protocol, encoders, buff_type in get_encoders():
+            encoder = encoders[index]
+            if encoder:
+                yield protocol, b''.join(encoder(buff_type, **data))
 
     @staticmethod
     def tick(current_tick):
@@ -330,7 +607,10 @@ class NetworkController:
                 break
             action = item['action']
             data = item['data']
-            method = getattr(NetworkController.actions, action.id, None)
+            if action is ServerActionType.PLAYER_JOIN:
+                # Remember which network process the player is connected to
+                NetworkController._uuid_shards[str(data['uuid'])] = data.pop('shard', 0)
+            method = NetworkController._action_handlers[action.index]
             if method:
                 # Execute the action
                 method(**data)
@@ -338,57 +618,50 @@ class NetworkController:
                 logging.warn('Got an unknown action: %s', action.id)
 
     @staticmethod
-    def send_packet(packet_type: PacketType, **data):
-        NetworkController.OUT_QUEUE.put_nowait({
-            'action': 'call_method',
-            'option': {
-                'name': 'send_packet',
-                'args': {
-                    'packet_type': packet_type,
-                    'data': data,
-                },
-            },
-        })
+    def send_packet(packet_type: PacketType, **data) -> bool:
+        """
+        Send a packet to every player, returns False if a network process didn't get it (its ring buffer is full)
+        """
+        written = True
+        for protocol, body in NetworkController._encode(packet_type, data):
+            written &= NetworkController._write(pack_frame(Opcode.BROADCAST, packet_type, protocol, (), body))
+        return written
 
     @staticmethod
-    def send_packet_player(entity_id, packet_type: PacketType, data: dict):
-        NetworkController.OUT_QUEUE.put_nowait({
-            'action': 'call_method',
-            'option': {
-                'name': 'send_packet_player',
-                'args': {
-                    'entity_id': entity_id,
-                    'packet_type': packet_type,
-                    'data': data,
-                },
-            },
-        })
+    def send_packet_player(entity_id, packet_type: PacketType, data: dict) -> bool:
+        return NetworkController.send_packet_players((entity_id,), packet_type, data)
+
+    @staticmethod
+    def send_packet_players(entity_ids, packet_type: PacketType, data: dict) -> bool:
+        """
+        Send the same packet to many players, it is encoded once per protocol version.
+        Returns False if a network process didn't get it (its ring buffer is full), the caller may send it again later
+        """
+        if not entity_ids:
+            return True
+        shards = NetworkController._shards_of(entity_ids)
+        written = True
+        for protocol, body in NetworkController._encode(packet_type, data):
+            for shard, targets in shards.items():
+                written &= NetworkController._write(
+                    pack_frame(Opcode.SEND_PACKET, packet_type, protocol, targets, body), shard)
+        return written
 
     @staticmethod
     def init_player(uuid, entity_id):
-        NetworkController.OUT_QUEUE.put_nowait({
-            'action': 'call_method',
-            'option': {
-                'name': 'player_joined_server',
-                'args': {
-                    'uuid': uuid,
-                    'entity_id': entity_id,
-                },
-            },
-        })
+        shard = NetworkController._uuid_shards.pop(str(uuid), None)
+        if shard is not None:
+            NetworkController._entity_shards[entity_id] = shard
+        NetworkController._write(pack_frame(Opcode.INIT_PLAYER, targets=(entity_id,), body=uuid.bytes), shard,
+                                 control=True)
 
     @staticmethod
     def destroy_player(uuid=None, entity_id=-1):
-        NetworkController.OUT_QUEUE.put_nowait({
-            'action': 'call_method',
-            'option': {
-                'name': 'player_left_server',
-                'args': {
-                    'uuid': uuid,
-                    'entity_id': entity_id,
-                },
-            },
-        })
+        shard = NetworkController._entity_shards.pop(entity_id, None)
+        if shard is None and uuid:
+            shard = NetworkController._uuid_shards.pop(str(uuid), None)
+        NetworkController._write(pack_frame(Opcode.DESTROY_PLAYER, targets=(entity_id,) if entity_id != -1 else (),
+                                            body=uuid.bytes if uuid else b''), shard, control=True)
 
     @staticmethod
     def execute_server(action: ServerActionType, **data):
@@ -0,0 +1,48 @@
+# coding=utf-8
+""" Dispatch tables: the packet ids, names, encoders & decoders of a protocol version, resolved once & indexed by
+integer (packet id or PacketType.index) instead of quarry's tuple keyed dicts & getattr on every packet """
+from quarry.data import packets
+
+from .PacketType import BasicNetwork, BasicNetworkInput, PacketType, PacketTypeInput
+
+MODES = ('init', 'status', 'login', 'play')
+
+
+class DispatchTable:
+    """
+    names[mode][ident] is the name of a packet received in a protocol mode (None for unknown ids) &
+    idents[mode][name] the id of a packet sent in that mode.\n
+    packet_idents[packet_type.index] & encoders[packet_type.index] are the play id & encoder of a PacketType,
+    decoders[ident] is the (decoder, PacketTypeInput) of a play packet received, None when the version doesn't have them
+    """
+
+    def __init__(self, protocol_version: int, encoder: BasicNetwork = None, decoder: BasicNetworkInput = None,
+                 recv_direction: str = 'upstream', send_direction: str = 'downstream'):
+        self.protocol_version = protocol_version
+        self.names = {mode: [] for mode in MODES}
+        self.idents = {mode: {} for mode in MODES}
+        for (version, mode, direction, ident), name in packets.packet_names.items():
+            if version != protocol_version:
+                continue
+            if direction == recv_direction:
+                names = self.names.setdefault(mode, [])
+                names.extend([None] * (ident + 1 - len(names)))
+                names[ident] = name
+            elif direction == send_direction:
+                self.idents.setdefault(mode, {})[name] = ident
+
+        play_idents = self.idents['play']
+        self.packet_idents = [play_idents.get(packet_type.id) for packet_type in PacketType]
+        self.encoders = [None] * len(PacketType)
+        if encoder is not None:
+            for packet_type in PacketType:
+                if packet_type.id in play_idents:
+                    self.encoders[packet_type.index] = getattr(encoder, packet_type.id, None)
+
+        play_names = self.names['play']
+        self.decoders = [None] * len(play_names)
+        if decoder is not None:
+            for packet_type in PacketTypeInput:
+                method = getattr(decoder, packet_type.id, None)
+                if method is not None and packet_type.id in play_names:
+                    self.decoders[play_names.index(packet_type.id)] = (method, packet_type)
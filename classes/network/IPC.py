@@ -0,0 +1,166 @@
+# coding=utf-8
+""" Messages from the tick process to the network process, as binary frames written in a shared memory ring buffer.
+
+A frame is a header (opcode, packet type, protocol version, target count & body length), the target entity ids,
+then the body: an encoded packet for SEND_PACKET & BROADCAST, a player uuid for INIT_PLAYER & DESTROY_PLAYER """
+import enum
+import multiprocessing
+import os
+import struct
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+from .PacketType import PacketType
+
+# Opcode, packet type, protocol version, target count, body length
+FRAME_HEADER = struct.Struct('<BBHHI')
+_LENGTH = struct.Struct('<I')
+_POSITION = struct.Struct('<Q')
+# Head, tail & waiting flag live in separate cache lines so both processes don't write to the same line
+_HEAD = 0
+_TAIL = 64
+_WAITING = 128
+_RING_HEADER_SIZE = 192
+# Seconds between two attempts of a writer waiting for space in a full ring
+WRITE_RETRY_INTERVAL = 0.001
+
+PACKET_TYPES = list(PacketType)
+
+
+class Opcode(enum.IntEnum):
+    SEND_PACKET = 1  # To the target entity ids
+    BROADCAST = 2  # To every player using the frame's protocol version
+    INIT_PLAYER = 3
+    DESTROY_PLAYER = 4
+    STOP = 5
+
+
+def pack_frame(opcode: Opcode, packet_type: [PacketType, None] = None, protocol: int = 0, targets=(),
+               body: bytes = b'') -> [bytes]:
+    """ Returns a frame as a list of byte strings, so large bodies are never copied into a new one """
+    head = FRAME_HEADER.pack(opcode, 0 if packet_type is None else packet_type.index, protocol,
+                             len(targets), len(body))
+    if targets:
+        head += struct.pack('<%di' % len(targets), *targets)
+    return [head, body]
+
+
+def unpack_frame(frame) -> (Opcode, [PacketType, None], int, (int,), bytes):
+    """ Returns the opcode, packet type, protocol version, target entity ids & body of a frame """
+    opcode, packet_index, protocol, target_count, body_length = FRAME_HEADER.unpack_from(frame)
+    targets = struct.unpack_from('<%di' % target_count, frame, FRAME_HEADER.size)
+    start = FRAME_HEADER.size + 4 * target_count
+    packet_type = PACKET_TYPES[packet_index] if opcode in (Opcode.SEND_PACKET, Opcode.BROADCAST) else None
+    return Opcode(opcode), packet_type, protocol, targets, bytes(frame[start:start + body_length])
+
+
+class RingBuffer:
+    """
+    A ring of capacity bytes in shared memory, holding length prefixed frames.\n
+    Any thread of any process may write (writers share a lock), only one thread of one process may read.
+    The reader publishes how far it has read & sleeps on an Event when the ring is empty,
+    writers only set the Event when the reader said it is waiting.\n
+    The ring is handed to other processes as a Process argument, which attaches them to the same shared memory
+    """
+
+    def __init__(self, capacity: int = 1 << 22):
+        if capacity & (capacity - 1):
+            raise ValueError("Ring buffer capacity must be a power of two, got {0}".format(capacity))
+        self.capacity = capacity
+        self._memory = SharedMemory(create=True, size=_RING_HEADER_SIZE + capacity)
+        self._memory.buf[:_RING_HEADER_SIZE] = bytes(_RING_HEADER_SIZE)
+        self._write_lock = multiprocessing.Lock()
+        self._event = multiprocessing.Event()
+        # Forked processes inherit the ring as is, only the creator frees the shared memory
+        self._owner_pid = os.getpid()
+        self.dropped = 0
+
+    def __getstate__(self):
+        return self._memory.name, self.capacity, self._write_lock, self._event, self._owner_pid
+
+    def __setstate__(self, state):
+        name, self.capacity, self._write_lock, self._event, self._owner_pid = state
+        self._memory = SharedMemory(name=name)
+        self.dropped = 0
+
+    def _get(self, offset: int) -> int:
+        return _POSITION.unpack_from(self._memory.buf, offset)[0]
+
+    def _set(self, offset: int, value: int):
+        _POSITION.pack_into(self._memory.buf, offset, value)
+
+    def _copy_in(self, position: int, data: bytes):
+        start = position & (self.capacity - 1)
+        first = min(len(data), self.capacity - start)
+        buf = self._memory.buf
+        buf[_RING_HEADER_SIZE + start:_RING_HEADER_SIZE + start + first] = data[:first]
+        if first < len(data):
+            buf[_RING_HEADER_SIZE:_RING_HEADER_SIZE + len(data) - first] = data[first:]
+
+    def _copy_out(self, position: int, length: int) -> bytes:
+        start = position & (self.capacity - 1)
+        first = min(length, self.capacity - start)
+        buf = self._memory.buf
+        data = bytes(buf[_RING_HEADER_SIZE + start:_RING_HEADER_SIZE + start + first])
+        if first < length:
+            data += bytes(buf[_RING_HEADER_SIZE:_RING_HEADER_SIZE + length - first])
+        return data
+
+    def write(self, parts: [bytes], timeout: float = 0.0) -> bool:
+        """ Writes the concatenation of parts as one frame. If the ring is full, waits up to timeout seconds for the
+        reader to free enough space, then returns False (& drops it) """
+        length = sum(len(part) for part in parts)
+        deadline = time.monotonic() + timeout
+        while not self._write(parts, length):
+            if _LENGTH.size + length > self.capacity or time.monotonic() >= deadline:
+                self.dropped += 1
+                return False
+            time.sleep(WRITE_RETRY_INTERVAL)
+        if self._memory.buf[_WAITING]:
+            self._event.set()
+        return True
+
+    def _write(self, parts: [bytes], length: int) -> bool:
+        with self._write_lock:
+            head = self._get(_HEAD)
+            if _LENGTH.size + length > self.capacity - (head - self._get(_TAIL)):
+                return False
+            self._copy_in(head, _LENGTH.pack(length))
+            position = head + _LENGTH.size
+            for part in parts:
+                self._copy_in(position, part)
+                position += len(part)
+            # Publish the frame once it is fully written
+            self._set(_HEAD, position)
+        return True
+
+    def read(self) -> [bytes]:
+        """ Returns every frame written so far & frees their space """
+        frames = []
+        tail = self._get(_TAIL)
+        head = self._get(_HEAD)
+        while tail < head:
+            (length,) = _LENGTH.unpack(self._copy_out(tail, _LENGTH.size))
+            frames.append(self._copy_out(tail + _LENGTH.size, length))
+            tail += _LENGTH.size + length
+        self._set(_TAIL, tail)
+        return frames
+
+    def wait(self, timeout: float):
+        """ Blocks until a frame is written or timeout seconds have passed """
+        self._memory.buf[_WAITING] = 1
+        # A writer may have published a frame before it could see the flag
+        if self._get(_HEAD) == self._get(_TAIL):
+            self._event.wait(timeout)
+            self._event.clear()
+        self._memory.buf[_WAITING] = 0
+
+    def pending(self) -> int:
+        """ Number of bytes written & not read yet """
+        return self._get(_HEAD) - self._get(_TAIL)
+
+    def close(self):
+        """ Detaches from the shared memory, which is freed once the process that created the ring closes it """
+        self._memory.close()
+        if os.getpid() == self._owner_pid:
+            self._memory.unlink()
@@ -2,6 +2,8 @@ import enum
 
 import classes.Server as Server
 
+from ..utils.Vector import Vector3D
+
 
 class ServerActionType(enum.Enum):
     """
@@ -15,6 +17,13 @@ class ServerActionType(enum.Enum):
     PLAYER_JOIN = ('player_join', ['uuid', 'display_name', 'version'])
     PLAYER_LEFT = ('player_left', ['uuid'])
     CLIENT_SETTINGS = ('client_settings', ['uuid', 'entity_id', 'locale', 'view_distance', 'chat_mode', 'chat_color', 'skin_parts', 'main_hand'])
+    PLAYER_MOVE = ('player_move', ['uuid', 'x', 'y', 'z', 'yaw', 'pitch', 'on_ground'])
+    CONNECTION_WRITABLE = ('connection_writable', ['uuid', 'writable'])
+
+
+# Position of each action, NetworkController's table of action handlers is indexed by it
+for _index, _action in enumerate(ServerActionType):
+    _action.index = _index
 
 
 class ServerAction:
@@ -34,3 +43,15 @@ class ServerAction:
         player = self.server.player_manager.get_player(uuid)
         if player:
             player.set_client_settings(locale, view_distance, chat_mode, chat_color, skin_parts, main_hand)
+
+    def player_move(self, uuid, x, y, z, on_ground, yaw=None, pitch=None):
+        # Players may still move while they are leaving
+        player = self.server.player_manager.players.get(str(uuid))
+        if player:
+            player.move(Vector3D(x, y, z), x_rot=pitch, y_rot=yaw)
+
+    def connection_writable(self, uuid, writable):
+        # Chunks wait while the connection of the player is above its high watermark
+        player = self.server.player_manager.players.get(str(uuid))
+        if player and player.chunk_streamer:
+            player.chunk_streamer.writable = writable
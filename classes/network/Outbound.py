@@ -0,0 +1,108 @@
+# coding=utf-8
+""" Frames waiting to be written to a player connection """
+import threading
+from collections import deque
+from concurrent.futures import CancelledError, Future
+
+DEFAULT_HIGH_WATERMARK = 1 << 21
+DEFAULT_LOW_WATERMARK = 1 << 19
+
+
+class OutboundBuffer:
+    """
+    Frames queued for a connection & written in a single call per flush.\n
+    Frames are always accepted, but once more than high_watermark bytes are waiting the buffer stops being writable
+    until it drains below low_watermark, so producers of optional traffic (such as chunks) can hold back:
+    on_writable (if any) is called with the new state on each change, from the thread that caused it.
+    Flushing stops while the transport is paused.
+    Frames still being compressed are queued as Futures, flushing stops at the first one that isn't done. A frame
+    that failed can't be skipped (the client would read the next packets out of order): the frames before it are
+    written, the others are dropped & on_error (if any) is called with the exception, so the connection is closed.\n
+    Frames may be added from any thread of the network process, flush must be called from the reactor thread
+    """
+
+    def __init__(self, high_watermark: int = DEFAULT_HIGH_WATERMARK, low_watermark: int = DEFAULT_LOW_WATERMARK,
+                 max_write: [int, None] = None, on_writable=None, on_error=None):
+        if low_watermark > high_watermark:
+            raise ValueError("Low watermark {0} is above high watermark {1}".format(low_watermark, high_watermark))
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        # Most bytes written per flush (at least one frame is), None for no limit
+        self.max_write = max_write
+        self.on_writable = on_writable
+        self.on_error = on_error
+        # Set once a frame failed, nothing is sent anymore
+        self.failed = False
+        self._frames = deque()  # (frame or Future of the frame, size)
+        self._lock = threading.Lock()
+        self.size = 0
+        self.writable = True
+        self.paused = False
+        self.writes = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    def append(self, frame: [bytes, Future], size: [int, None] = None):
+        """ Queues a frame. size is required for Futures, as an estimate of the size of their frame """
+        if size is None:
+            size = len(frame)
+        with self._lock:
+            if self.failed:
+                return
+            self._frames.append((frame, size))
+            self.size += size
+            changed = self.writable and self.size > self.high_watermark
+            if changed:
+                self.writable = False
+        if changed and self.on_writable:
+            self.on_writable(False)
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def flush(self, write) -> int:
+        """ Calls write once with every waiting frame (up to max_write bytes) joined together, unless the buffer is
+        paused or empty. Returns the number of bytes written """
+        if self.paused or not self._frames:
+            return 0
+        chunk = []
+        error = None
+        with self._lock:
+            frames = self._frames
+            written = 0
+            while frames:
+                frame, size = frames[0]
+                if isinstance(frame, Future):
+                    if not frame.done():
+                        break
+                    if frame.cancelled() or frame.exception() is not None:
+                        error = CancelledError() if frame.cancelled() else frame.exception()
+                        self.failed = self.paused = True
+                        frames.clear()
+                        self.size = 0
+                        break
+                    frame = frame.result()
+                if chunk and self.max_write is not None and written + len(frame) > self.max_write:
+                    break
+                frames.popleft()
+                self.size -= size
+                chunk.append(frame)
+                written += len(frame)
+            changed = not self.writable and self.size < self.low_watermark
+            if changed:
+                self.writable = True
+        if changed and self.on_writable:
+            self.on_writable(True)
+        length = 0
+        if chunk:
+            data = chunk[0] if len(chunk) == 1 else b''.join(chunk)
+            write(data)
+            self.writes += 1
+            length = len(data)
+        if error is not None and self.on_error:
+            self.on_error(error)
+        return length
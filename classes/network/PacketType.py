@@ -20,6 +20,9 @@ class PacketType(enum.Enum):
     KEEP_ALIVE = ('keep_alive', [])
     TIME_UPDATE = ('time_update', ['game_time', 'day_time'])
     CHAT_MESSAGE = ('chat_message', ['message'])
+    CHUNK_DATA = ('chunk_data', ['chunk'])
+    UNLOAD_CHUNK = ('unload_chunk', ['chunk_x', 'chunk_z'])
+    UPDATE_VIEW_POSITION = ('update_view_position', ['chunk_x', 'chunk_z'])
 
 
 class PacketTypeInput(enum.Enum):
@@ -33,6 +36,14 @@ class PacketTypeInput(enum.Enum):
         self.fields = fields
 
     CLIENT_SETTINGS = ('client_settings', ServerActionType.CLIENT_SETTINGS, ['locale', 'view_distance', 'chat_mode', 'chat_color', 'skin_parts', 'main_hand'])
+    PLAYER_POSITION = ('player_position', ServerActionType.PLAYER_MOVE, ['x', 'y', 'z', 'on_ground'])
+    PLAYER_POSITION_AND_LOOK = ('player_position_and_look', ServerActionType.PLAYER_MOVE, ['x', 'y', 'z', 'yaw', 'pitch', 'on_ground'])
+
+
+# Position of each packet type in its enum, dispatch tables & IPC frames are indexed by it
+for _packet_types in (PacketType, PacketTypeInput):
+    for _index, _packet_type in enumerate(_packet_types):
+        _packet_type.index = _index
 
 
 class BasicNetwork:
@@ -72,6 +83,18 @@ class BasicNetwork:
     def chat_message(buff_type, message=None):
         raise NotImplementedError()
 
+    @staticmethod
+    def chunk_data(buff_type, chunk=None):
+        raise NotImplementedError()
+
+    @staticmethod
+    def unload_chunk(buff_type, chunk_x=0, chunk_z=0):
+        raise NotImplementedError()
+
+    @staticmethod
+    def update_view_position(buff_type, chunk_x=0, chunk_z=0):
+        raise NotImplementedError()
+
 
 class BasicNetworkInput:
     """
@@ -81,3 +104,11 @@ class BasicNetworkInput:
     @staticmethod
     def client_settings(buff_type):
         raise NotImplementedError()
+
+    @staticmethod
+    def player_position(buff_type):
+        raise NotImplementedError()
+
+    @staticmethod
+    def player_position_and_look(buff_type):
+        raise NotImplementedError()
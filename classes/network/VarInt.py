@@ -0,0 +1,212 @@
+# coding=utf-8
+""" VarInt & VarLong codecs, with the same results & errors as quarry's Buffer.pack_varint & unpack_varint.
+
+Single values below 2^14 (packet ids, most lengths & entity ids) are encoded from a table, batches of values (palettes,
+entity id lists) are encoded & decoded with numpy in one pass. Batches reject varints longer than the protocol allows
+(5 bytes, 10 for varlongs) where quarry reads up to 10 bytes """
+import numpy as np
+from quarry.types.buffer import BufferUnderrun
+
+VARINT_BITS = 32
+VARLONG_BITS = 64
+# Values below this are encoded from _TABLE
+TABLE_SIZE = 1 << 14
+# Batches shorter than this are cheaper to encode or decode one value at a time than with numpy
+BATCH_MIN = 64
+
+
+def _encode(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+_TABLE = [_encode(value) for value in range(TABLE_SIZE)]
+
+
+def _check(value: int, max_bits: int):
+    if not -1 << (max_bits - 1) <= value < 1 << (max_bits - 1):
+        raise ValueError("varint does not fit in range: {0:d} <= {1:d} < {2:d}".format(
+            -1 << (max_bits - 1), value, 1 << (max_bits - 1)))
+
+
+def pack_varint(value: int, max_bits: int = VARINT_BITS) -> bytes:
+    """ Returns the varint of value, which must fit in max_bits signed bits """
+    if 0 <= value < TABLE_SIZE:
+        return _TABLE[value]
+    _check(value, max_bits)
+    if value < 0:
+        value += 1 << VARINT_BITS
+    return _encode(value)
+
+
+def pack_varlong(value: int) -> bytes:
+    """ Returns the varlong of value """
+    if 0 <= value < TABLE_SIZE:
+        return _TABLE[value]
+    _check(value, VARLONG_BITS)
+    if value < 0:
+        value += 1 << VARLONG_BITS
+    return _encode(value)
+
+
+def varint_size(value: int) -> int:
+    """ Number of bytes of the varint of value """
+    _check(value, VARINT_BITS)
+    if value < 0:
+        return 5
+    if value < 0x80:
+        return 1
+    if value < 0x4000:
+        return 2
+    if value < 0x200000:
+        return 3
+    if value < 0x10000000:
+        return 4
+    return 5
+
+
+def write_varint(buf: bytearray, position: int, value: int) -> int:
+    """ Writes the varint of value at position, returns the position after it """
+    if value < 0:
+        value += 1 << VARINT_BITS
+    while value > 0x7f:
+        buf[position] = value & 0x7f | 0x80
+        value >>= 7
+        position += 1
+    buf[position] = value
+    return position + 1
+
+
+def unpack_varint(data, position: int = 0, max_bits: int = VARINT_BITS) -> (int, int):
+    """ Decodes the varint at position of data, returns its value & the position after it """
+    byte = data[position] if position < len(data) else _underrun()
+    if byte < 0x80:
+        return byte, position + 1
+    number = byte & 0x7f
+    for shift in range(7, 70, 7):
+        position += 1
+        byte = data[position] if position < len(data) else _underrun()
+        number |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            break
+    if number & (1 << 31):
+        number -= 1 << 32
+    _check(number, max_bits)
+    return number, position + 1
+
+
+def unpack_varlong(data, position: int = 0) -> (int, int):
+    """ Decodes the varlong at position of data, returns its value & the position after it """
+    number = 0
+    for shift in range(0, 70, 7):
+        byte = data[position] if position < len(data) else _underrun()
+        position += 1
+        number |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            break
+    number &= (1 << VARLONG_BITS) - 1
+    if number & (1 << 63):
+        number -= 1 << VARLONG_BITS
+    return number, position
+
+
+def _underrun():
+    raise BufferUnderrun()
+
+
+def read_varint(buff, max_bits: int = VARINT_BITS) -> int:
+    """ Reads a varint from a quarry Buffer, like buff.unpack_varint() """
+    value, buff.pos = unpack_varint(buff.buff, buff.pos, max_bits)
+    return value
+
+
+# Batches ---------------------------------------------------------------------
+def _pack_many(values, bits: int) -> bytes:
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) == 0:
+        return b''
+    if values.min() < -1 << (bits - 1) or (bits < 64 and values.max() >= 1 << (bits - 1)):
+        raise ValueError("varint does not fit in range of {0} bits".format(bits))
+    groups = (bits + 6) // 7
+    unsigned = values.astype(np.uint64)
+    if bits < 64:
+        unsigned &= np.uint64((1 << bits) - 1)
+    septets = ((unsigned[:, None] >> (np.arange(groups, dtype=np.uint64) * np.uint64(7))) & np.uint64(0x7f)) \
+        .astype(np.uint8)
+    nonzero = septets != 0
+    lengths = np.where(nonzero.any(axis=1), groups - np.argmax(nonzero[:, ::-1], axis=1), 1)
+    columns = np.arange(groups)
+    septets[columns < (lengths - 1)[:, None]] |= 0x80
+    return septets[columns < lengths[:, None]].tobytes()
+
+
+def _unpack_many(data, count: int, position: int, bits: int) -> (np.ndarray, int):
+    if count == 0:
+        return np.empty(0, dtype=np.int64), position
+    groups = (bits + 6) // 7
+    raw = np.frombuffer(data, dtype=np.uint8, count=min(len(data) - position, count * groups), offset=position)
+    ends = np.flatnonzero(raw < 0x80)[:count]
+    if len(ends) < count:
+        if len(raw) < count * groups:
+            raise BufferUnderrun()
+        raise ValueError("varint is longer than {0} bytes".format(groups))
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    if lengths.max() > groups:
+        raise ValueError("varint is longer than {0} bytes".format(groups))
+    used = raw[:ends[-1] + 1].astype(np.uint64) & np.uint64(0x7f)
+    shifts = (np.arange(len(used)) - np.repeat(starts, lengths)).astype(np.uint64) * np.uint64(7)
+    values = np.add.reduceat(used << shifts, starts)
+    if bits < 64:
+        if values.max() >> np.uint64(bits):
+            raise ValueError("varint does not fit in range of {0} bits".format(bits))
+        values = values.astype(np.int64)
+        values[values >= 1 << (bits - 1)] -= 1 << bits
+    else:
+        values = values.view(np.int64)
+    return values, position + int(ends[-1]) + 1
+
+
+def _unpack_each(unpack, data, count: int, position: int, bits: int) -> (np.ndarray, int):
+    groups = (bits + 6) // 7
+    values = np.empty(count, dtype=np.int64)
+    for index in range(count):
+        values[index], end = unpack(data, position)
+        if end - position > groups:
+            raise ValueError("varint is longer than {0} bytes".format(groups))
+        position = end
+    return values, position
+
+
+def pack_varints(values) -> bytes:
+    """ Returns the varints of a sequence or array of values, concatenated """
+    if len(values) < BATCH_MIN:
+        return b''.join([pack_varint(int(value)) for value in values])
+    return _pack_many(values, VARINT_BITS)
+
+
+def pack_varlongs(values) -> bytes:
+    """ Returns the varlongs of a sequence or array of values, concatenated """
+    if len(values) < BATCH_MIN:
+        return b''.join([pack_varlong(int(value)) for value in values])
+    return _pack_many(values, VARLONG_BITS)
+
+
+def unpack_varints(data, count: int, position: int = 0) -> (np.ndarray, int):
+    """ Decodes count varints from position of data, returns them as an int64 array & the position after them """
+    if count < BATCH_MIN:
+        return _unpack_each(unpack_varint, data, count, position, VARINT_BITS)
+    return _unpack_many(data, count, position, VARINT_BITS)
+
+
+def unpack_varlongs(data, count: int, position: int = 0) -> (np.ndarray, int):
+    """ Decodes count varlongs from position of data, returns them as an int64 array & the position after them """
+    if count < BATCH_MIN:
+        return _unpack_each(unpack_varlong, data, count, position, VARLONG_BITS)
+    return _unpack_many(data, count, position, VARLONG_BITS)
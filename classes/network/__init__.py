@@ -3,7 +3,15 @@
 from . import versions
 
 # Files
+from . import Audience
+from . import Codec
+from . import Compression
+from . import Dispatch
+from . import IPC
 from . import IncomingPacketAction
+from . import Outbound
 from . import PacketType
+from . import VarInt
 
 from . import Connection
+from . import AsyncioNetwork
@@ -1,78 +1,139 @@
+import struct
+
+import numpy as np
+
+from ...BasicClasses import Chunk, ChunkSection, Heightmap
+from ...Exceptions import ChunkError
+from ...blocks.Materials import Material
+from ..Codec import compile_protocol
 from ..PacketType import BasicNetwork, BasicNetworkInput
+from ..VarInt import pack_varint, pack_varints
 
+# Default block state ids of the Materials, from the 1.15.2 block report
+BLOCK_STATES = {
+    Material.AIR: 0,
+    Material.BEDROCK: 33,
+    Material.BIRCH_LEAVES: 185,
+    Material.BIRCH_LOG: 79,
+    Material.BIRCH_PLANKS: 17,
+    Material.CAVE_AIR: 9130,
+    Material.COAL_ORE: 71,
+    Material.DIAMOND_ORE: 3354,
+    Material.DIRT: 10,
+    Material.EMERALD_ORE: 5410,
+    Material.GOLD_ORE: 69,
+    Material.GRASS: 1341,
+    Material.GRASS_BLOCK: 9,
+    Material.IRON_ORE: 70,
+    Material.LAPIS_ORE: 231,
+    Material.OAK_LEAVES: 157,
+    Material.OAK_LOG: 73,
+    Material.OAK_PLANKS: 15,
+    Material.REDSTONE_ORE: 3886,
+    Material.SPRUCE_LEAVES: 171,
+    Material.SPRUCE_LOG: 76,
+    Material.SPRUCE_PLANKS: 16,
+    Material.STONE: 1,
+    Material.VOID_AIR: 9129,
+}
+# Bits per block of the global palette, used by sections whose palette needs more than 8 bits
+GLOBAL_PALETTE_BITS = 14
+SECTIONS = 16
+PLAINS_BIOMES = struct.pack('>1024i', *([1] * 1024))
+_TAG_COMPOUND = 10
+_TAG_LONG_ARRAY = 12
+_HEIGHTMAP_BITS = 9
 
-class v1_15_2(BasicNetwork):
 
-    @staticmethod
-    def join_game(buff_type, entity_id=0, gamemode=0, dimension=0, hashed_seed=0, max_player=1, level_type='flat', view_distance=8, reduced_debug_info=True, show_respawn_screen=True):
-        return [
-            buff_type.pack("iBiqB", entity_id, gamemode, dimension, hashed_seed, max_player),
-            buff_type.pack_string(level_type),
-            buff_type.pack_varint(view_distance),
-            buff_type.pack('??', reduced_debug_info, show_respawn_screen)
-        ]
+def _pack_longs(values: np.ndarray, bits: int) -> bytes:
+    """Packs values in bits wide entries, as big endian longs.
+    Entries are laid from the lowest bit of the first long & may span two longs, as 1.15 clients expect"""
+    values = np.ascontiguousarray(values, dtype='<u2').view(np.uint8).reshape(-1, 2)
+    stream = np.unpackbits(values, axis=1, bitorder='little')[:, :bits]
+    longs = np.packbits(stream.ravel(), bitorder='little')
+    longs = np.pad(longs, (0, -len(longs) % 8)).view('<u8')
+    return longs.astype('>u8').tobytes()
 
-    @staticmethod
-    def plugin_message(buff_type, channel=None, data=None):
-        return [
-            buff_type.pack_string(channel),
-            buff_type.pack_string(data)
-        ]
 
-    @staticmethod
-    def server_difficulty(buff_type, difficulty=0, difficulty_locked=True):
-        return [
-            buff_type.pack('B?', difficulty, difficulty_locked)
-        ]
+def encode_section(buff_type, section: ChunkSection) -> bytes:
+    """Serializes a 16x16x16 section for the chunk data packet. The bytes are cached in the section until it
+    changes"""
+    data = section.encoded.get(v1_15_2)
+    if data is not None:
+        return data
+    indices = np.frombuffer(section.indices, dtype=np.uint8 if isinstance(section.indices, bytearray) else np.uint16)
+    bits = max(4, (len(section.palette) - 1).bit_length())
+    if bits <= 8:
+        palette = pack_varint(len(section.palette)) \
+            + pack_varints([BLOCK_STATES[material] for material in section.palette])
+    else:
+        bits = GLOBAL_PALETTE_BITS
+        palette = b''
+        indices = np.array([BLOCK_STATES[material] for material in section.palette], dtype=np.uint16)[indices]
+    longs = _pack_longs(indices, bits)
+    data = section.encoded[v1_15_2] = b''.join([buff_type.pack('hB', section.non_air, bits), palette,
+                                                pack_varint(len(longs) // 8), longs])
+    return data
 
-    @staticmethod
-    def player_abilities(buff_type, flag=0, default_speed=0.05, default_fov=0.1):
-        return [
-            buff_type.pack('bff', flag, default_speed, default_fov)
-        ]
 
-    @staticmethod
-    def player_position_and_look(buff_type, x=0, y=0, z=0, yaw=0.0, pitch=0.0, flags=0, entity_id=0):
-        return [
-            buff_type.pack('dddff?', x, y, z, yaw, pitch, flags),
-            buff_type.pack_varint(entity_id)
-        ]
+def encode_heightmaps(chunk: Chunk) -> bytes:
+    """Serializes the MOTION_BLOCKING & WORLD_SURFACE heightmaps of a chunk as a NBT compound"""
+    tags = []
+    for heightmap in (Heightmap.MOTION_BLOCKING, Heightmap.WORLD_SURFACE):
+        longs = _pack_longs(np.frombuffer(chunk.heightmaps[heightmap], dtype=np.uint16), _HEIGHTMAP_BITS)
+        name = heightmap.name.encode('ascii')
+        tags.append(struct.pack('>BH', _TAG_LONG_ARRAY, len(name)) + name + struct.pack('>i', len(longs) // 8)
+                    + longs)
+    return b''.join([struct.pack('>BH', _TAG_COMPOUND, 0)] + tags + [bytes(1)])
 
-    @staticmethod
-    def keep_alive(buff_type):
-        return [
-            buff_type.pack('Q', 0)
-        ]
 
-    @staticmethod
-    def time_update(buff_type, game_time=0, day_time=0):
-        return [
-            buff_type.pack('QQ', game_time, day_time)
-        ]
+# Fields of the packets as (name, type, default), see classes.network.Codec
+PACKETS = {
+    'join_game': (('entity_id', 'i', 0), ('gamemode', 'B', 0), ('dimension', 'i', 0), ('hashed_seed', 'q', 0),
+                  ('max_player', 'B', 1), ('level_type', 'string', 'flat'), ('view_distance', 'varint', 8),
+                  ('reduced_debug_info', '?', True), ('show_respawn_screen', '?', True)),
+    'plugin_message': (('channel', 'string', None), ('data', 'string', None)),
+    'server_difficulty': (('difficulty', 'B', 0), ('difficulty_locked', '?', True)),
+    'player_abilities': (('flag', 'b', 0), ('default_speed', 'f', 0.05), ('default_fov', 'f', 0.1)),
+    'player_position_and_look': (('x', 'd', 0), ('y', 'd', 0), ('z', 'd', 0), ('yaw', 'f', 0.0), ('pitch', 'f', 0.0),
+                                 ('flags', '?', 0), ('entity_id', 'varint', 0)),
+    'keep_alive': (('keep_alive_id', 'Q', 0),),
+    'time_update': (('game_time', 'Q', 0), ('day_time', 'Q', 0)),
+    'chat_message': (('message', 'chat', None), ('position', 'B', 0)),
+    'unload_chunk': (('chunk_x', 'i', 0), ('chunk_z', 'i', 0)),
+    'update_view_position': (('chunk_x', 'varint', 0), ('chunk_z', 'varint', 0)),
+}
+PACKETS_INPUT = {
+    'client_settings': (('locale', 'string', None), ('view_distance', 'b', None), ('chat_mode', 'varint', None),
+                        ('chat_color', '?', None), ('skin_parts', 'B', None), ('main_hand', 'varint', None)),
+    'player_position': (('x', 'd', None), ('y', 'd', None), ('z', 'd', None), ('on_ground', '?', None)),
+    'player_position_and_look': (('x', 'd', None), ('y', 'd', None), ('z', 'd', None), ('yaw', 'f', None),
+                                 ('pitch', 'f', None), ('on_ground', '?', None)),
+}
+
+
+class v1_15_2(compile_protocol('v1_15_2_Packets', BasicNetwork, encoders=PACKETS)):
 
     @staticmethod
-    def chat_message(buff_type, message=None):
+    def chunk_data(buff_type, chunk: Chunk = None):
+        if chunk.size != 16 or len(chunk.sections) > SECTIONS:
+            raise ChunkError("Chunk {0}, {1} doesn't fit in a chunk data packet".format(chunk.xPos, chunk.zPos))
+        bitmask = 0
+        sections = []
+        for section_y, section in enumerate(chunk.sections):
+            if not section.is_empty():
+                bitmask |= 1 << section_y
+                sections.append(encode_section(buff_type, section))
+        data = b''.join(sections)
         return [
-            buff_type.pack_chat(message) + buff_type.pack('B', 0)
+            buff_type.pack('ii?', chunk.xPos, chunk.zPos, True),
+            pack_varint(bitmask),
+            encode_heightmaps(chunk),
+            PLAINS_BIOMES,
+            pack_varint(len(data)),
+            data,
+            pack_varint(0)  # No block entities
         ]
 
 
-class v1_15_2_Input(BasicNetworkInput):
-
-    @staticmethod
-    def client_settings(buff_type):
-        # ['locale', 'view_distance', 'chat_mode', 'chat_color', 'skin_parts', 'main_hand']
-        locale = buff_type.unpack_string()
-        view_distance = buff_type.unpack('b')
-        chat_mode = buff_type.unpack_varint()
-        chat_color = buff_type.unpack('?')
-        skin_parts = buff_type.unpack('B')
-        main_hand = buff_type.unpack_varint()
-        return {
-            'locale': locale,
-            'view_distance': view_distance,
-            'chat_mode': chat_mode,
-            'chat_color': chat_color,
-            'skin_parts': skin_parts,
-            'main_hand': main_hand,
-        }
+v1_15_2_Input = compile_protocol('v1_15_2_Input', BasicNetworkInput, decoders=PACKETS_INPUT)
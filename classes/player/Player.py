@@ -2,12 +2,18 @@ import logging
 
 import classes.Server as Server
 
+from classes.ChunkStreamer import ChunkLoader, ChunkStreamer
+from classes.WorldGenerator import ChunkGenerationService
 from classes.entity.Entity import Entity
+from classes.network.Audience import ALL, Audience
 from classes.network.Connection import NetworkController
 from classes.network.PacketType import PacketType
 from classes.utils.Vector import Vector3D
 from classes.utils.Utils import Version
 
+# Ticks between two logs of the chunk streaming metrics
+CHUNK_STATS_INTERVAL = 100
+
 
 class Player(Entity):
 
@@ -22,6 +28,8 @@ class Player(Entity):
         self.chat_color = True
         self.skin_parts = 127
         self.main_hand = 1
+        # Set by PlayerManager.player_join
+        self.chunk_streamer: [ChunkStreamer, None] = None
 
     def set_client_settings(self, locale, view_distance, chat_mode, chat_color, skin_parts, main_hand):
         self.locale = locale
@@ -37,6 +45,8 @@ class PlayerManager():
     def __init__(self, server: Server):
         self.server = server
         self.players = {}
+        self.chunk_loader = ChunkLoader(ChunkGenerationService(server.multi_processing, server.parser.seed,
+                                                               scheduler=server.scheduler_manager))
 
     def player_join(self, uuid, display_name, version: Version):
         player = self.server.entity_manager.make_entity(Player, Vector3D(0, 72, 0), 'world', uuid=uuid, display_name=display_name, version=version)
@@ -45,6 +55,8 @@ class PlayerManager():
         NetworkController.init_player(uuid, player.entity_id)
         # Send general packets
         self.send_join_packets(player)
+        # Chunks are sent from the next tick
+        player.chunk_streamer = ChunkStreamer(player, self.chunk_loader, self.server.parser.chunks_per_tick)
 
     def player_left(self, uuid):
         player = self.players[str(uuid)]
@@ -56,6 +68,32 @@ class PlayerManager():
         logging.info('Lost player %s (%s)', uuid, player.display_name)
         NetworkController.destroy_player(uuid=uuid, entity_id=player.entity_id)
 
+    def tick(self, current_tick):
+        for player in self.players.values():
+            player.chunk_streamer.tick()
+        if current_tick % CHUNK_STATS_INTERVAL == 0 and self.players:
+            stats = self.chunk_stats()
+            logging.debug('Chunk streaming: %d chunks queued (at most %d for a player), %d sent, '
+                          'first chunk after %.1f ms on average', stats['queue_depth'], stats['max_queue_depth'],
+                          stats['chunks_sent'], stats['time_to_first_chunk_ms'])
+
+    def chunk_stats(self) -> dict:
+        """ Chunk streaming metrics of the online players """
+        streamers = [player.chunk_streamer for player in self.players.values()]
+        first_chunks = [streamer.time_to_first_chunk for streamer in streamers
+                        if streamer.time_to_first_chunk is not None]
+        return {
+            'players': len(streamers),
+            'queue_depth': sum(streamer.queue_depth for streamer in streamers),
+            'max_queue_depth': max((streamer.queue_depth for streamer in streamers), default=0),
+            'chunks_sent': sum(streamer.chunks_sent for streamer in streamers),
+            'waiting_first_chunk': len(streamers) - len(first_chunks),
+            'time_to_first_chunk_ms': 1000 * sum(first_chunks) / len(first_chunks) if first_chunks else 0.0,
+        }
+
+    def stop(self):
+        self.chunk_loader.close()
+
     def get_player(self, uuid):
         return self.players[str(uuid)]
 
@@ -68,6 +106,16 @@ class PlayerManager():
     def get_players(self):
         return self.players.items()
 
+    def broadcast(self, packet_type: PacketType, data: dict, audience: Audience = ALL):
+        """
+        Send a packet to the players selected by audience, it is encoded once whatever the number of players
+        """
+        entity_ids = audience.select(self.players.values())
+        if entity_ids is None:
+            NetworkController.send_packet(packet_type, **data)
+        else:
+            NetworkController.send_packet_players(entity_ids, packet_type, data)
+
     def send_join_packets(self, player: Player):
         # 'join_game'
         NetworkController.send_packet_player(player.entity_id, PacketType.JOIN_GAME, {
@@ -0,0 +1,182 @@
+# coding=utf-8
+""" Tick profiler: how long each tick & each phase of it takes, over a rolling window of ticks.
+
+A tick is begin_tick, then one mark per phase (the time since the previous mark is charged to that phase), then
+end_tick. A mark costs a clock read & a dict update, so the profiler can stay on in production. Ticks longer than
+slow_tick seconds are logged with their phase breakdown; with sampling, a thread also records the stacks of the tick
+thread & overrunning ticks keep their most frequent stacks """
+import logging
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+# Ticks kept to compute the rolling statistics, one minute at 20 TPS
+DEFAULT_WINDOW = 1200
+# A tick longer than this many seconds overruns
+DEFAULT_SLOW_TICK = 0.05
+# Seconds between two logs of slow ticks, the slow ticks in between are only counted
+SLOW_LOG_INTERVAL = 1.0
+# Seconds between two stack samples of the tick thread
+DEFAULT_SAMPLE_INTERVAL = 0.002
+# Frames kept of each sampled stack, from the innermost one
+MAX_STACK_DEPTH = 32
+# Profiles of the last slow ticks kept when sampling
+SLOW_PROFILES = 16
+
+
+def percentile(values: [float], fraction: float) -> float:
+    """ The value below which fraction of values fall (nearest rank), 0.0 if there are none """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def collapse_stack(frame) -> str:
+    """ A stack as 'file:function:line' frames joined by ';' from the outermost one, as flame graph tools read """
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        frames.append('{0}:{1}:{2}'.format(code.co_filename.rsplit('/', 1)[-1], code.co_name, frame.f_lineno))
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+
+def _percentiles(values: [float]) -> dict:
+    """ The p50, p95 & p99 of durations in seconds, in milliseconds """
+    return {'p50': percentile(values, 0.5) * 1000, 'p95': percentile(values, 0.95) * 1000,
+            'p99': percentile(values, 0.99) * 1000}
+
+
+class TickProfiler:
+    """
+    Rolling tick & phase durations of the last window ticks. report returns MSPT, TPS & the p50/p95/p99 of each
+    phase in milliseconds; slow_profiles holds (tick, seconds, phases, most frequent stacks) of the last overrunning
+    ticks when sampling
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW, slow_tick: float = DEFAULT_SLOW_TICK, sampling: bool = False,
+                 sample_interval: float = DEFAULT_SAMPLE_INTERVAL, clock=time.perf_counter):
+        self.window = window
+        self.slow_tick = slow_tick
+        self.sampling = sampling
+        self.sample_interval = sample_interval
+        self.clock = clock
+        self.ticks = 0
+        self.slow_ticks = 0
+        # Tick durations & start times, then phase durations, as rings of window entries indexed by ticks % window
+        self._durations = [0.0] * window
+        self._starts = [0.0] * window
+        self._phases: {str: [float]} = {}
+        self._current: {str: float} = {}
+        self._tick_start = 0.0
+        self._last_mark = 0.0
+        self._last_slow_log = float('-inf')
+        self._unlogged_slow_ticks = 0
+        self.slow_profiles = deque(maxlen=SLOW_PROFILES)
+        self._samples = []
+        self._in_tick = False
+        self._sampler = None
+        self._stop_sampler = threading.Event()
+
+    def start(self):
+        """ Starts the sampler thread if sampling, the tick thread is the calling thread """
+        if self.sampling and self._sampler is None:
+            self._stop_sampler.clear()
+            self._sampler = threading.Thread(target=self._sample, args=(threading.get_ident(),),
+                                             name='TICK_SAMPLER', daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._stop_sampler.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def begin_tick(self):
+        self._current = {}
+        if self._sampler is not None:
+            self._samples = []
+        self._tick_start = self._last_mark = self.clock()
+        self._in_tick = True
+
+    def mark(self, phase: str):
+        """ Charges the time since the previous mark (or the start of the tick) to phase """
+        now = self.clock()
+        self._current[phase] = self._current.get(phase, 0.0) + now - self._last_mark
+        self._last_mark = now
+
+    def end_tick(self, current_tick: int = None) -> float:
+        """ Records the tick & returns its duration in seconds """
+        self._in_tick = False
+        duration = self.clock() - self._tick_start
+        index = self.ticks % self.window
+        self._durations[index] = duration
+        self._starts[index] = self._tick_start
+        for phase in self._current.keys() - self._phases.keys():
+            self._phases[phase] = [0.0] * self.window
+        for phase, durations in self._phases.items():
+            durations[index] = self._current.get(phase, 0.0)
+        self.ticks += 1
+        if duration > self.slow_tick:
+            self._slow(self.ticks if current_tick is None else current_tick, duration)
+        return duration
+
+    def _slow(self, tick: int, duration: float):
+        self.slow_ticks += 1
+        stacks = None
+        if self._sampler is not None:
+            stacks = Counter(self._samples).most_common(3)
+            self.slow_profiles.append((tick, duration, dict(self._current), stacks))
+        now = self.clock()
+        if now - self._last_slow_log < SLOW_LOG_INTERVAL:
+            self._unlogged_slow_ticks += 1
+            return
+        self._last_slow_log = now
+        phases = ', '.join('{0} {1:.1f} ms'.format(phase, seconds * 1000) for phase, seconds in
+                           sorted(self._current.items(), key=lambda item: item[1], reverse=True))
+        logging.warning('Tick %d took %.1f ms (%s)%s', tick, duration * 1000, phases,
+                        ', %d more slow ticks' % self._unlogged_slow_ticks if self._unlogged_slow_ticks else '')
+        if stacks:
+            logging.warning('Tick %d was mostly in %s (%d of %d samples)', tick, stacks[0][0], stacks[0][1],
+                            len(self._samples))
+        self._unlogged_slow_ticks = 0
+
+    def _sample(self, thread_id: int):
+        while not self._stop_sampler.wait(self.sample_interval):
+            if self._in_tick:
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    self._samples.append(collapse_stack(frame))
+
+    def report(self) -> dict:
+        """ Statistics of the ticks in the window, durations in milliseconds """
+        count = min(self.ticks, self.window)
+        if count == 0:
+            return {'ticks': 0, 'tps': 0.0, 'mspt': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'slow_ticks': 0,
+                    'phases': {}}
+        durations = self._durations[:count]
+        oldest = self._starts[self.ticks % self.window if self.ticks > self.window else 0]
+        newest = self._starts[(self.ticks - 1) % self.window]
+        report = {
+            'ticks': count,
+            # Ticks started per second, sleeps included
+            'tps': (count - 1) / (newest - oldest) if newest > oldest else 0.0,
+            'mspt': sum(durations) * 1000 / count,
+            'slow_ticks': self.slow_ticks,
+            'phases': {},
+        }
+        report.update(_percentiles(durations))
+        for phase, values in self._phases.items():
+            values = values[:count]
+            report['phases'][phase] = dict(_percentiles(values), mean=sum(values) * 1000 / count)
+        return report
+
+    def log_report(self):
+        report = self.report()
+        logging.info('%.1f TPS, %.2f MSPT (p50 %.2f, p95 %.2f, p99 %.2f ms), %d slow ticks', report['tps'],
+                     report['mspt'], report['p50'], report['p95'], report['p99'], report['slow_ticks'])
+        for phase, stats in report['phases'].items():
+            logging.debug('  %-14s mean %.2f ms, p50 %.2f, p95 %.2f, p99 %.2f', phase, stats['mean'], stats['p50'],
+                          stats['p95'], stats['p99'])
@@ -1,73 +1,326 @@
 import logging
-from queue import PriorityQueue
 import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
 
 import classes.Server as Server
 
-from ..utils.Thread import AtomicInteger
+from ..utils.Profiler import percentile
+from ..utils.Thread import AtomicInteger, CancellableExecutor
+
+# Slots of each level of the timer wheel, as bits: level 0 has one slot per tick for the next 256 ticks, each level
+# after it has 64 slots, each as long as the whole level before it. Tasks due in 2^32 ticks or more wait at the top
+WHEEL_BITS = (8, 6, 6, 6, 6)
+_SHIFTS = [sum(WHEEL_BITS[:level]) for level in range(len(WHEEL_BITS))]
+_MASKS = [(1 << bits) - 1 for bits in WHEEL_BITS]
+_MAX_DELTA = (1 << sum(WHEEL_BITS)) - 1
+# Threads running the work of run_off_tick
+DEFAULT_OFF_TICK_THREADS = 4
+# Off tick tasks whose timings are kept for async_stats
+TIMINGS_KEPT = 1024
+
+
+def _timed(func, args, kwargs):
+    """ Runs func on a thread or a worker process, with when it started & ended (time.monotonic is system wide) """
+    started = time.monotonic()
+    result = func(*args, **kwargs)
+    return started, time.monotonic(), result
 
 
 class Scheduler():
+    """
+    A scheduled task, also its cancellation handle. Repeating tasks run again every period ticks until cancelled
+    """
 
     def __init__(self, id, tick, func, **args):
         self.id = id
         self.tick = tick
         self.func = func
         self.args = args
+        self.period = 0
+        self.cancelled = False
+        # Whether it started running at least once
+        self.ran = False
+        self.manager = None
+        # The wheel slot holding the task, None once it expired
+        self.slot = None
 
-    def __lt__(self, other):
-        """
-        Used for comparator for PriorityQueue
-        """
-        if self.tick < other.tick:
-            return True
-        elif self.tick > other.tick:
-            return False
-        return self.id <= other.id
+    def cancel(self) -> bool:
+        """ Cancels the task, returns False if it already ran (and doesn't repeat) or was cancelled """
+        return self.manager.cancel(self)
+
+
+class AsyncTask():
+    """
+    Work run off the tick by run_off_tick. future is done on the tick thread, once work is done or timed out
+    """
+
+    def __init__(self, id, future: Future, callback, submitted_at: float):
+        self.id = id
+        self.future = future
+        self.callback = callback
+        self.submitted_at = submitted_at
+        # The Future of the thread pool or of MultiProcessing
+        self.work = None
+        self.timeout_task = None
+        self.finished = False
 
 
 class SchedulerManager():
+    """
+    Runs tasks at given ticks, with a hierarchical timer wheel: scheduling & cancelling a task are O(1) & every task
+    due in a tick is expired at once. Tasks due in the same tick run in the order they were scheduled
+    """
 
-    def __init__(self, server: Server, current_tick=0):
+    def __init__(self, server: Server, current_tick=0, off_tick_threads=DEFAULT_OFF_TICK_THREADS):
         self.server = server
         self.current_tick = current_tick
         self.atomic_id = AtomicInteger()
-        self.pending = PriorityQueue()
+        # wheel[level][slot] maps task ids to tasks
+        self.wheel = [[{} for _ in range(1 << bits)] for bits in WHEEL_BITS]
+        # Next tick to expire
+        self._next_tick = current_tick + 1
+        self._count = 0
         self._lock = threading.Lock()
+        # Off tick work: its threads, the tasks whose work is done waiting for the tick thread & their timings
+        self.off_tick_threads = off_tick_threads
+        self._executor = None
+        self._async_tasks: {int: AsyncTask} = {}
+        self._completed = deque()
+        self._queue_waits = deque(maxlen=TIMINGS_KEPT)
+        self._run_times = deque(maxlen=TIMINGS_KEPT)
+        self._delivery_waits = deque(maxlen=TIMINGS_KEPT)
+        self.async_completed = 0
+        self.async_failed = 0
+        self.async_timed_out = 0
+
+    def __len__(self):
+        """ Number of tasks waiting """
+        return self._count
 
     def tick(self, current_tick):
         self.current_tick = current_tick
-        while not self.pending.empty():
-            task = self.pending.get(False)
-            # Check if we have to run function now or later
-            if task.tick <= current_tick:
+        self._deliver()
+        while self._next_tick <= current_tick:
+            with self._lock:
+                tick = self._next_tick
+                self._next_tick += 1
+                tasks = self._expire(tick)
+            for task in sorted(tasks, key=lambda task: task.id) if len(tasks) > 1 else tasks:
+                if task.cancelled:
+                    # By a task run before it in this tick
+                    continue
+                task.ran = True
                 # Run function
                 try:
                     task.func(self.server, **task.args)
                 except Exception:
                     logging.exception('Exception while running task %d', task.id)
-            else:
-                # Put back this task in the queue
-                self.add_pending(task)
-                # Exit the loop
-                break
+                if task.period:
+                    self._reschedule(task)
+
+    def _expire(self, tick) -> [Scheduler]:
+        """ Moves the tasks of the upper levels reaching this tick down & returns the tasks due at it """
+        level = 0
+        while level + 1 < len(WHEEL_BITS) and (tick >> _SHIFTS[level]) & _MASKS[level] == 0:
+            level += 1
+            slot = (tick >> _SHIFTS[level]) & _MASKS[level]
+            tasks = self.wheel[level][slot]
+            self.wheel[level][slot] = {}
+            for task in tasks.values():
+                self._insert(task, tick)
+        tasks = self.wheel[0][tick & _MASKS[0]]
+        self.wheel[0][tick & _MASKS[0]] = {}
+        self._count -= len(tasks)
+        for task in tasks.values():
+            task.slot = None
+        return list(tasks.values())
+
+    def _insert(self, task, next_tick):
+        """ Puts a task in the slot of its tick, relative to the next tick to expire """
+        delta = task.tick - next_tick
+        if delta < 1 << WHEEL_BITS[0]:
+            level = 0
+            due = max(task.tick, next_tick)
+        else:
+            if delta > _MAX_DELTA:
+                # Too far: waits at the top level & moves down again later
+                delta = _MAX_DELTA
+            # Levels after the first one are 6 bits each
+            level = (delta.bit_length() - WHEEL_BITS[0] - 1) // WHEEL_BITS[1] + 1
+            due = next_tick + delta
+        slot = self.wheel[level][(due >> _SHIFTS[level]) & _MASKS[level]]
+        slot[task.id] = task
+        task.slot = slot
 
     def _add_pending(self, scheduler):
         with self._lock:
-            self.pending.put_nowait(scheduler)
+            self._insert(scheduler, self._next_tick)
+            self._count += 1
+
+    def _reschedule(self, scheduler):
+        with self._lock:
+            # It may have been cancelled by another thread meanwhile
+            if not scheduler.cancelled:
+                scheduler.tick += scheduler.period
+                self._insert(scheduler, self._next_tick)
+                self._count += 1
+
+    def cancel(self, scheduler) -> bool:
+        with self._lock:
+            if scheduler.cancelled:
+                return False
+            scheduler.cancelled = True
+            if scheduler.slot is None:
+                # Expired: stopped if it didn't run yet, otherwise (running or ran) only a repeating task is stopped
+                return bool(scheduler.period) or not scheduler.ran
+            del scheduler.slot[scheduler.id]
+            scheduler.slot = None
+            self._count -= 1
+            return True
+
+    def schedule(self, func, **args) -> Scheduler:
+        return self.schedule_after(1, func, **args)
 
-    def schedule(self, func, **args):
-        self.schedule_after(1, func, **args)
+    def schedule_after(self, after, func, **args) -> Scheduler:
+        """ Runs func(server, **args) in after ticks, returns the task to cancel it """
+        return self._schedule(after, 0, func, args)
 
-    def schedule_after(self, after, func, **args):
+    def schedule_repeating(self, after, repeat, func, **args) -> Scheduler:
+        """ Runs func(server, **args) in after ticks & then every repeat ticks, returns the task to cancel it """
+        return self._schedule(after, max(repeat, 1), func, args)
+
+    def _schedule(self, after, repeat, func, args: dict) -> Scheduler:
         if after <= 0:
             after = 1
         scheduler_id = self.atomic_id.get_and_increment()
         scheduler = Scheduler(scheduler_id, self.current_tick + after, func, **args)
+        scheduler.period = repeat
+        scheduler.manager = self
         self._add_pending(scheduler)
+        return scheduler
 
-    def schedule_repeating(self, after, repeat, func, **args):
-        if after <= 0:
-            after = 1
-        id = self.atomic_id.get_and_increment()
-        # TODO
+    # Off tick work -----------------------------------------------------------
+    def run_off_tick(self, func, args=(), kwargs=None, callback=None, timeout=None, processes=False) -> Future:
+        """
+        Runs func(*args, **kwargs) on a thread, or on a MultiProcessing worker if processes (func & its arguments
+        must then be picklable), without blocking the tick.\n
+        Returns a Future done on the tick thread at the start of the tick after the work ends, callback (if any) is
+        then called with (server, future). If the work takes more than timeout ticks, the Future fails with a
+        TimeoutError & its late result is dropped
+        """
+        future = Future()
+        task = AsyncTask(self.atomic_id.get_and_increment(), future, callback, time.monotonic())
+        with self._lock:
+            self._async_tasks[task.id] = task
+        if processes:
+            task.work = self.server.multi_processing.submit(_timed, [func, args, kwargs or {}])
+        else:
+            task.work = self._get_executor().submit(_timed, func, args, kwargs or {})
+        if timeout is not None:
+            task.timeout_task = self.schedule_after(timeout, self._time_out, task=task)
+        task.work.add_done_callback(partial(self._work_done, task))
+        return future
+
+    def schedule_async(self, after, func, args=(), kwargs=None, callback=None, timeout=None,
+                       processes=False) -> Future:
+        """ Runs func off the tick like run_off_tick, in after ticks. The timeout counts from then """
+        future = Future()
+
+        def start(server):
+            work = self.run_off_tick(func, args, kwargs, timeout=timeout, processes=processes)
+            work.add_done_callback(partial(self._chain, future, callback))
+        self.schedule_after(after, start)
+        return future
+
+    def _chain(self, future: Future, callback, work: Future):
+        """ Passes the outcome of run_off_tick's Future to the Future of schedule_async, on the tick thread """
+        if future.cancelled():
+            return
+        if work.exception() is not None:
+            future.set_exception(work.exception())
+        else:
+            future.set_result(work.result())
+        self._call_back(callback, future)
+
+    def _get_executor(self) -> CancellableExecutor:
+        if self._executor is None:
+            self._executor = CancellableExecutor(self.off_tick_threads, thread_name_prefix='OFF_TICK')
+        return self._executor
+
+    def _work_done(self, task: AsyncTask, work: Future):
+        # On the thread or the MultiProcessing result thread: the tick thread finishes the task
+        self._completed.append((task, time.monotonic()))
+
+    def _deliver(self):
+        while self._completed:
+            task, done_at = self._completed.popleft()
+            if not self._finish(task):
+                # Timed out meanwhile
+                continue
+            try:
+                started, ended, result = task.work.result()
+            except Exception as e:
+                self.async_failed += 1
+                if not task.future.cancelled():
+                    task.future.set_exception(e)
+            else:
+                self.async_completed += 1
+                self._queue_waits.append(started - task.submitted_at)
+                self._run_times.append(ended - started)
+                if not task.future.cancelled():
+                    task.future.set_result(result)
+            self._delivery_waits.append(time.monotonic() - done_at)
+            self._call_back(task.callback, task.future)
+
+    def _time_out(self, server, task: AsyncTask):
+        if not self._finish(task):
+            return
+        self.async_timed_out += 1
+        # Only stops work that didn't start yet
+        task.work.cancel()
+        if not task.future.cancelled():
+            task.future.set_exception(TimeoutError('Off tick task {0} timed out'.format(task.id)))
+        self._call_back(task.callback, task.future)
+
+    def _finish(self, task: AsyncTask) -> bool:
+        """ Marks a task finished, returns False if it already was """
+        if task.finished:
+            return False
+        task.finished = True
+        with self._lock:
+            del self._async_tasks[task.id]
+        if task.timeout_task is not None:
+            task.timeout_task.cancel()
+        return True
+
+    def _call_back(self, callback, future: Future):
+        if callback is None:
+            return
+        try:
+            callback(self.server, future)
+        except Exception:
+            logging.exception('Exception in the callback of an off tick task')
+
+    def async_stats(self) -> dict:
+        """ Off tick tasks running or waiting, counters & timings in milliseconds of the last tasks """
+        queue_waits = list(self._queue_waits)
+        return {
+            'pending': len(self._async_tasks),
+            'completed': self.async_completed,
+            'failed': self.async_failed,
+            'timed_out': self.async_timed_out,
+            'queue_wait_ms': 1000 * sum(queue_waits) / len(queue_waits) if queue_waits else 0.0,
+            'queue_wait_p99_ms': 1000 * percentile(queue_waits, 0.99),
+            'run_ms': 1000 * sum(self._run_times) / len(self._run_times) if self._run_times else 0.0,
+            'delivery_wait_ms': 1000 * sum(self._delivery_waits) / len(self._delivery_waits)
+            if self._delivery_waits else 0.0,
+        }
+
+    def stop(self):
+        """ Stops the threads running off tick work, waiting work is cancelled """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
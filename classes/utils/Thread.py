@@ -1,4 +1,5 @@
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 
 class AtomicInteger():
@@ -19,3 +20,35 @@ class AtomicInteger():
             value = self.value
             self.value += incr
             return value
+
+
+class CancellableExecutor(ThreadPoolExecutor):
+    """
+    A ThreadPoolExecutor which can cancel the tasks not started yet when it is shut down, as
+    shutdown(cancel_futures=True) does from Python 3.9 on
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CancellableExecutor, self).__init__(*args, **kwargs)
+        self._submitted = set()
+        self._submitted_lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        future = super(CancellableExecutor, self).submit(fn, *args, **kwargs)
+        with self._submitted_lock:
+            self._submitted.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future: Future):
+        with self._submitted_lock:
+            self._submitted.discard(future)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        if cancel_futures:
+            with self._submitted_lock:
+                futures = list(self._submitted)
+            # Only stops the tasks still waiting for a thread
+            for future in futures:
+                future.cancel()
+        super(CancellableExecutor, self).shutdown(wait)
@@ -0,0 +1,91 @@
+# coding=utf-8
+""" Tick clock: when each tick starts, on a fixed schedule measured with time.perf_counter.
+
+Tick n is due at start + n * period, whatever the previous ticks took, so overruns don't shift the schedule. What
+happens to a tick started late is up to the CatchUp policy. Sleeps wake up a little early & yield until the deadline,
+as time.sleep may oversleep by a millisecond or more """
+import enum
+import logging
+import time
+
+DEFAULT_TPS = 20
+# Sleeps end this many seconds before the deadline, the rest is spent yielding
+DEFAULT_SPIN = 0.001
+# Ticks a BURST clock may be late before it gives up catching up & skips them
+DEFAULT_MAX_BURST = 40
+
+
+class CatchUp(enum.Enum):
+    """ What a clock does when a tick starts at least one period late """
+    # Run the late ticks back to back until the clock is on schedule again
+    BURST = 'burst'
+    # Drop the whole periods missed, the next ticks are on the schedule again
+    SKIP = 'skip'
+    # Start the schedule again from now: game time runs slower than real time
+    DILATE = 'dilate'
+
+
+class TickClock:
+    """
+    wait blocks until the next tick is due. ticks counts the ticks started, lost_ticks the ticks skipped or dilated
+    away, lag is how late the last tick started (in seconds) & real_tps the rate ticks actually started at
+    """
+
+    def __init__(self, tps: float = DEFAULT_TPS, catch_up: CatchUp = CatchUp.BURST, max_burst: int = DEFAULT_MAX_BURST,
+                 spin: float = DEFAULT_SPIN, clock=time.perf_counter, sleep=time.sleep):
+        self.period = 1 / tps
+        self.catch_up = catch_up
+        self.max_burst = max_burst
+        self.spin = spin
+        self.clock = clock
+        self.sleep = sleep
+        self.start = None
+        self.deadline = None
+        self.ticks = 0
+        self.lost_ticks = 0.0
+        self.lag = 0.0
+
+    def wait(self):
+        """ Returns once the next tick is due, applying the catch up policy if it is late """
+        now = self.clock()
+        if self.start is None:
+            self.start = self.deadline = now
+        late = now - self.deadline
+        if late < 0:
+            self._sleep_until(self.deadline)
+            late = 0.0
+        elif late >= self.period:
+            if self.catch_up is CatchUp.SKIP or (self.catch_up is CatchUp.BURST
+                                                 and late >= self.max_burst * self.period):
+                missed = int(late // self.period)
+                if self.catch_up is CatchUp.BURST:
+                    logging.warning("Can't keep up, %d ticks behind: skipping them", missed)
+                self.deadline += missed * self.period
+                self.lost_ticks += missed
+            elif self.catch_up is CatchUp.DILATE:
+                self.deadline = now
+                self.lost_ticks += late / self.period
+        self.lag = late
+        self.deadline += self.period
+        self.ticks += 1
+
+    def _sleep_until(self, deadline: float):
+        remaining = deadline - self.clock()
+        if remaining > self.spin:
+            self.sleep(remaining - self.spin)
+        while self.clock() < deadline:
+            # Lets other threads run while spinning
+            self.sleep(0)
+
+    def behind(self) -> float:
+        """ Seconds the clock is behind schedule now, 0.0 if the next tick isn't due yet """
+        if self.deadline is None:
+            return 0.0
+        return max(0.0, self.clock() - self.deadline)
+
+    def real_tps(self) -> float:
+        """ Ticks started per second since the first one """
+        if self.start is None:
+            return 0.0
+        elapsed = self.clock() - self.start
+        return self.ticks / elapsed if elapsed > 0 else 0.0
@@ -1,5 +1,7 @@
 from . import Biome
+from . import Profiler
 from . import Scheduler
 from . import Thread
+from . import TickClock
 from . import Utils
 from . import Vector
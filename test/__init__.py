@@ -1 +1,3 @@
 from . import utils
+from . import network
+from . import world
@@ -0,0 +1,10 @@
+from . import test_backends
+from . import test_broadcast
+from . import test_chunk_data
+from . import test_codec
+from . import test_compression
+from . import test_dispatch
+from . import test_ipc
+from . import test_outbound
+from . import test_shards
+from . import test_varint
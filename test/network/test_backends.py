@@ -0,0 +1,122 @@
+import json
+import socket
+import struct
+import time
+
+from quarry.types.buffer import Buffer1_14, BufferUnderrun
+from quarry.types.uuid import UUID
+
+from classes.network.AsyncioNetwork import BACKENDS
+from classes.network.Connection import NetworkController
+from classes.network.IncomingPacketAction import ServerActionType
+from classes.network.PacketType import PacketType
+
+PROTOCOL = 578
+
+
+def _free_port() -> int:
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def _packet(ident: int, payload: bytes = b'') -> bytes:
+    data = Buffer1_14.pack_varint(ident) + payload
+    return Buffer1_14.pack_varint(len(data)) + data
+
+
+def _handshake(port: int, mode: int) -> bytes:
+    return _packet(0, Buffer1_14.pack_varint(PROTOCOL) + Buffer1_14.pack_string('127.0.0.1') +
+                   struct.pack('>H', port) + Buffer1_14.pack_varint(mode))
+
+
+class _Client:
+    """ Reads the packets of a connection without encryption nor compression """
+
+    def __init__(self, port: int):
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                self.sock = socket.create_connection(('127.0.0.1', port), timeout=10)
+                break
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        self.buff = Buffer1_14()
+
+    def read_packet(self) -> (int, bytes):
+        while True:
+            self.buff.save()
+            try:
+                body = self.buff.unpack_packet(Buffer1_14)
+                return body.unpack_varint(), body.read()
+            except BufferUnderrun:
+                self.buff.restore()
+            data = self.sock.recv(65536)
+            assert data, 'Connection closed'
+            self.buff.add(data)
+
+
+def _get(action: ServerActionType) -> dict:
+    while True:
+        item = NetworkController.IN_QUEUE.get(timeout=10)
+        if item['action'] is action:
+            return item['data']
+
+
+def _session(backend: str) -> dict:
+    """ Status ping, login & a few packets both ways through a network process of the given backend """
+    port = _free_port()
+    NetworkController.start_process(None, '127.0.0.1', port, factory_type=BACKENDS[backend], online_mode=False,
+                                    compression_threshold=-1, compression_workers=0)
+    try:
+        result = {}
+        client = _Client(port)
+        client.sock.sendall(_handshake(port, 1) + _packet(0) + _packet(1, struct.pack('>Q', 1234)))
+        result['status'] = client.read_packet()
+        result['pong'] = client.read_packet()
+        client.sock.close()
+
+        client = _Client(port)
+        client.sock.sendall(_handshake(port, 2) + _packet(0, Buffer1_14.pack_string('Tester')))
+        result['login_success'] = client.read_packet()
+        joined = _get(ServerActionType.PLAYER_JOIN)
+        result['uuid'] = str(joined['uuid'])
+        NetworkController.init_player(joined['uuid'], 7)
+        NetworkController.send_packet_player(7, PacketType.TIME_UPDATE, {'game_time': 42, 'day_time': 6000})
+        while True:
+            ident, payload = client.read_packet()
+            if ident != 33:  # Keep alive
+                break
+        result['time_update'] = (ident, payload)
+        settings = Buffer1_14.pack_string('en_US') + struct.pack('b', 8) + Buffer1_14.pack_varint(0) + \
+            struct.pack('?B', True, 0x7f) + Buffer1_14.pack_varint(1)
+        client.sock.sendall(_packet(5, settings))
+        settings = _get(ServerActionType.CLIENT_SETTINGS)
+        settings['uuid'] = str(settings['uuid'])
+        result['client_settings'] = settings
+        client.sock.close()
+        return result
+    finally:
+        NetworkController.stop_process()
+
+
+class TestBackends:
+
+    def test_equivalence(self):
+        twisted = _session('twisted')
+        asyncio = _session('asyncio')
+        assert twisted == asyncio
+        status = json.loads(Buffer1_14(twisted['status'][1]).unpack_string())
+        assert status['version']['protocol'] == PROTOCOL
+        assert twisted['pong'] == (1, struct.pack('>Q', 1234))
+        uuid = UUID.from_offline_player('Tester')
+        assert twisted['uuid'] == str(uuid)
+        assert twisted['login_success'] == (2, Buffer1_14.pack_string(uuid.to_hex()) +
+                                            Buffer1_14.pack_string('Tester'))
+        assert twisted['time_update'] == (79, struct.pack('>qq', 42, 6000))
+        assert twisted['client_settings'] == {'uuid': str(uuid), 'locale': 'en_US', 'view_distance': 8,
+                                              'chat_mode': 0, 'chat_color': True, 'skin_parts': 0x7f, 'main_hand': 1}
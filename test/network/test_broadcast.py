@@ -0,0 +1,62 @@
+from twisted.internet.address import IPv4Address
+
+from classes.network.Audience import ALL, ChunkViewers, WithinRadius
+from classes.network.Connection import PlayerNetwork, ServerFactory
+from classes.network.Outbound import OutboundBuffer
+from classes.network.PacketType import PacketType
+from classes.utils.Vector import Vector3D
+
+
+class _Player:
+    def __init__(self, entity_id, x, z, view_distance=2):
+        self.entity_id = entity_id
+        self.entity_location = Vector3D(x, 72, z)
+        self.view_distance = view_distance
+
+
+def _connect(factory: ServerFactory, entity_id, protocol_version=578, compression_threshold=-1) -> PlayerNetwork:
+    player = PlayerNetwork(factory, IPv4Address('TCP', '127.0.0.1', 25565 + entity_id))
+    player.protocol_mode = 'play'
+    player.protocol_version = protocol_version
+    player.compression_threshold = compression_threshold
+    player.buff_type = factory.get_buff_type(protocol_version)
+    player._update_dispatch()
+    player.entity_id = entity_id
+    player.outbound = OutboundBuffer()
+    factory._players[str(entity_id)] = player
+    return player
+
+
+def _flush(player: PlayerNetwork) -> [bytes]:
+    written = []
+    player.outbound.flush(written.append)
+    return written
+
+
+class TestBroadcast:
+
+    def test_audiences(self):
+        players = [_Player(1, 0, 0), _Player(2, 10, 0), _Player(3, -40, 100)]
+        assert ALL.select(players) is None
+        assert WithinRadius(0, 72, 0, 10).select(players) == [1, 2]
+        assert WithinRadius(0, 72, 0, 9.9).select(players) == [1]
+        assert ChunkViewers(2, 0).select(players) == [1, 2]
+        assert ChunkViewers(-4, 7).select(players) == [3]
+
+    def test_same_frame(self):
+        factory = ServerFactory()
+        players = [_connect(factory, entity_id) for entity_id in range(5)]
+        compressed = _connect(factory, 5, compression_threshold=256)
+        other_version = _connect(factory, 6, protocol_version=498)
+        factory.send_packet(578, PacketType.TIME_UPDATE, bytes(16))
+        frames = [_flush(player)[0] for player in players]
+        assert all(frame is frames[0] for frame in frames)
+        assert frames[0] == bytes([17, 79]) + bytes(16)
+        assert _flush(compressed) == [bytes([18, 0, 79]) + bytes(16)]
+        assert _flush(other_version) == []
+
+    def test_targets(self):
+        factory = ServerFactory()
+        players = [_connect(factory, entity_id) for entity_id in range(3)]
+        factory.send_packet(578, PacketType.TIME_UPDATE, bytes(16), (0, 2, 42))
+        assert [len(player.outbound) for player in players] == [1, 0, 1]
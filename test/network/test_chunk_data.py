@@ -0,0 +1,80 @@
+import random
+import struct
+
+from quarry.types.buffer import Buffer1_14
+
+from classes.BasicClasses import Chunk, Heightmap
+from classes.blocks.Materials import Material
+from classes.network.versions.v578 import BLOCK_STATES, GLOBAL_PALETTE_BITS, encode_section, v1_15_2
+
+
+def _unpack_longs(data, bits, count):
+    """ Reads count bits wide entries spanning big endian longs, the slow & obvious way """
+    packed = 0
+    for i, (long,) in enumerate(struct.iter_unpack('>Q', data)):
+        packed |= long << (64 * i)
+    return [(packed >> (i * bits)) & ((1 << bits) - 1) for i in range(count)]
+
+
+def _unpack_section(buff):
+    non_air, bits = buff.unpack('hB')
+    palette = None
+    if bits <= 8:
+        palette = [buff.unpack_varint() for _ in range(buff.unpack_varint())]
+    states = _unpack_longs(buff.read(8 * buff.unpack_varint()), bits, 4096)
+    if palette is not None:
+        states = [palette[state] for state in states]
+    return non_air, bits, states
+
+
+def _states(section):
+    return [BLOCK_STATES[section.get_material(index)] for index in range(4096)]
+
+
+class TestChunkData:
+
+    def test_chunk_data(self):
+        rng = random.Random(11)
+        chunk = Chunk(3, 0, -2, None, None, 16, 256)
+        for _ in range(2000):
+            chunk.set_block(rng.randrange(16), rng.randrange(40), rng.randrange(16), rng.choice(list(Material)))
+        buff = Buffer1_14(b''.join(v1_15_2.chunk_data(Buffer1_14, chunk)))
+        assert buff.unpack('ii?') == (3, -2, True)
+        bitmask = buff.unpack_varint()
+        assert bitmask == 0b111
+        assert buff.unpack('BH') == (10, 0)
+        for _ in range(2):
+            _, length = buff.unpack('BH')
+            heightmap = Heightmap[buff.read(length).decode('ascii')]
+            heights = _unpack_longs(buff.read(8 * buff.unpack('i')), 9, 256)
+            assert heights == list(chunk.heightmaps[heightmap])
+        assert buff.unpack('B') == 0
+        assert buff.read(4096) == struct.pack('>1024i', *([1] * 1024))
+        buff.unpack_varint()
+        for section_y in range(3):
+            section = chunk.sections[section_y]
+            non_air, _, states = _unpack_section(buff)
+            assert non_air == section.non_air
+            assert states == _states(section)
+        assert buff.unpack_varint() == 0
+        assert not buff.read()
+
+    def test_global_palette(self):
+        section = Chunk(0, 0, 0, None, None).sections[0]
+        # More than 256 palette entries, even if repeated, don't fit in 8 bits
+        palette = [list(Material)[i % len(Material)] for i in range(300)]
+        section.load(palette, [i % 300 for i in range(4096)])
+        _, bits, states = _unpack_section(Buffer1_14(encode_section(Buffer1_14, section)))
+        assert bits == GLOBAL_PALETTE_BITS
+        assert states == _states(section)
+
+    def test_section_cache(self):
+        chunk = Chunk(0, 0, 0, None, None)
+        section = chunk.sections[0]
+        data = encode_section(Buffer1_14, section)
+        assert encode_section(Buffer1_14, section) is data
+        chunk.set_block(1, 2, 3, Material.STONE)
+        data = encode_section(Buffer1_14, section)
+        assert _unpack_section(Buffer1_14(data))[2] == _states(section)
+        chunk.set_blocks({(1, 2, 3): Material.DIRT})
+        assert _unpack_section(Buffer1_14(encode_section(Buffer1_14, section)))[2] == _states(section)
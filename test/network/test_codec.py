@@ -0,0 +1,69 @@
+import pytest
+from quarry.types.buffer import Buffer1_14
+
+from classes.network.Codec import compile_decoder, compile_encoder, varint_size, write_varint
+from classes.network.versions.v578 import v1_15_2, v1_15_2_Input
+
+VARINTS = [0, 1, 127, 128, 255, 300, 16383, 16384, 2097151, 2097152, 268435455, 268435456, 2 ** 31 - 1, -1, -128,
+           -2 ** 31]
+
+
+def _body(parts) -> bytes:
+    return b''.join(parts)
+
+
+class TestCodec:
+
+    def test_varint(self):
+        for value in VARINTS:
+            expected = Buffer1_14.pack_varint(value)
+            buf = bytearray(5)
+            assert varint_size(value) == len(expected)
+            assert write_varint(buf, 0, value) == len(expected)
+            assert bytes(buf[:len(expected)]) == expected
+        with pytest.raises(ValueError):
+            varint_size(2 ** 31)
+
+    def test_v1_15_2(self):
+        b = Buffer1_14
+        assert _body(v1_15_2.join_game(b, 5, 1, -1, 123456789, 20, 'default', 12, False, True)) == \
+            b.pack('iBiqB', 5, 1, -1, 123456789, 20) + b.pack_string('default') + b.pack_varint(12) + \
+            b.pack('??', False, True)
+        assert _body(v1_15_2.plugin_message(b, 'minecraft:brand', 'McPy')) == \
+            b.pack_string('minecraft:brand') + b.pack_string('McPy')
+        assert _body(v1_15_2.server_difficulty(b, 2, False)) == b.pack('B?', 2, False)
+        assert _body(v1_15_2.player_abilities(b, 4, 0.1, 0.2)) == b.pack('bff', 4, 0.1, 0.2)
+        assert _body(v1_15_2.player_position_and_look(b, 1.5, 72, -3.25, 90.0, 10.0, 0, 300)) == \
+            b.pack('dddff?', 1.5, 72, -3.25, 90.0, 10.0, 0) + b.pack_varint(300)
+        assert _body(v1_15_2.keep_alive(b)) == b.pack('Q', 0)
+        assert _body(v1_15_2.time_update(b, game_time=42, day_time=6000)) == b.pack('QQ', 42, 6000)
+        assert _body(v1_15_2.chat_message(b, message=u'§eHello é')) == \
+            b.pack_chat(u'§eHello é') + b.pack('B', 0)
+        assert _body(v1_15_2.unload_chunk(b, -3, 7)) == b.pack('ii', -3, 7)
+        assert _body(v1_15_2.update_view_position(b, -3, 7)) == b.pack_varint(-3) + b.pack_varint(7)
+
+    def test_decoder(self):
+        b = Buffer1_14
+        data = b.pack_string('en_US') + b.pack('b', -2) + b.pack_varint(300) + b.pack('?B', True, 0x7f) + \
+            b.pack_varint(1)
+        assert v1_15_2_Input.client_settings(Buffer1_14(data)) == {
+            'locale': 'en_US', 'view_distance': -2, 'chat_mode': 300, 'chat_color': True, 'skin_parts': 0x7f,
+            'main_hand': 1}
+        data = b.pack('dddff?', 1.5, 72.0, -3.25, 90.0, -10.0, True)
+        assert v1_15_2_Input.player_position_and_look(Buffer1_14(data)) == {
+            'x': 1.5, 'y': 72.0, 'z': -3.25, 'yaw': 90.0, 'pitch': -10.0, 'on_ground': True}
+        assert v1_15_2_Input.player_position(Buffer1_14(b.pack('ddd?', 1.5, 72.0, -3.25, False))) == {
+            'x': 1.5, 'y': 72.0, 'z': -3.25, 'on_ground': False}
+
+    def test_round_trip(self):
+        schema = (('count', 'varint', 0), ('name', 'string', ''), ('x', 'd', 0.0), ('y', 'h', 0), ('flag', '?', False))
+        encode = compile_encoder('test', schema)
+        decode = compile_decoder('test', schema)
+        fields = {'count': -7, 'name': 'a' * 200, 'x': 0.5, 'y': -300, 'flag': True}
+        assert decode(Buffer1_14(_body(encode(Buffer1_14, **fields)))) == fields
+
+    def test_invalid_schema(self):
+        with pytest.raises(ValueError):
+            compile_encoder('test', (('_buf', 'i', 0),))
+        with pytest.raises(ValueError):
+            compile_encoder('test', (('buff_type', 'i', 0),))
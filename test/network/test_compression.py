@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import Future
+
+from quarry.types.buffer import Buffer1_14
+
+from classes.network.Compression import Compressor
+from classes.network.Connection import ServerFactory
+from classes.network.Outbound import OutboundBuffer
+
+
+class TestCompression:
+
+    def test_frames(self):
+        compressor = Compressor(workers=1, offload_size=1024)
+        try:
+            small = bytes(100)
+            large = os.urandom(500) + bytes(2000)
+            for threshold in (-1, 0, 256):
+                assert compressor.frame(Buffer1_14, small, threshold) == Buffer1_14.pack_packet(small, threshold)
+            assert compressor.frame(Buffer1_14, large, -1) == Buffer1_14.pack_packet(large, -1)
+            frame = compressor.frame(Buffer1_14, large, 256)
+            assert isinstance(frame, Future)
+            assert Buffer1_14(frame.result(5)).unpack_packet(Buffer1_14, 256).read() == large
+            # Every player receiving the same packet shares the frame
+            assert compressor.frame(Buffer1_14, large, 256) is frame
+            stats = compressor.stats.take()
+            assert (stats['packets'], stats['compressed'], stats['cache_hits']) == (5, 2, 1)
+            assert stats['ratio'] < 1
+            assert compressor.stats.take()['packets'] == 0
+        finally:
+            compressor.shutdown()
+
+    def test_outbound_waits_for_compression(self):
+        buffer = OutboundBuffer()
+        pending = Future()
+        buffer.append(b'first')
+        buffer.append(pending, 100)
+        buffer.append(b'last')
+        written = []
+        buffer.flush(written.append)
+        assert written == [b'first'] and buffer.size == 104
+        pending.set_result(b'compressed')
+        buffer.flush(written.append)
+        assert written == [b'first', b'compressedlast'] and buffer.size == 0
+
+    def test_failed_compression(self):
+        errors = []
+        buffer = OutboundBuffer(on_error=errors.append)
+        failed = Future()
+        buffer.append(b'first')
+        buffer.append(failed, 100)
+        buffer.append(b'last')
+        failed.set_exception(ValueError('zlib'))
+        written = []
+        buffer.flush(written.append)
+        # The next frames can't be sent without the failed one
+        assert written == [b'first'] and buffer.size == 0
+        assert len(errors) == 1 and isinstance(errors[0], ValueError)
+        buffer.append(b'after')
+        buffer.flush(written.append)
+        assert written == [b'first'] and len(errors) == 1
+
+    def test_threshold(self):
+        for threshold, expected in ((0, 1), (-1, 0), (256, 256)):
+            factory = ServerFactory(compression_threshold=threshold)
+            try:
+                assert factory.compression_threshold == expected
+            finally:
+                factory.compressor.shutdown()
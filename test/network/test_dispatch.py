@@ -0,0 +1,88 @@
+import struct
+
+from quarry.types.buffer import Buffer1_14
+from twisted.internet.address import IPv4Address
+
+from classes.network.Connection import NetworkController, PlayerNetwork, ServerFactory, get_dispatch_table
+from classes.network.Dispatch import DispatchTable
+from classes.network.IncomingPacketAction import ServerActionType
+from classes.network.PacketType import PacketType, PacketTypeInput
+from classes.network.versions.v578 import v1_15_2, v1_15_2_Input
+
+
+class _Transport:
+    def __init__(self):
+        self.closed = False
+
+    def write(self, data):
+        pass
+
+    def loseConnection(self):
+        self.closed = True
+
+
+class _KeepAlivePlayer(PlayerNetwork):
+    def packet_keep_alive(self, buff):
+        self.keep_alives.append(buff.unpack('Q'))
+
+
+def _packet(ident: int, payload: bytes = b'') -> bytes:
+    return Buffer1_14.pack_packet(Buffer1_14.pack_varint(ident) + payload)
+
+
+def _player() -> _KeepAlivePlayer:
+    player = _KeepAlivePlayer(ServerFactory(), IPv4Address('TCP', '127.0.0.1', 25565))
+    player.transport = _Transport()
+    player.keep_alives = []
+    player.protocol_version = 578
+    player.buff_type = Buffer1_14
+    player.protocol_mode = 'play'
+    player._update_dispatch()
+    return player
+
+
+class TestDispatch:
+
+    def test_table(self):
+        table = DispatchTable(578, v1_15_2, v1_15_2_Input)
+        assert table.names['init'] == ['handshake']
+        assert table.names['play'][15] == 'keep_alive'
+        assert table.idents['login']['login_success'] == 2
+        assert table.packet_idents[PacketType.TIME_UPDATE.index] == 79
+        assert table.encoders[PacketType.TIME_UPDATE.index] is v1_15_2.time_update
+        assert table.decoders[5] == (v1_15_2_Input.client_settings, PacketTypeInput.CLIENT_SETTINGS)
+        assert get_dispatch_table(578) is get_dispatch_table(578)
+
+    def test_encode(self):
+        encoded = list(NetworkController._encode(PacketType.TIME_UPDATE, {'game_time': 5, 'day_time': 6}))
+        assert encoded == [(578, b''.join(v1_15_2.time_update(Buffer1_14, game_time=5, day_time=6)))]
+
+    def test_unknown_version(self):
+        table = DispatchTable(1, v1_15_2, v1_15_2_Input)
+        assert table.names['play'] == []
+        assert table.encoders == [None] * len(PacketType)
+
+    def test_handlers(self):
+        player = _player()
+        player.data_received(_packet(15, struct.pack('>Q', 7)) + _packet(15, struct.pack('>Q', 8)))
+        assert player.keep_alives == [7, 8]
+        assert player.make_packet(PacketType.TIME_UPDATE, {'game_time': 1, 'day_time': 2}) == \
+            v1_15_2.time_update(Buffer1_14, game_time=1, day_time=2)
+
+    def test_decoder(self):
+        player = _player()
+        settings = Buffer1_14.pack_string('fr_FR') + struct.pack('b', 4) + Buffer1_14.pack_varint(1) + \
+            struct.pack('?B', False, 3) + Buffer1_14.pack_varint(0)
+        player.data_received(_packet(5, settings))
+        item = NetworkController.IN_QUEUE.get(timeout=5)
+        # Skip what network processes of other tests sent
+        while item['action'] is not ServerActionType.CLIENT_SETTINGS:
+            item = NetworkController.IN_QUEUE.get(timeout=5)
+        assert item['data']['locale'] == 'fr_FR'
+        assert item['data']['view_distance'] == 4
+
+    def test_unknown_packet(self):
+        player = _player()
+        player.data_received(_packet(200))
+        assert player.transport.closed
+        assert player.keep_alives == []
@@ -0,0 +1,72 @@
+import multiprocessing
+import threading
+
+from classes.network.IPC import Opcode, RingBuffer, pack_frame, unpack_frame
+from classes.network.PacketType import PacketType
+
+
+def _echo(ring: RingBuffer, out: multiprocessing.Queue):
+    frames = []
+    while len(frames) < 100:
+        frames.extend(ring.read())
+        ring.wait(0.1)
+    out.put([unpack_frame(frame)[3] for frame in frames])
+
+
+class TestIPC:
+
+    def test_frames(self):
+        frame = b''.join(pack_frame(Opcode.SEND_PACKET, PacketType.TIME_UPDATE, 578, (3, -1), b'body'))
+        assert unpack_frame(frame) == (Opcode.SEND_PACKET, PacketType.TIME_UPDATE, 578, (3, -1), b'body')
+        frame = b''.join(pack_frame(Opcode.INIT_PLAYER, targets=(7,), body=bytes(16)))
+        assert unpack_frame(frame) == (Opcode.INIT_PLAYER, None, 0, (7,), bytes(16))
+
+    def test_ring_wraps(self):
+        ring = RingBuffer(256)
+        try:
+            for i in range(50):
+                body = bytes([i]) * (i % 40)
+                assert ring.write(pack_frame(Opcode.BROADCAST, PacketType.KEEP_ALIVE, 578, (), body))
+                (frame,) = ring.read()
+                assert unpack_frame(frame)[4] == body
+            assert ring.pending() == 0
+        finally:
+            ring.close()
+
+    def test_ring_full(self):
+        ring = RingBuffer(64)
+        try:
+            assert ring.write([bytes(40)])
+            assert not ring.write([bytes(40)])
+            assert ring.dropped == 1
+            assert ring.read() == [bytes(40)]
+            assert ring.write([bytes(40)])
+        finally:
+            ring.close()
+
+    def test_ring_full_timeout(self):
+        ring = RingBuffer(64)
+        try:
+            assert ring.write([bytes(40)])
+            assert not ring.write([bytes(100)], timeout=1), 'Frames larger than the ring never fit'
+            reader = threading.Timer(0.05, ring.read)
+            reader.start()
+            assert ring.write([bytes(30)], timeout=5), 'The writer should wait for the reader'
+            reader.join()
+            assert ring.read() == [bytes(30)]
+        finally:
+            ring.close()
+
+    def test_other_process(self):
+        ring = RingBuffer(1 << 12)
+        out = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_echo, args=(ring, out))
+        process.start()
+        try:
+            for i in range(100):
+                while not ring.write(pack_frame(Opcode.SEND_PACKET, PacketType.CHAT_MESSAGE, 578, (i,), bytes(100))):
+                    pass
+            assert out.get(timeout=10) == [(i,) for i in range(100)]
+        finally:
+            process.join(10)
+            ring.close()
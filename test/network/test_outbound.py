@@ -0,0 +1,97 @@
+from concurrent.futures import Future
+
+import pytest
+
+from classes.BasicClasses import Chunk
+from classes.ChunkStreamer import ChunkStreamer
+from classes.network.Outbound import OutboundBuffer
+from classes.network.PacketType import PacketType
+from classes.utils.Vector import Vector3D
+
+
+class _Player:
+    entity_id = 1
+    display_name = 'Steve'
+    entity_location = Vector3D(8, 72, 8)
+    view_distance = 3
+
+
+class _Loader:
+    def load(self, chunk_x, chunk_z):
+        future = Future()
+        future.set_result(Chunk(chunk_x, 0, chunk_z, None, None))
+        return future
+
+
+class TestOutboundBuffer:
+
+    def test_coalesced_writes(self):
+        buffer = OutboundBuffer()
+        written = []
+        assert buffer.flush(written.append) == 0
+        for i in range(5):
+            buffer.append(bytes([i]) * 3)
+        assert buffer.flush(written.append) == 15
+        assert written == [b'\x00\x00\x00\x01\x01\x01\x02\x02\x02\x03\x03\x03\x04\x04\x04']
+        assert (buffer.size, len(buffer), buffer.writes) == (0, 0, 1)
+
+    def test_watermarks(self):
+        buffer = OutboundBuffer(high_watermark=100, low_watermark=40, max_write=30)
+        written = []
+        for _ in range(11):
+            buffer.append(bytes(10))
+        assert not buffer.writable
+        buffer.flush(written.append)
+        assert (buffer.size, buffer.writable) == (80, False)
+        buffer.flush(written.append)
+        buffer.flush(written.append)
+        assert (buffer.size, buffer.writable) == (20, True)
+        assert [len(data) for data in written] == [30, 30, 30]
+
+    def test_large_frame(self):
+        buffer = OutboundBuffer(max_write=4)
+        buffer.append(bytes(10))
+        buffer.append(bytes(2))
+        written = []
+        buffer.flush(written.append)
+        assert written == [bytes(10)]
+
+    def test_paused(self):
+        buffer = OutboundBuffer()
+        buffer.append(b'data')
+        buffer.pause()
+        written = []
+        assert buffer.flush(written.append) == 0
+        buffer.resume()
+        assert buffer.flush(written.append) == 4
+
+    def test_invalid_watermarks(self):
+        with pytest.raises(ValueError):
+            OutboundBuffer(high_watermark=10, low_watermark=20)
+
+    def test_chunk_backpressure(self):
+        # A slow client: 10 bytes per chunk, 30 bytes written per flush
+        streamer = ChunkStreamer(_Player(), _Loader(), chunks_per_tick=4, max_pending=100)
+        buffer = OutboundBuffer(high_watermark=100, low_watermark=40, max_write=30,
+                                on_writable=lambda writable: setattr(streamer, 'writable', writable))
+        chunks = []
+
+        def send(packet_type, data):
+            if packet_type is PacketType.CHUNK_DATA:
+                chunks.append(data['chunk'])
+                buffer.append(bytes(10))
+            return True
+        streamer.send = send
+        for _ in range(3):
+            streamer.tick()
+        assert len(chunks) == 11 and not streamer.writable, 'Chunks should stop above the high watermark'
+        streamer.tick()
+        assert len(chunks) == 11
+        buffer.flush(bytes)
+        buffer.flush(bytes)
+        streamer.tick()
+        assert len(chunks) == 11 and buffer.size == 50, 'Chunks should wait until the low watermark'
+        buffer.flush(bytes)
+        assert streamer.writable
+        streamer.tick()
+        assert len(chunks) == 15
@@ -0,0 +1,74 @@
+import threading
+from uuid import uuid4
+
+from classes.network.Connection import NetworkController
+from classes.network.IPC import Opcode, RingBuffer, unpack_frame
+from classes.network.PacketType import PacketType
+
+
+def _read(ring: RingBuffer):
+    return [unpack_frame(frame) for frame in ring.read()]
+
+
+class TestShards:
+
+    def setup_method(self):
+        NetworkController.OUT_RINGS = [RingBuffer(1 << 16), RingBuffer(1 << 16)]
+        NetworkController._uuid_shards = {}
+        NetworkController._entity_shards = {}
+
+    def teardown_method(self):
+        for ring in NetworkController.OUT_RINGS:
+            ring.close()
+        NetworkController.OUT_RINGS = []
+
+    def test_init_player(self):
+        uuid = uuid4()
+        NetworkController._uuid_shards[str(uuid)] = 1
+        NetworkController.init_player(uuid, 7)
+        assert NetworkController._entity_shards == {7: 1}
+        assert _read(NetworkController.OUT_RINGS[0]) == []
+        assert _read(NetworkController.OUT_RINGS[1]) == [(Opcode.INIT_PLAYER, None, 0, (7,), uuid.bytes)]
+        NetworkController.destroy_player(uuid, 7)
+        assert NetworkController._entity_shards == {}
+        assert _read(NetworkController.OUT_RINGS[0]) == []
+        assert [frame[0] for frame in _read(NetworkController.OUT_RINGS[1])] == [Opcode.DESTROY_PLAYER]
+
+    def test_routing(self):
+        NetworkController._entity_shards = {1: 0, 2: 1, 3: 1}
+        NetworkController.send_packet_players((1, 2, 3), PacketType.TIME_UPDATE, {'game_time': 1, 'day_time': 2})
+        first, second = _read(NetworkController.OUT_RINGS[0]), _read(NetworkController.OUT_RINGS[1])
+        assert [frame[3] for frame in first] == [(1,)]
+        assert [frame[3] for frame in second] == [(2, 3)]
+        assert first[0][4] == second[0][4]
+
+    def test_broadcast(self):
+        NetworkController.send_packet(PacketType.TIME_UPDATE, game_time=1, day_time=2)
+        for ring in NetworkController.OUT_RINGS:
+            assert [frame[0] for frame in _read(ring)] == [Opcode.BROADCAST]
+
+    def test_unknown_player(self):
+        # Players whose network process isn't known yet are sent to every process
+        NetworkController.send_packet_player(9, PacketType.TIME_UPDATE, {'game_time': 1, 'day_time': 2})
+        for ring in NetworkController.OUT_RINGS:
+            assert [frame[3] for frame in _read(ring)] == [(9,)]
+
+    def test_full_ring(self):
+        NetworkController._entity_shards = {1: 0}
+        ring = NetworkController.OUT_RINGS[0]
+        body = {'message': 'x' * 1000}
+        while NetworkController.send_packet_player(1, PacketType.CHAT_MESSAGE, body):
+            pass
+        assert not NetworkController.send_packet_player(1, PacketType.CHAT_MESSAGE, body), 'Packets tell the caller'
+        while ring.write([bytes(1)]):
+            pass
+        # Control frames wait for the network process to read
+        NetworkController._uuid_shards = {}
+        uuid = uuid4()
+        read = []
+        reader = threading.Timer(0.05, lambda: read.extend(ring.read()))
+        reader.start()
+        NetworkController.destroy_player(uuid, 1)
+        reader.join()
+        assert read, 'The ring should have been full'
+        assert [frame[0] for frame in _read(ring)] == [Opcode.DESTROY_PLAYER]
@@ -0,0 +1,111 @@
+import random
+
+import numpy as np
+import pytest
+from quarry.types.buffer import Buffer1_14, BufferUnderrun
+
+from classes.network.VarInt import BATCH_MIN, pack_varint, pack_varints, pack_varlong, pack_varlongs, read_varint, \
+    unpack_varint, unpack_varints, unpack_varlong, unpack_varlongs, varint_size, write_varint
+
+BOUNDARIES = [0, 1, 127, 128, 16383, 16384, 2097151, 2097152, 268435455, 268435456, 2 ** 31 - 1, -1, -2 ** 31]
+
+
+def _varints(rng: random.Random, count: int) -> [int]:
+    """ Random varints, of every length """
+    return [rng.randrange(-1 << rng.randrange(1, 32), 1 << rng.randrange(1, 32)) for _ in range(count)]
+
+
+def _quarry_unpack(data: bytes, max_bits: int = 32):
+    """ The value & the position after it read by quarry, or the type of its error """
+    buff = Buffer1_14(data)
+    try:
+        return buff.unpack_varint(max_bits=max_bits), buff.pos
+    except (BufferUnderrun, ValueError) as e:
+        return type(e)
+
+
+def _unpack(data: bytes, max_bits: int = 32):
+    try:
+        return unpack_varint(data, 0, max_bits)
+    except (BufferUnderrun, ValueError) as e:
+        return type(e)
+
+
+class TestVarInt:
+
+    def test_pack(self):
+        rng = random.Random(0)
+        for value in BOUNDARIES + _varints(rng, 20000):
+            expected = Buffer1_14.pack_varint(value)
+            assert pack_varint(value) == expected
+            assert varint_size(value) == len(expected)
+            buf = bytearray(5)
+            assert write_varint(buf, 0, value) == len(expected)
+            assert bytes(buf[:len(expected)]) == expected
+        for value in (2 ** 31, -2 ** 31 - 1):
+            with pytest.raises(ValueError):
+                pack_varint(value)
+            with pytest.raises(ValueError):
+                varint_size(value)
+        assert pack_varint(2 ** 40, max_bits=64) == Buffer1_14.pack_varint(2 ** 40, max_bits=64)
+
+    def test_unpack(self):
+        rng = random.Random(1)
+        for value in BOUNDARIES + _varints(rng, 20000):
+            data = Buffer1_14.pack_varint(value) + b'\x05'
+            assert unpack_varint(data) == (value, len(data) - 1)
+            buff = Buffer1_14(data)
+            assert read_varint(buff) == value
+            assert buff.read() == b'\x05'
+
+    def test_fuzz_unpack(self):
+        # Random bytes, biased towards continuation bits: same values, positions & errors as quarry
+        rng = random.Random(2)
+        for _ in range(20000):
+            data = bytes(rng.randrange(256) | (0x80 if rng.random() < 0.7 else 0) for _ in range(rng.randrange(12)))
+            assert _unpack(data) == _quarry_unpack(data)
+            assert _unpack(data, 16) == _quarry_unpack(data, 16)
+
+    def test_varlong(self):
+        rng = random.Random(3)
+        for value in [0, 300, 2 ** 63 - 1] + [rng.randrange(1 << rng.randrange(1, 64)) for _ in range(5000)]:
+            # quarry packs the positive varlongs right
+            assert pack_varlong(value) == Buffer1_14.pack_varint(value, max_bits=64)
+            assert unpack_varlong(pack_varlong(value) + b'\x00') == (value, len(pack_varlong(value)))
+        for value in (-1, -2 ** 63, -rng.randrange(2 ** 62)):
+            data = pack_varlong(value)
+            assert len(data) == 10
+            assert unpack_varlong(data) == (value, 10)
+        with pytest.raises(ValueError):
+            pack_varlong(2 ** 63)
+
+    def test_batch(self):
+        rng = random.Random(4)
+        for count in (0, 1, BATCH_MIN - 1, BATCH_MIN, 4096):
+            values = _varints(rng, count)
+            data = b''.join(Buffer1_14.pack_varint(value) for value in values)
+            assert pack_varints(values) == data
+            assert pack_varints(np.array(values, dtype=np.int32)) == data
+            decoded, position = unpack_varints(b'\x01' + data + b'\xff', count, 1)
+            assert decoded.tolist() == values
+            assert position == len(data) + 1
+            longs = [rng.randrange(-1 << 63, 1 << 63) for _ in range(count)]
+            data = b''.join(pack_varlong(value) for value in longs)
+            assert pack_varlongs(longs) == data
+            decoded, position = unpack_varlongs(data, count)
+            assert decoded.tolist() == longs
+            assert position == len(data)
+
+    def test_batch_errors(self):
+        for count in (1, BATCH_MIN):
+            data = pack_varints([300] * count)
+            with pytest.raises(BufferUnderrun):
+                unpack_varints(data[:-1], count)
+            # 6 bytes varints
+            with pytest.raises(ValueError):
+                unpack_varints(b'\x80\x80\x80\x80\x80\x00' * count, count)
+            # More than 32 bits
+            with pytest.raises(ValueError):
+                unpack_varints(b'\xff\xff\xff\xff\x1f' * count, count)
+            with pytest.raises(ValueError):
+                pack_varints([2 ** 31] * count)
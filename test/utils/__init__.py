@@ -1,3 +1,7 @@
 from . import test_util_color
 from . import test_util_version
 from . import test_vector
+from . import test_profiler
+from . import test_tick_clock
+from . import test_scheduler
+from . import test_off_tick
@@ -0,0 +1,155 @@
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+
+import pytest
+
+from classes.utils.Scheduler import SchedulerManager
+
+
+class _MultiProcessing:
+    """ Runs the work on a thread, as MultiProcessing.submit would on a worker """
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, func, args: list, callback=None, **kwargs) -> Future:
+        self.submitted += 1
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+        threading.Thread(target=run).start()
+        return future
+
+
+class _Server:
+    tick = 0
+
+    def __init__(self):
+        self.multi_processing = _MultiProcessing()
+
+
+def _run_until(manager: SchedulerManager, server: _Server, future: Future, max_ticks=200):
+    for _ in range(max_ticks):
+        if future.done():
+            return
+        server.tick += 1
+        manager.tick(server.tick)
+        time.sleep(0.005)
+    raise AssertionError('Off tick task not done')
+
+
+class TestOffTick:
+
+    def test_result_on_tick_thread(self):
+        server = _Server()
+        manager = SchedulerManager(server)
+        threads = []
+        calls = []
+        future = manager.run_off_tick(lambda a, b: (threading.get_ident(), a + b), (1,), {'b': 2},
+                                      callback=lambda s, f: calls.append((s, f.result(), threading.get_ident())))
+        future.add_done_callback(lambda f: threads.append(threading.get_ident()))
+        assert not future.done()
+        _run_until(manager, server, future)
+        worker, result = future.result()
+        assert result == 3
+        assert worker != threading.get_ident()
+        assert threads == [threading.get_ident()]
+        assert calls == [(server, (worker, 3), threading.get_ident())]
+        stats = manager.async_stats()
+        assert stats['completed'] == 1 and stats['pending'] == 0
+        manager.stop()
+
+    def test_exception(self):
+        server = _Server()
+        manager = SchedulerManager(server)
+
+        def fail():
+            raise ValueError('boom')
+        future = manager.run_off_tick(fail)
+        _run_until(manager, server, future)
+        with pytest.raises(ValueError):
+            future.result()
+        assert manager.async_stats()['failed'] == 1
+        manager.stop()
+
+    def test_timeout(self):
+        server = _Server()
+        manager = SchedulerManager(server)
+        release = threading.Event()
+        calls = []
+        future = manager.run_off_tick(release.wait, callback=lambda s, f: calls.append(server.tick), timeout=3)
+        _run_until(manager, server, future)
+        assert server.tick == 3
+        assert isinstance(future.exception(), TimeoutError)
+        assert calls == [3]
+        # The late result is dropped
+        release.set()
+        time.sleep(0.05)
+        manager.tick(4)
+        assert calls == [3]
+        stats = manager.async_stats()
+        assert stats['timed_out'] == 1 and stats['completed'] == 0 and stats['pending'] == 0
+        assert len(manager) == 0
+        manager.stop()
+
+    def test_done_before_timeout(self):
+        server = _Server()
+        manager = SchedulerManager(server)
+        future = manager.run_off_tick(lambda: 'done', timeout=50)
+        _run_until(manager, server, future)
+        assert future.result() == 'done'
+        # The timeout task is cancelled
+        assert len(manager) == 0
+        manager.stop()
+
+    def test_schedule_async(self):
+        server = _Server()
+        manager = SchedulerManager(server)
+        calls = []
+        future = manager.schedule_async(3, lambda: server.tick, callback=lambda s, f: calls.append(f.result()))
+        _run_until(manager, server, future)
+        # Started at tick 3, delivered at a later tick
+        assert future.result() == 3
+        assert server.tick > 3
+        assert calls == [3]
+        manager.stop()
+
+    def test_processes(self):
+        server = _Server()
+        manager = SchedulerManager(server)
+        future = manager.run_off_tick(pow, (2, 10), processes=True)
+        _run_until(manager, server, future)
+        assert future.result() == 1024
+        assert server.multi_processing.submitted == 1
+
+    def test_queue_wait(self):
+        server = _Server()
+        manager = SchedulerManager(server, off_tick_threads=1)
+        # The second task waits for the first one on the only thread
+        futures = [manager.run_off_tick(time.sleep, (0.05,)) for _ in range(2)]
+        _run_until(manager, server, futures[1])
+        _run_until(manager, server, futures[0])
+        stats = manager.async_stats()
+        assert stats['completed'] == 2
+        assert stats['queue_wait_p99_ms'] >= 40
+        assert stats['run_ms'] >= 40
+        manager.stop()
+
+    def test_stop_cancels_waiting_work(self):
+        server = _Server()
+        manager = SchedulerManager(server, off_tick_threads=1)
+        release = threading.Event()
+        running = manager.run_off_tick(release.wait, (5,))
+        waiting = manager.run_off_tick(lambda: 'never')
+        manager.stop()
+        release.set()
+        _run_until(manager, server, running)
+        _run_until(manager, server, waiting)
+        assert running.result() is True
+        with pytest.raises(CancelledError):
+            waiting.result()
@@ -0,0 +1,93 @@
+import logging
+import time
+
+from classes.utils.Profiler import TickProfiler, percentile
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def _tick(profiler: TickProfiler, clock: _Clock, phases: dict, period=0.0):
+    profiler.begin_tick()
+    for phase, seconds in phases.items():
+        clock.advance(seconds)
+        profiler.mark(phase)
+    duration = profiler.end_tick()
+    clock.advance(max(0.0, period - duration))
+    return duration
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestProfiler:
+
+    def test_percentile(self):
+        assert percentile([], 0.5) == 0.0
+        assert percentile(list(range(100)), 0.5) == 50
+        assert percentile(list(range(100)), 0.99) == 99
+        assert percentile([3.0], 0.95) == 3.0
+
+    def test_report(self):
+        clock = _Clock()
+        profiler = TickProfiler(window=100, clock=clock)
+        for tick in range(100):
+            _tick(profiler, clock, {'network': 0.002, 'entities': 0.001 if tick < 90 else 0.011}, period=0.05)
+        report = profiler.report()
+        assert report['ticks'] == 100
+        assert abs(report['tps'] - 20) < 1e-6
+        assert abs(report['mspt'] - 4.0) < 1e-6
+        assert abs(report['phases']['network']['p99'] - 2.0) < 1e-6
+        assert abs(report['phases']['entities']['p50'] - 1.0) < 1e-6
+        assert abs(report['phases']['entities']['p95'] - 11.0) < 1e-6
+        assert abs(report['p99'] - 13.0) < 1e-6
+        assert report['slow_ticks'] == 0
+
+    def test_rolling_window(self):
+        clock = _Clock()
+        profiler = TickProfiler(window=10, clock=clock)
+        for _ in range(10):
+            _tick(profiler, clock, {'network': 0.030}, period=0.05)
+        for _ in range(10):
+            _tick(profiler, clock, {'players': 0.005}, period=0.05)
+        report = profiler.report()
+        assert report['ticks'] == 10
+        assert abs(report['mspt'] - 5.0) < 1e-6
+        assert report['phases']['network']['p99'] == 0.0
+        assert abs(report['tps'] - 20) < 1e-6
+
+    def test_slow_tick(self, caplog):
+        clock = _Clock()
+        profiler = TickProfiler(slow_tick=0.05, clock=clock)
+        with caplog.at_level(logging.WARNING):
+            _tick(profiler, clock, {'network': 0.01, 'entities': 0.06})
+            _tick(profiler, clock, {'entities': 0.06})
+        assert profiler.slow_ticks == 2
+        # The second slow tick is within SLOW_LOG_INTERVAL of the first one
+        assert len(caplog.records) == 1
+        assert 'entities 60.0 ms, network 10.0 ms' in caplog.records[0].getMessage()
+
+    def test_sampling(self):
+        profiler = TickProfiler(slow_tick=0.02, sampling=True, sample_interval=0.001)
+        profiler.start()
+        try:
+            profiler.begin_tick()
+            _busy(0.06)
+            profiler.mark('busy')
+            profiler.end_tick()
+        finally:
+            profiler.stop()
+        tick, duration, phases, stacks = profiler.slow_profiles[-1]
+        assert duration > 0.02 and 'busy' in phases
+        assert stacks and '_busy' in stacks[0][0].rsplit(';', 1)[-1]
@@ -0,0 +1,119 @@
+import heapq
+import random
+
+from classes.utils.Scheduler import SchedulerManager
+
+
+def _record(runs: list):
+    def task(server, name):
+        runs.append((server.tick, name))
+    return task
+
+
+class _Server:
+    tick = 0
+
+
+def _run(manager: SchedulerManager, server: _Server, ticks: int):
+    for _ in range(ticks):
+        server.tick += 1
+        manager.tick(server.tick)
+
+
+class TestScheduler:
+
+    def test_order(self):
+        server = _Server()
+        manager = SchedulerManager(server)
+        runs = []
+        manager.schedule_after(2, _record(runs), name='b')
+        manager.schedule(_record(runs), name='a')
+        manager.schedule_after(2, _record(runs), name='c')
+        manager.schedule_after(0, _record(runs), name='d')
+        assert len(manager) == 4
+        _run(manager, server, 3)
+        assert runs == [(1, 'a'), (1, 'd'), (2, 'b'), (2, 'c')]
+        assert len(manager) == 0
+
+    def test_cancel_in_same_tick(self):
+        server = _Server()
+        manager = SchedulerManager(server)
+        runs = []
+        cancelled = []
+        record = _record(runs)
+
+        def first(server, name):
+            record(server, name)
+            cancelled.append(second.cancel())
+            cancelled.append(third.cancel())
+        manager.schedule_after(5, first, name='a')
+        second = manager.schedule_after(5, record, name='b')
+        third = manager.schedule_repeating(5, 2, record, name='c')
+        _run(manager, server, 10)
+        assert runs == [(5, 'a')]
+        assert cancelled == [True, True]
+        assert len(manager) == 0
+
+    def test_far_ticks(self):
+        # Every level of the wheel, in the same order as a heap of (tick, id)
+        server = _Server()
+        manager = SchedulerManager(server)
+        rng = random.Random(0)
+        runs = []
+        expected = []
+        for index in range(3000):
+            after = rng.choice([1, 255, 256, 257, 16383, 16384, 70000, rng.randrange(1, 300000)])
+            manager.schedule_after(after, _record(runs), name=index)
+            heapq.heappush(expected, (after, index))
+        _run(manager, server, 300000)
+        assert runs == [heapq.heappop(expected) for _ in range(len(expected))]
+
+    def test_very_far(self):
+        server = _Server()
+        manager = SchedulerManager(server, current_tick=(1 << 32) - 10)
+        server.tick = manager.current_tick
+        runs = []
+        task = manager.schedule_after(1 << 33, _record(runs), name='far')
+        manager.schedule_after(20, _record(runs), name='near')
+        _run(manager, server, 30)
+        assert runs == [((1 << 32) + 10, 'near')]
+        assert task.slot is not None and len(manager) == 1
+
+    def test_repeating_and_cancel(self):
+        server = _Server()
+        manager = SchedulerManager(server)
+        runs = []
+        repeating = manager.schedule_repeating(3, 5, _record(runs), name='r')
+        cancelled = manager.schedule_after(4, _record(runs), name='x')
+        assert cancelled.cancel()
+        assert not cancelled.cancel()
+        _run(manager, server, 20)
+        assert runs == [(3, 'r'), (8, 'r'), (13, 'r'), (18, 'r')]
+        assert repeating.cancel()
+        _run(manager, server, 20)
+        assert len(runs) == 4 and len(manager) == 0
+
+    def test_cancel_while_running(self):
+        server = _Server()
+        manager = SchedulerManager(server)
+        runs = []
+
+        def task(server, name):
+            runs.append(server.tick)
+            if len(runs) == 2:
+                handle.cancel()
+        handle = manager.schedule_repeating(1, 1, task, name='self')
+        _run(manager, server, 5)
+        assert runs == [1, 2]
+
+    def test_failing_task(self):
+        server = _Server()
+        manager = SchedulerManager(server)
+        runs = []
+
+        def fail(server):
+            raise ValueError('Task failure')
+        manager.schedule(fail)
+        manager.schedule(_record(runs), name='ok')
+        _run(manager, server, 1)
+        assert runs == [(1, 'ok')]
@@ -0,0 +1,93 @@
+import time
+
+from classes.utils.TickClock import CatchUp, TickClock
+
+
+class _Time:
+    """ A clock & a sleep advancing it, sleeps oversleep by oversleep seconds """
+    def __init__(self, oversleep=0.0):
+        self.now = 100.0
+        self.oversleep = oversleep
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds + (self.oversleep if seconds > 0 else 1e-4)
+
+
+def _run(tick_clock: TickClock, fake: _Time, durations: [float]) -> [float]:
+    """ Runs ticks taking the given durations, returns when each one started """
+    starts = []
+    for duration in durations:
+        tick_clock.wait()
+        starts.append(fake.now)
+        fake.now += duration
+    return starts
+
+
+def _clock(fake: _Time, catch_up: CatchUp, **kwargs) -> TickClock:
+    return TickClock(catch_up=catch_up, clock=fake.clock, sleep=fake.sleep, **kwargs)
+
+
+class TestTickClock:
+
+    def test_fixed_deadlines(self):
+        # Sleeps oversleeping by 0.5 ms don't delay the schedule: they wake up 1 ms early & spin
+        fake = _Time(oversleep=0.0005)
+        starts = _run(_clock(fake, CatchUp.BURST), fake, [0.01, 0.03, 0.049] * 20)
+        for n, start in enumerate(starts):
+            assert 100.0 + n * 0.05 - 1e-9 <= start < 100.0 + n * 0.05 + 0.001
+
+    def test_burst(self):
+        fake = _Time()
+        tick_clock = _clock(fake, CatchUp.BURST)
+        starts = _run(tick_clock, fake, [0.16, 0.01])
+        assert round(tick_clock.lag, 3) == 0.11
+        starts += _run(tick_clock, fake, [0.01] * 19)
+        # The 3 ticks due during the long one run back to back, then the schedule is kept
+        assert [round(start - 100.0, 3) for start in starts[1:5]] == [0.16, 0.17, 0.18, 0.2]
+        assert abs(starts[-1] - (100.0 + 20 * 0.05)) < 0.001
+        assert tick_clock.lost_ticks == 0
+        assert tick_clock.lag == 0.0
+
+    def test_burst_limit(self):
+        fake = _Time()
+        tick_clock = _clock(fake, CatchUp.BURST, max_burst=4)
+        starts = _run(tick_clock, fake, [0.26, 0.01, 0.01])
+        assert tick_clock.lost_ticks == 4
+        assert round(starts[2] - 100.0, 3) == 0.3
+
+    def test_skip(self):
+        fake = _Time()
+        tick_clock = _clock(fake, CatchUp.SKIP)
+        starts = _run(tick_clock, fake, [0.16, 0.01, 0.01])
+        assert tick_clock.lost_ticks == 2
+        # Back on the schedule: 0.2 is the tick due after 0.16
+        assert [round(start - 100.0, 3) for start in starts] == [0.0, 0.16, 0.2]
+
+    def test_dilate(self):
+        fake = _Time()
+        tick_clock = _clock(fake, CatchUp.DILATE)
+        starts = _run(tick_clock, fake, [0.16, 0.01, 0.01])
+        assert round(tick_clock.lost_ticks, 3) == 2.2
+        assert [round(start - 100.0, 3) for start in starts] == [0.0, 0.16, 0.21]
+
+    def test_real_tps(self):
+        fake = _Time()
+        tick_clock = _clock(fake, CatchUp.SKIP)
+        assert tick_clock.real_tps() == 0.0
+        _run(tick_clock, fake, [0.01] * 10 + [0.5] + [0.01] * 9)
+        fake.now = tick_clock.deadline
+        assert round(tick_clock.real_tps(), 3) == round(20 / (fake.now - 100.0), 3)
+        assert tick_clock.lost_ticks == 9
+        assert tick_clock.behind() == 0.0
+
+    def test_real_sleep(self):
+        tick_clock = TickClock(tps=200)
+        start = time.perf_counter()
+        for _ in range(20):
+            tick_clock.wait()
+        assert abs(time.perf_counter() - start - 19 * 0.005) < 0.02
@@ -0,0 +1,6 @@
+from . import test_chunk
+from . import test_noise
+from . import test_region
+from . import test_chunk_cache
+from . import test_features
+from . import test_chunk_streamer
@@ -0,0 +1,139 @@
+import pytest
+
+import random
+
+from classes.BasicClasses import Block, BlockEntity, Chunk, ChunkSection, Heightmap
+from classes.Exceptions import OutOfBoundsError
+from classes.blocks.Materials import Material
+
+
+class TestChunk:
+
+    def test_default_chunk(self):
+        chunk = Chunk(0, 0, 0, None, None)
+        assert chunk.get_material(3, 0, 7) is Material.BEDROCK, 'y=0 should be bedrock'
+        assert chunk.get_material(3, 1, 7) is Material.AIR, 'y=1 should be air'
+        assert chunk.get_block(3, 0, 7).get_material() is Material.BEDROCK
+
+    def test_set_block(self):
+        chunk = Chunk(0, 0, 0, [], None, 16, 256)
+        assert len(chunk.sections) == 16, 'a 256 blocks tall chunk should have 16 sections'
+        chunk.set_block(1, 70, 2, Material.STONE)
+        chunk.set_block(1, 71, 2, Block(1, 71, 2, Material.DIRT, {}))
+        assert chunk.get_material(1, 70, 2) is Material.STONE
+        assert chunk[1, 71, 2].get_material() is Material.DIRT
+        assert not chunk.blocks, 'Blocks without data should not be kept'
+        assert chunk.sections[4].non_air == 2
+
+    def test_block_data(self):
+        chunk = Chunk(0, 0, 0, [], None)
+        entity = BlockEntity(4, 5, 6, Material.OAK_PLANKS, None, {'id': 'sign'})
+        chunk.set_block(4, 5, 6, entity)
+        assert chunk.get_block(4, 5, 6) is entity, 'BlockEntities should be kept'
+        chunk.set_block(4, 5, 6, Material.AIR)
+        assert chunk.get_block(4, 5, 6) is not entity, 'Overwritten BlockEntities should be dropped'
+        assert chunk.sections[0].is_empty()
+
+    def test_out_of_bounds(self):
+        chunk = Chunk(0, 0, 0, [], None)
+        with pytest.raises(OutOfBoundsError):
+            chunk.set_block(16, 0, 0, Material.STONE)
+        with pytest.raises(OutOfBoundsError):
+            chunk.set_block(0, -1, 0, Material.STONE)
+        # x=16 would be the index of the cell at 0, y, z + 1
+        chunk.set_block(0, 5, 1, BlockEntity(0, 5, 1, Material.OAK_PLANKS, None, {'id': 'sign'}))
+        with pytest.raises(OutOfBoundsError):
+            chunk.get_block(16, 5, 0)
+        with pytest.raises(OutOfBoundsError):
+            chunk.get_block(0, 5, -16)
+
+
+class TestChunkSection:
+
+    def test_palette(self):
+        section = ChunkSection()
+        section.set_material(0, Material.STONE)
+        section.set_material(1, Material.STONE)
+        assert section.palette == [Material.AIR, Material.STONE], 'Materials should only be added once'
+        assert isinstance(section.indices, bytearray)
+
+    def test_palette_growth(self):
+        section = ChunkSection()
+        # Force the palette over a byte, Materials are only used as keys here
+        for i in range(300):
+            section._add_to_palette(i)
+        section.set_material(10, Material.DIRT)
+        assert not isinstance(section.indices, bytearray), 'Indices should be widened'
+        assert len(section.indices) == 4096, 'Widened indices should keep one entry per cell'
+        assert section.get_material(10) is Material.DIRT
+        assert section.get_material(11) is Material.AIR
+
+    def test_set_materials(self):
+        section = ChunkSection()
+        section.set_material(5, Material.DIRT)
+        section.set_materials({5: Material.STONE, 6: Material.STONE, 7: Material.COAL_ORE})
+        assert section.palette == [Material.AIR, Material.STONE, Material.COAL_ORE], 'Unused Materials should be dropped'
+        assert section.non_air == 3
+        assert [section.get_material(i) for i in (4, 5, 6, 7)] == [Material.AIR, Material.STONE, Material.STONE,
+                                                                   Material.COAL_ORE]
+
+    def test_set_blocks(self):
+        chunk = Chunk(0, 0, 0, None, None, 16, 64)
+        entity = BlockEntity(1, 20, 1, Material.OAK_PLANKS, None, {'id': 'sign'})
+        chunk.set_blocks({(0, 0, 0): Material.STONE, (1, 20, 1): entity, (2, 40, 2): Material.DIRT})
+        assert chunk.get_material(0, 0, 0) is Material.STONE
+        assert chunk.get_block(1, 20, 1) is entity
+        assert chunk.get_material(2, 40, 2) is Material.DIRT
+        assert [section.non_air for section in chunk.sections] == [256, 1, 1, 0]
+
+
+class TestChunkSerialization:
+
+    def test_round_trip(self):
+        chunk = Chunk(3, 0, -2, None, None, 16, 64)
+        chunk.set_block(0, 17, 0, Material.STONE)
+        chunk.set_block(15, 63, 15, Material.COAL_ORE)
+        chunk.set_block(4, 5, 6, BlockEntity(4, 5, 6, Material.OAK_PLANKS, {'facing': 'north'}, {'id': 'sign'}))
+        loaded = Chunk.from_bytes(chunk.to_bytes())
+        assert (loaded.xPos, loaded.yPos, loaded.zPos, loaded.height) == (3, 0, -2, 64)
+        for x, y, z in ((0, 0, 0), (0, 17, 0), (15, 63, 15), (8, 40, 8)):
+            assert loaded.get_material(x, y, z) is chunk.get_material(x, y, z)
+        entity = loaded.get_block(4, 5, 6)
+        assert isinstance(entity, BlockEntity)
+        assert entity.blockData == {'facing': 'north'} and entity.blockEntityData == {'id': 'sign'}
+        assert [section.non_air for section in loaded.sections] == [section.non_air for section in chunk.sections]
+
+    def test_empty_sections(self):
+        chunk = Chunk(0, 0, 0, [], None, 16, 256)
+        heightmaps = sum(2 * len(heights) for heights in chunk.heightmaps.values())
+        assert len(chunk.to_bytes()) - heightmaps < 200, 'Empty sections should not store their blocks'
+
+
+class TestHeightmaps:
+
+    def test_set_block(self):
+        chunk = Chunk(0, 0, 0, None, None, 16, 256)
+        assert chunk.get_height(Heightmap.WORLD_SURFACE, 3, 4) == 1, 'Bedrock is at y=0'
+        chunk.set_block(3, 40, 4, Material.STONE)
+        chunk.set_block(3, 41, 4, Material.GRASS)
+        assert chunk.get_height(Heightmap.WORLD_SURFACE, 3, 4) == 42
+        assert chunk.get_height(Heightmap.MOTION_BLOCKING, 3, 4) == 41, 'Grass does not block motion'
+        assert chunk.get_height(Heightmap.OCEAN_FLOOR, 3, 4) == 41
+        chunk.set_block(3, 41, 4, Material.AIR)
+        chunk.set_block(3, 40, 4, Material.AIR)
+        assert chunk.get_height(Heightmap.WORLD_SURFACE, 3, 4) == 1, 'Columns should be scanned down'
+        assert chunk.get_height(Heightmap.WORLD_SURFACE, 4, 3) == 1
+
+    def test_incremental_matches_full(self):
+        chunk = Chunk(0, 0, 0, None, None, 16, 64)
+        rng = random.Random(5)
+        materials = [Material.AIR, Material.STONE, Material.GRASS]
+        for _ in range(2000):
+            chunk.set_block(rng.randrange(4), rng.randrange(64), rng.randrange(4), rng.choice(materials))
+        chunk.set_blocks({(rng.randrange(4), rng.randrange(64), rng.randrange(4)): rng.choice(materials)
+                          for _ in range(200)})
+        incremental = {heightmap: list(heights) for heightmap, heights in chunk.heightmaps.items()}
+        chunk.update_heightmaps()
+        assert incremental == {heightmap: list(heights) for heightmap, heights in chunk.heightmaps.items()}
+        loaded = Chunk.from_bytes(chunk.to_bytes())
+        assert incremental == {heightmap: list(heights) for heightmap, heights in loaded.heightmaps.items()}
@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from classes.BasicClasses import Chunk
+from classes.ChunkCache import ChunkCache
+from classes.Exceptions import ChunkNotFound
+from classes.RegionFile import RegionStorage
+from classes.blocks.Materials import Material
+from classes.utils.Vector import Vector3D
+
+
+class _Player:
+    def __init__(self, x, z, view_distance):
+        self.entity_location = Vector3D(x, 72, z)
+        self.view_distance = view_distance
+
+
+class TestChunkCache:
+
+    def test_hits_and_misses(self, tmp_path):
+        storage = RegionStorage(str(tmp_path))
+        storage.save_chunk(0, 0, Chunk(0, 0, 0, None, None).to_bytes())
+        cache = ChunkCache(storage)
+        with pytest.raises(ChunkNotFound):
+            cache.get_chunk(1, 0)
+        chunk = cache.get_chunk(0, 0)
+        assert cache.get_chunk(0, 0) is chunk
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['chunks']) == (1, 2, 1)
+        storage.close()
+
+    def test_lru_eviction_writes_dirty_chunks(self, tmp_path):
+        storage = RegionStorage(str(tmp_path))
+        cache = ChunkCache(storage, max_chunks=2)
+        for x in range(3):
+            chunk = Chunk(x, 0, 0, None, None)
+            chunk.set_block(0, 5, 0, Material.STONE)
+            cache.put_chunk(chunk)
+        assert cache.evictions == 1 and cache.writes == 1, 'The least recently used chunk should be written & evicted'
+        assert cache.stats()['dirty'] == 2
+        assert Chunk.from_bytes(storage.load_chunk(0, 0)).get_material(0, 5, 0) is Material.STONE
+        cache.get_chunk(1, 0)
+        cache.put_chunk(Chunk(3, 0, 0, None, None))
+        assert cache.has_chunk(1, 0) and not cache.has_chunk(4, 0)
+        assert (2, 0) not in cache._chunks, 'Chunk 1 was used more recently than chunk 2'
+        cache.stop()
+        assert cache.stats()['dirty'] == 0
+        assert storage.load_chunk(3, 0) is not None
+        storage.close()
+
+    def test_pinning(self, tmp_path):
+        storage = RegionStorage(str(tmp_path))
+        cache = ChunkCache(storage, max_chunks=1)
+        cache.update_pins([_Player(20, -3, 1)])  # Chunk 1, -1
+        assert len(cache.pinned) == 9
+        cache.put_chunk(Chunk(0, 0, 0, None, None))
+        cache.put_chunk(Chunk(5, 0, 5, None, None))
+        assert (0, 0) in cache._chunks and (5, 5) not in cache._chunks, 'Pinned chunks should not be evicted'
+        storage.close()
+
+    def test_flush_does_not_block_lookups(self, tmp_path):
+        storage = RegionStorage(str(tmp_path))
+        cache = ChunkCache(storage)
+        chunk = Chunk(0, 0, 0, None, None)
+        chunk.set_block(0, 5, 0, Material.STONE)
+        cache.put_chunk(chunk)
+        # A slow write: the writer holds the storage while the tick thread looks up & edits chunks
+        with cache._storage_lock:
+            flusher = threading.Thread(target=cache.flush)
+            flusher.start()
+            while cache.stats()['dirty']:
+                pass
+
+            def tick():
+                with cache.editing(cache.get_cached(0, 0)) as edited:
+                    edited.set_block(0, 6, 0, Material.STONE)
+            ticker = threading.Thread(target=tick)
+            ticker.start()
+            ticker.join(1)
+            assert not ticker.is_alive(), 'The tick thread should not wait for the write'
+        flusher.join()
+        # The snapshot taken before the edit was written, the edit is written by the next flush
+        assert Chunk.from_bytes(storage.load_chunk(0, 0)).get_material(0, 6, 0) is not Material.STONE
+        assert cache.flush() == 1
+        assert Chunk.from_bytes(storage.load_chunk(0, 0)).get_material(0, 6, 0) is Material.STONE
+        storage.close()
+
+    def test_unsaved_evicted_chunks(self, tmp_path, monkeypatch):
+        storage = RegionStorage(str(tmp_path))
+        cache = ChunkCache(storage, max_chunks=1)
+        save_compressed = storage.save_compressed
+
+        def fail(*args):
+            raise OSError('Disk full')
+        monkeypatch.setattr(storage, 'save_compressed', fail)
+        chunk = Chunk(0, 0, 0, None, None)
+        chunk.set_block(0, 5, 0, Material.STONE)
+        cache.put_chunk(chunk)
+        cache.put_chunk(Chunk(1, 0, 0, None, None))
+        assert (0, 0) not in cache._chunks and cache.writes == 0
+        # Loaded from the snapshot waiting to be written
+        assert cache.has_chunk(0, 0)
+        assert cache.get_cached(0, 0) is None
+        assert cache.get_chunk(0, 0).get_material(0, 5, 0) is Material.STONE
+        monkeypatch.setattr(storage, 'save_compressed', save_compressed)
+        cache.flush()
+        assert cache.stats()['dirty'] == 0
+        assert Chunk.from_bytes(storage.load_chunk(0, 0)).get_material(0, 5, 0) is Material.STONE
+        storage.close()
@@ -0,0 +1,211 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from classes import WorldIO
+from classes.BasicClasses import Chunk
+from classes.ChunkStreamer import ChunkLoader, ChunkStreamer
+from classes.Exceptions import ChunkNotFound
+from classes.network.PacketType import PacketType
+from classes.blocks.Materials import Material
+from classes.utils.Vector import Vector3D
+
+
+class _Player:
+    def __init__(self, x, z, view_distance):
+        self.entity_id = 1
+        self.display_name = 'Steve'
+        self.entity_location = Vector3D(x, 72, z)
+        self.view_distance = view_distance
+
+
+class _Loader:
+    """ Chunks are loaded once complete is called, or at once if immediate """
+    def __init__(self, immediate=True):
+        self.immediate = immediate
+        self.futures = {}
+
+    def load(self, chunk_x, chunk_z):
+        future = self.futures[(chunk_x, chunk_z)] = Future()
+        if self.immediate:
+            self.complete(chunk_x, chunk_z)
+        return future
+
+    def complete(self, chunk_x, chunk_z):
+        self.futures[(chunk_x, chunk_z)].set_result(Chunk(chunk_x, 0, chunk_z, None, None))
+
+
+class _Streamer(ChunkStreamer):
+    def __init__(self, *args, **kwargs):
+        super(_Streamer, self).__init__(*args, **kwargs)
+        self.packets = []
+        # Whether the network process takes packets
+        self.ring_full = False
+
+    def send(self, packet_type, data):
+        if self.ring_full:
+            return False
+        self.packets.append((packet_type, data))
+        return True
+
+    def take(self, packet_type) -> [dict]:
+        packets = [data for sent_type, data in self.packets if sent_type is packet_type]
+        self.packets = [packet for packet in self.packets if packet[0] is not packet_type]
+        return packets
+
+
+def _positions(chunks: [dict]) -> [(int, int)]:
+    return [(data['chunk'].xPos, data['chunk'].zPos) for data in chunks]
+
+
+class _Generator:
+    def generate(self, chunk_x, chunk_z, callback=None):
+        future = Future()
+        future.add_done_callback(callback)
+        future.set_result(Chunk(chunk_x, 0, chunk_z, None, None))
+        return future
+
+
+class _FailingGenerator:
+    def generate(self, chunk_x, chunk_z, callback=None):
+        raise RuntimeError('Generation service stopped')
+
+
+class TestChunkStreamer:
+
+    def test_nearest_first(self):
+        streamer = _Streamer(_Player(8, 8, 2), _Loader(), chunks_per_tick=5, max_pending=100)
+        streamer.tick()
+        assert streamer.packets[0] == (PacketType.UPDATE_VIEW_POSITION, {'chunk_x': 0, 'chunk_z': 0})
+        streamer.take(PacketType.UPDATE_VIEW_POSITION)
+        sent = _positions(streamer.take(PacketType.CHUNK_DATA))
+        assert sent[0] == (0, 0)
+        assert sorted(sent[1:]) == [(-1, 0), (0, -1), (0, 1), (1, 0)]
+        assert streamer.queue_depth == 20
+        assert streamer.time_to_first_chunk is not None
+        for _ in range(4):
+            streamer.tick()
+        assert streamer.queue_depth == 0
+        assert len(streamer.sent) == streamer.chunks_sent == 25
+        assert streamer.take(PacketType.UPDATE_VIEW_POSITION) == []
+
+    def test_crossing_border(self):
+        player = _Player(8, 8, 2)
+        streamer = _Streamer(player, _Loader(), chunks_per_tick=25)
+        for _ in range(3):
+            streamer.tick()
+        streamer.packets = []
+        # Moving inside the chunk changes nothing
+        player.entity_location = Vector3D(15.9, 72, 0.1)
+        streamer.tick()
+        assert streamer.packets == []
+        player.entity_location = Vector3D(16.5, 72, 8)
+        streamer.tick()
+        unloaded = sorted((data['chunk_x'], data['chunk_z']) for data in streamer.take(PacketType.UNLOAD_CHUNK))
+        assert unloaded == [(-2, z) for z in range(-2, 3)]
+        assert sorted(_positions(streamer.take(PacketType.CHUNK_DATA))) == [(3, z) for z in range(-2, 3)]
+        assert streamer.center == (1, 0)
+
+    def test_negative_coordinates(self):
+        streamer = _Streamer(_Player(-0.5, -16.5, 0), _Loader())
+        streamer.tick()
+        assert _positions(streamer.take(PacketType.CHUNK_DATA)) == [(-1, -2)]
+
+    def test_view_distance(self):
+        player = _Player(0, 0, 32)
+        streamer = _Streamer(player, _Loader(immediate=False), max_view_distance=3)
+        streamer.tick()
+        assert streamer.queue_depth == 49
+        player.view_distance = 1
+        streamer.tick()
+        assert streamer.queue_depth == 9
+
+    def test_slow_loads_dont_block(self):
+        loader = _Loader(immediate=False)
+        streamer = _Streamer(_Player(0, 0, 2), loader, chunks_per_tick=2, max_pending=4)
+        streamer.tick()
+        assert len(loader.futures) == 4
+        assert streamer.take(PacketType.CHUNK_DATA) == []
+        far = list(loader.futures)[-1]
+        loader.complete(*far)
+        streamer.tick()
+        assert _positions(streamer.take(PacketType.CHUNK_DATA)) == [far]
+        assert len(loader.futures) == 5
+        assert streamer.queue_depth == 24
+
+    def test_network_full(self):
+        streamer = _Streamer(_Player(8, 8, 1), _Loader(), chunks_per_tick=5, max_pending=100)
+        streamer.tick()
+        assert len(streamer.take(PacketType.CHUNK_DATA)) == 5
+        streamer.ring_full = True
+        streamer.tick()
+        assert streamer.queue_depth == 4 and len(streamer.sent) == 5, 'Chunks not sent should stay queued'
+        streamer.ring_full = False
+        streamer.tick()
+        assert len(streamer.take(PacketType.CHUNK_DATA)) == 4
+        assert len(streamer.sent) == 9 and streamer.queue_depth == 0
+
+    def test_failed_load(self):
+        loader = _Loader(immediate=False)
+        streamer = _Streamer(_Player(0, 0, 0), loader)
+        streamer.tick()
+        loader.futures[(0, 0)].set_exception(ChunkNotFound('Chunk 0, 0 does not exist'))
+        streamer.tick()
+        assert streamer.take(PacketType.CHUNK_DATA) == []
+        assert streamer.queue_depth == 0
+
+
+class TestChunkLoader:
+
+    def test_load(self, tmp_path):
+        WorldIO.open_world(str(tmp_path))
+        try:
+            WorldIO.saveChunk(Chunk(0, 0, 0, None, None))
+            cached = ChunkLoader().load(0, 0)
+            assert cached.done() and cached.result().xPos == 0
+            with pytest.raises(ChunkNotFound):
+                ChunkLoader().load(1, 0).result(5)
+            generated = ChunkLoader(_Generator()).load(2, 3).result(5)
+            assert (generated.xPos, generated.zPos) == (2, 3)
+            assert WorldIO.get_chunk_cache().get_cached(2, 3) is generated
+        finally:
+            WorldIO.close_world()
+
+    def test_generator_fails(self, tmp_path):
+        WorldIO.open_world(str(tmp_path))
+        try:
+            loader = ChunkLoader(_FailingGenerator())
+            failed = loader.load(0, 0)
+            with pytest.raises(RuntimeError):
+                failed.result(5)
+            # Isn't kept as loading, the next load tries again
+            assert not loader._loading and loader.load(0, 0) is not failed
+        finally:
+            WorldIO.close_world()
+
+    def test_load_during_disk_io(self, tmp_path):
+        WorldIO.open_world(str(tmp_path))
+        try:
+            cache = WorldIO.get_chunk_cache()
+            chunk = Chunk(0, 0, 0, None, None)
+            chunk.set_block(0, 5, 0, Material.STONE)
+            WorldIO.saveChunk(chunk)
+            WorldIO.saveChunk(Chunk(1, 0, 0, None, None))
+            cache.max_chunks = 1
+            # The loader or the writer is reading or writing a region file
+            loaded = []
+            with cache._storage_lock:
+                def tick():
+                    # Evicts the dirty chunk 0, 0
+                    cache.update_pins([_Player(16, 0, 0)])
+                    loaded.append(ChunkLoader().load(1, 0))
+                ticker = threading.Thread(target=tick)
+                ticker.start()
+                ticker.join(1)
+                assert not ticker.is_alive(), 'The tick thread should not wait for the region files'
+            assert loaded[0].done() and loaded[0].result().xPos == 1
+            assert cache.get_cached(0, 0) is None
+            assert WorldIO.getChunk(0, 0, 0).get_material(0, 5, 0) is Material.STONE
+        finally:
+            WorldIO.close_world()
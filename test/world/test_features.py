@@ -0,0 +1,115 @@
+from classes import WorldIO
+from classes.BasicClasses import Chunk, Heightmap
+from classes.TerrainFeatures import AbstractTreeGenerator, FeatureTemplate, MatchstickTreeGenerator, OreFeature, \
+    _generate_block
+from classes.WorldIO import PendingEditStore
+from classes.blocks.Materials import Material
+from classes.utils.Scheduler import SchedulerManager
+
+
+class TestPendingEdits:
+
+    def test_out_of_chunk_blocks(self):
+        pending = PendingEditStore()
+        chunk = Chunk(2, 0, -1, [], None, 16, 256)
+        _generate_block(pending, chunk, [3, 40, 3], Material.STONE)
+        _generate_block(pending, chunk, [17, 40, -1], Material.STONE)
+        _generate_block(pending, chunk, [-1, 300, 0], Material.STONE)
+        assert chunk.get_material(3, 40, 3) is Material.STONE
+        assert list(pending.chunks) == [(3, -2)], 'Blocks above the world should be dropped'
+        assert list(pending.chunks[(3, -2)]) == [(1, 40, 15, Material.STONE)]
+
+    def test_ore_vein_crosses_border(self):
+        pending = PendingEditStore()
+        chunk = Chunk(0, 0, 0, [], None, 16, 256)
+        OreFeature(Material.IRON_ORE, 100, 0, 64, 16, 16).generation_attempt(pending, 0, chunk, 14, 20, 14, False)
+        neighbour = Chunk(1, 0, 1, [], None, 16, 256)
+        assert pending.apply(neighbour)
+        assert neighbour.get_material(1, 22, 0) is Material.IRON_ORE
+        assert list(pending.chunks) == [(1, 0)], 'Blocks of the other neighbour should still be pending'
+
+    def test_only_air(self, tmp_path):
+        pending = PendingEditStore()
+        chunk = Chunk(0, 0, 0, [], None, 16, 256)
+        _generate_block(pending, chunk, [-1, 40, 3], Material.OAK_LEAVES, only_air=True)
+        _generate_block(pending, chunk, [-1, 41, 3], Material.OAK_LEAVES, only_air=True)
+        _generate_block(pending, chunk, [-1, 42, 3], Material.OAK_LOG)
+        path = str(tmp_path / 'pending_edits.json')
+        pending.save(path)
+        loaded = PendingEditStore()
+        loaded.load(path)
+        for store in (pending, loaded):
+            assert store.keys() == {(-1, 0)} and len(store) == 1
+            neighbour = Chunk(-1, 0, 0, [], None, 16, 256)
+            neighbour.set_block(15, 40, 3, Material.OAK_LOG)
+            assert store.apply(neighbour)
+            assert neighbour.get_material(15, 40, 3) is Material.OAK_LOG, 'Leaves should not replace a trunk'
+            assert neighbour.get_material(15, 41, 3) is Material.OAK_LEAVES
+            assert neighbour.get_material(15, 42, 3) is Material.OAK_LOG
+            assert len(store) == 0
+
+    def test_applied_on_load(self, tmp_path):
+        WorldIO.open_world(str(tmp_path))
+        try:
+            WorldIO.saveChunk(Chunk(0, 0, 0, [], None, 16, 256))
+            edits = PendingEditStore()
+            edits.addBlock(0, 0, 1, 2, 3, Material.DIRT)
+            edits.addBlock(5, 5, 1, 2, 3, Material.DIRT)
+            WorldIO.addPendingEdits(edits)
+            assert WorldIO.getChunk(0, 0, 0).get_material(1, 2, 3) is Material.DIRT, 'Chunks in memory get edits now'
+            # From another thread, edits of chunks in memory wait for the tick thread
+            scheduler = SchedulerManager(None)
+            edits = PendingEditStore()
+            edits.addBlock(0, 0, 1, 3, 3, Material.DIRT)
+            WorldIO.addPendingEdits(edits, scheduler)
+            assert WorldIO.getChunk(0, 0, 0).get_material(1, 3, 3) is not Material.DIRT
+            scheduler.tick(1)
+            assert WorldIO.getChunk(0, 0, 0).get_material(1, 3, 3) is Material.DIRT
+        finally:
+            WorldIO.close_world()
+        WorldIO.open_world(str(tmp_path))
+        try:
+            assert len(WorldIO.get_pending_edits()) == 1, 'Pending edits should be saved with the world'
+            WorldIO.saveChunk(Chunk(5, 0, 5, [], None, 16, 256))
+            assert WorldIO.getChunk(5, 0, 5).get_material(1, 2, 3) is Material.DIRT
+        finally:
+            WorldIO.close_world()
+
+
+class TestTemplates:
+
+    def test_variants(self):
+        template = FeatureTemplate([(0, 0, 0), (0, 0, 0), (1, 0, 0)], [(0, 1, 0), (0, 2, 0)])
+        assert len(template.offsets) == 2, 'Offsets should be unique'
+        assert template.variant_count == 4
+        assert template.variant(0).tolist() == [[0, 0, 0], [1, 0, 0]]
+        assert template.variant(2).tolist() == [[0, 0, 0], [1, 0, 0], [0, 2, 0]]
+
+    def test_tree(self):
+        pending = PendingEditStore()
+        chunk = Chunk(0, 0, 0, [], None, 16, 256)
+        for x in range(16):
+            for z in range(16):
+                chunk.set_block(x, 64, z, Material.GRASS_BLOCK)
+        chunk.set_block(1, 69, 2, Material.STONE)
+        tree = AbstractTreeGenerator(Material.OAK_LOG, Material.OAK_LEAVES, 100, 5, 5)
+        tree.generation_attempt(pending, 0, chunk, 1, 65, 1, True)
+        assert [chunk.get_material(1, y, 1) for y in range(65, 71)] == [Material.OAK_LOG] * 5 + [Material.OAK_LEAVES]
+        assert chunk.get_material(1, 69, 2) is Material.STONE, 'Leaves should not replace blocks'
+        assert chunk.get_material(2, 69, 1) is Material.OAK_LEAVES
+        assert chunk.get_material(0, 68, 0) is Material.OAK_LEAVES
+        assert chunk.get_height(Heightmap.WORLD_SURFACE, 1, 1) == 71
+        assert chunk.get_height(Heightmap.WORLD_SURFACE, 2, 1) == 71
+        assert pending.air_chunks and not pending.chunks, 'Leaves should cross the chunk border, only over air'
+        for section in chunk.sections:
+            assert section.non_air == sum(not section.get_material(i).is_air() for i in range(len(section.indices)))
+        tree.generation_attempt(pending, 0, chunk, 1, 65, 2, True)
+        assert chunk.get_material(1, 65, 2) is Material.AIR, 'Trees should only grow in the open'
+
+    def test_matchstick_tree(self):
+        chunk = Chunk(0, 0, 0, [], None, 16, 256)
+        MatchstickTreeGenerator(Material.SPRUCE_LOG, Material.SPRUCE_LEAVES, 100, 8, 8).generation_attempt(
+            None, 0, chunk, 8, 100, 8, True)
+        assert chunk.get_material(8, 107, 8) is Material.SPRUCE_LOG
+        assert chunk.get_material(8, 108, 8) is Material.SPRUCE_LEAVES
+        assert chunk.get_material(9, 106, 8) is Material.SPRUCE_LEAVES
@@ -0,0 +1,46 @@
+import asyncio
+
+import numpy as np
+
+from classes.WorldGenerator import WorldGenerator
+from classes.blocks.Materials import Material
+
+
+class TestNoiseGrid:
+
+    def test_noise2_grid(self):
+        generator = WorldGenerator()
+        xs = np.linspace(-40.5, 40.5, 23)
+        ys = np.linspace(-12.25, 60.75, 19)
+        grid = generator.noise2_grid(xs, ys)
+        assert grid.shape == (23, 19)
+        for a, x in enumerate(xs.tolist()):
+            for b, y in enumerate(ys.tolist()):
+                assert grid[a, b] == generator.noise2(x, y), 'noise2_grid should match noise2 at %s, %s' % (x, y)
+
+    def test_noise3_grid(self):
+        generator = WorldGenerator(permutation_table=list(reversed(range(256))))
+        xs = np.linspace(-7.3, 9.1, 11)
+        ys = np.arange(60, 72)
+        zs = np.linspace(-3.3, 15.8, 13)
+        grid = generator.noise3_grid(xs, ys, zs)
+        assert grid.shape == (11, 12, 13)
+        for a, x in enumerate(xs.tolist()):
+            for b, y in enumerate(ys.tolist()):
+                for c, z in enumerate(zs.tolist()):
+                    assert grid[a, b, c] == generator.noise3(x, y, z), \
+                        'noise3_grid should match noise3 at %s, %s, %s' % (x, y, z)
+
+
+class TestVectorizedGeneration:
+
+    def test_generate_chunk(self):
+        generator = WorldGenerator()
+        chunk = asyncio.run(generator.generateNewChunk(1, 0, 2, 16, 256, None, vectorized=True))
+        heights = generator.noise2_grid(np.arange(16, 32), np.arange(32, 48))
+        for x, z in ((0, 0), (7, 3), (15, 15)):
+            surface = int(np.floor((heights[x, z] + 1) / 2 * (63 - 80) + 80))
+            assert chunk.get_material(x, 0, z) is Material.BEDROCK
+            assert chunk.get_material(x, surface, z) is Material.GRASS_BLOCK
+            assert chunk.get_material(x, surface - 1, z) is Material.DIRT
+            assert chunk.get_material(x, surface + 20, z).is_air()
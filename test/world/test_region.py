@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from classes import WorldIO
+from classes.BasicClasses import Block, Chunk
+from classes.Exceptions import ChunkNotFound
+from classes.RegionFile import HEADER_SECTORS, SECTOR_SIZE, RegionFile
+from classes.blocks.Materials import Material
+
+
+class TestRegionFile:
+
+    def test_write_read(self, tmp_path):
+        path = str(tmp_path / 'r.0.0.mca')
+        region = RegionFile(path)
+        assert region.read_chunk(3, 4) is None
+        region.write_chunk(3, 4, b'chunk 3 4')
+        region.write_chunk(31, 31, b'chunk 31 31')
+        region.close()
+        region = RegionFile(path)
+        assert region.read_chunk(3, 4) == b'chunk 3 4'
+        assert region.read_chunk(31, 31) == b'chunk 31 31'
+        assert not region.has_chunk(4, 3)
+        assert os.path.getsize(path) == (HEADER_SECTORS + 2) * SECTOR_SIZE
+        region.close()
+
+    def test_sector_reuse(self, tmp_path):
+        region = RegionFile(str(tmp_path / 'r.0.0.mca'))
+        big = os.urandom(3 * SECTOR_SIZE)
+        region.write_chunk(0, 0, b'small')
+        region.write_chunk(1, 0, b'other')
+        # Doesn't fit in its sector anymore, the chunk is moved to the end of the file
+        region.write_chunk(0, 0, big)
+        assert region.locations[0] >> 8 == HEADER_SECTORS + 2
+        assert region.used_sectors[HEADER_SECTORS] == 0, 'The old sector should be freed'
+        # Fits in the freed sector
+        region.write_chunk(2, 0, b'third')
+        assert region.locations[2] >> 8 == HEADER_SECTORS
+        region.write_chunk(0, 0, b'small again')
+        assert region.locations[0] & 0xFF == 1, 'Sectors should be given back when a chunk shrinks'
+        assert region.read_chunk(0, 0) == b'small again'
+        assert region.read_chunk(1, 0) == b'other'
+        assert region.read_chunk(2, 0) == b'third'
+        region.close()
+
+
+class TestWorldIO:
+
+    def test_save_load(self, tmp_path):
+        WorldIO.open_world(str(tmp_path))
+        try:
+            with pytest.raises(ChunkNotFound):
+                WorldIO.getChunk(-1, 0, 40)
+            chunk = Chunk(-1, 0, 40, None, None, 16, 256)
+            chunk.set_block(2, 100, 3, Material.STONE)
+            WorldIO.saveChunk(chunk)
+            assert WorldIO.hasChunk(-1, 40)
+            assert WorldIO.get_chunk_cache().flush() == 1
+            assert os.path.exists(os.path.join(str(tmp_path), 'region', 'r.-1.1.mca'))
+            WorldIO.setMaterialAt(-14, 101, 643, Material.DIRT)
+            loaded = WorldIO.getChunk(-1, 0, 40)
+            assert loaded.get_material(2, 100, 3) is Material.STONE
+            assert loaded.get_material(2, 101, 3) is Material.DIRT
+            assert WorldIO.getBlockAt(-14, 0, 643).get_material() is Material.BEDROCK
+            region = WorldIO.getRegion(-1, 0, 1)
+            assert region.getChunk(31, 8).get_material(2, 100, 3) is Material.STONE
+        finally:
+            WorldIO.close_world()
+
+    def test_block_container(self, tmp_path):
+        changes = WorldIO.BasicBlockContainer()
+        changes.addBlock(1, 70, 1, Material.STONE)
+        changes.addBlock(1, 70, 1, Material.DIRT)
+        changes.addBlock(2, 3, 2, Block(2, 3, 2, Material.COAL_ORE, None))
+        assert len(changes) == 2, 'Only the last change of a block should be kept'
+        trees = WorldIO.BasicBlockContainer()
+        trees.addBlock(0, 0, 0, Material.OAK_LOG)
+        WorldIO.mergeContainers(changes, trees, 1, 70, 1)
+        assert len(changes) == 2 and changes.sections[4][(1, 70, 1)] is Material.OAK_LOG
+        WorldIO.open_world(str(tmp_path))
+        try:
+            WorldIO.saveChunk(Chunk(0, 0, 0, None, None, 16, 256))
+            WorldIO.formaliseChunk(0, 0, 0, changes)
+            chunk = WorldIO.getChunk(0, 0, 0)
+            assert chunk.get_material(1, 70, 1) is Material.OAK_LOG
+            assert chunk.get_material(2, 3, 2) is Material.COAL_ORE
+        finally:
+            WorldIO.close_world()